@@ -104,10 +104,15 @@ async def submit_document_job(request: DocumentJobRequest):
 @router.delete("/document", status_code=status.HTTP_200_OK)
 async def delete_document_vectors(
     namespace: str,
-    doc_type: str = "drhp"
+    doc_type: str = "drhp",
+    documentId: Optional[str] = None,
+    domainId: Optional[str] = None
 ):
     """
     Delete document vectors from Pinecone.
+    Pass documentId or domainId: filenames are shared across tenants, so
+    namespace alone does not identify one tenant's copy. Deleting by
+    namespace alone is deprecated and removes every tenant's copy.
     """
     try:
         from app.core.config import settings
@@ -117,7 +122,7 @@ async def delete_document_vectors(
         index_name = settings.PINECONE_DRHP_INDEX
         host = settings.PINECONE_DRHP_HOST
             
-        vector_store_service.delete_vectors(index_name, namespace, host=host)
+        vector_store_service.delete_vectors(index_name, namespace, host=host, document_id=documentId, domain_id=domainId)
         
         return {
             "status": "success",
@@ -55,9 +55,105 @@ class Settings(BaseSettings):
     # AI/ML Settings
     MAX_CHUNK_SIZE: int = 4000
     CHUNK_OVERLAP: int = 800
-    EMBEDDING_DIMENSION: int = 3072  # text-embedding-3-large
+    CHUNKING_MODE: Literal["characters", "tokens"] = "characters"  # tokens: size chunks in embedding-model tokens
+    CHUNK_TOKEN_SIZE: int = 1000  # Used when CHUNKING_MODE=tokens
+    CHUNK_TOKEN_OVERLAP: int = 200
+    EMBEDDING_DIMENSION: int = 3072  # text-embedding-3-large (native size; shorter per-index sizes via PINECONE_INDEX_DIMENSIONS)
     EMBEDDING_MODEL: str = "text-embedding-3-large"
     
+    # Async Embedding Batcher
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100000  # Estimated tokens per request (API limit 300k)
+    EMBEDDING_BATCH_MAX_ITEMS: int = 2048  # API limit on inputs per request
+    EMBEDDING_MAX_CONCURRENCY: int = 4  # Embedding requests in flight per worker
+    EMBEDDING_MAX_RETRIES: int = 3
+    EMBEDDING_SEND_DIMENSIONS: bool = True  # Request the target size via the API `dimensions` param (text-embedding-3 models); otherwise shortened locally
+    
+    # Embedding Cache (content-addressed, survives task retries and re-ingestion)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = ".cache/embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MAX_BYTES: int = 2 * 1024 ** 3  # 2 GB, LRU-evicted beyond this
+    
+    # Document Fetching
+    DOCUMENT_FETCH_TIMEOUT: int = 30  # Seconds (connect and per-read)
+    DOCUMENT_FETCH_CHUNK_SIZE: int = 1024 * 1024  # Download streamed in 1 MB pieces
+    DOCUMENT_FETCH_POOL_SIZE: int = 4  # Pooled HTTP connections per process
+    DOCUMENT_SPOOL_MAX_BYTES: int = 16 * 1024 * 1024  # Larger downloads roll over to a temp file
+    DOCUMENT_SPOOL_DIR: str = ""  # Temp directory for spooled downloads (default: system temp)
+    DOCUMENT_LOCAL_ROOTS: str = ""  # Comma-separated directories file:// and local-path sources may read from
+    
+    # PDF Extraction
+    PDF_EXTRACTION_WORKERS: int = 0  # 0 = one worker per CPU, 1 = serial
+    PDF_PARALLEL_MIN_PAGES: int = 40  # Smaller PDFs are extracted serially
+    
+    # Boilerplate Stripping (running headers/footers repeated across pages)
+    BOILERPLATE_STRIPPING: bool = False  # Changes chunk text, boundaries and vector ids (needs a reindex)
+    BOILERPLATE_MIN_PAGE_FRACTION: float = 0.4  # Line must repeat on this share of pages
+    BOILERPLATE_MIN_PAGES: int = 5  # ... and on at least this many pages
+    BOILERPLATE_EDGE_LINES: int = 3  # Header/footer zone: first and last N lines of a page
+    BOILERPLATE_WARMUP_PAGES: int = 40  # Pages used to learn patterns when streaming
+    
+    # Section Detection (DRHP/RHP chapter headings)
+    SECTION_CHUNKING: bool = False  # Tag chunks with their section and never merge across sections (needs a reindex)
+    SECTION_HEADING_WINDOW: int = 200  # A heading must appear this close to the top of a page
+    SECTION_TOC_THRESHOLD: int = 4  # Pages naming this many sections are a table of contents
+    
+    # Chunk Text Store (Pinecone metadata carries ids and filter fields; text is hydrated from Mongo)
+    CHUNK_STORE_ENABLED: bool = True
+    CHUNK_STORE_COLLECTION: str = "document_chunks"
+    
+    # Retrieval Working Set (a document's vectors loaded once and scored locally)
+    RETRIEVAL_WORKING_SET: bool = True
+    WORKING_SET_CACHE_MAX_BYTES: int = 512 * 1024 ** 2  # Per worker process, LRU-evicted beyond this
+    WORKING_SET_MAX_VECTORS: int = 5000  # Larger documents are queried in Pinecone
+    WORKING_SET_SNAPSHOT_DIR: str = ""  # Persist loaded working sets as .npz here (empty = off)
+    WORKING_SET_VERSION_CACHE_TTL: int = 30  # Seconds a document's ingestion version is cached per process
+    
+    # Retrieval Engine (one embedding request per query batch, vector queries run concurrently)
+    RETRIEVAL_MAX_CONCURRENCY: int = 8  # Vector queries in flight per retrieval call
+    QUERY_EMBEDDING_COLLECTION: str = "query_embeddings"  # Fixed and onboarded queries, embedded once per model and size
+    QUERY_EMBEDDING_PRELOAD: bool = True  # Load (and fill) the registry when a worker process starts
+    
+    # Precomputed Retrieval (summary query rankings stored at ingestion; see app.services.precomputed_retrieval)
+    RETRIEVAL_PRECOMPUTE: bool = False  # Run the summary queries after ingestion; summaries read the stored rankings
+    RETRIEVAL_PRECOMPUTE_COLLECTION: str = "precomputed_retrievals"
+    RETRIEVAL_PRECOMPUTE_TOP_K: int = 15  # Matches stored per query; serves summary requests up to this top_k
+    
+    # Vector ID Registry (every vector id per document, for delete-by-id and orphan sweeps)
+    VECTOR_REGISTRY_ENABLED: bool = True
+    VECTOR_REGISTRY_COLLECTION: str = "vector_registry"
+    VECTOR_DELETE_BATCH_SIZE: int = 1000  # Ids per delete request (API limit 1000)
+    VECTOR_DELETE_CONCURRENCY: int = 4  # Delete requests in flight
+    VECTOR_ORPHAN_SWEEP_INTERVAL: int = 6 * 3600  # Seconds between background orphan sweeps (0 = off)
+    VECTOR_ORPHAN_SWEEP_GRACE: int = 2 * 3600  # Only sweep documents whose latest ingestion is older than this
+    
+    # Namespace Layout (where each document's vectors live; see app.services.namespace_layout)
+    NAMESPACE_STRATEGY: Literal["shared", "domain", "document"] = "shared"  # shared: all in "" separated by metadata filters
+    NAMESPACE_LAYOUT_COLLECTION: str = "vector_layouts"
+    NAMESPACE_LAYOUT_CACHE_TTL: int = 300  # Seconds a document's layout lookup is cached per process
+    NAMESPACE_LAYOUT_LEARN: bool = True  # Record where a document with no layout record was found, so later queries skip the probes
+    NAMESPACE_MIGRATION_RATE: int = 500  # Vectors per second copied by the namespace migration
+    NAMESPACE_MIGRATION_BATCH: int = 100  # Vectors fetched and upserted per migration step
+    
+    # Domain Sharding (DRHP/RHP vectors spread over several indexes by domainId; see app.services.shard_router)
+    PINECONE_SHARDS: str = ""  # "name=host,name=host"; empty: everything stays on PINECONE_DRHP_INDEX / PINECONE_RHP_INDEX
+    PINECONE_SHARD_VNODES: int = 64  # Hash ring points per shard
+    SHARD_PLACEMENT_COLLECTION: str = "vector_shards"
+    SHARD_PLACEMENT_CACHE_TTL: int = 300  # Seconds a domain's placement is cached per process
+    SHARD_REBALANCE_RATE: int = 500  # Vectors per second copied by the rebalance
+    SHARD_REBALANCE_BATCH: int = 100  # Vectors fetched and upserted per rebalance step
+    
+    # Vector Backend
+    VECTOR_BACKEND: Literal["pinecone", "local"] = "pinecone"  # local: in-process search over files in VECTOR_LOCAL_DIR
+    VECTOR_LOCAL_DIR: str = ".cache/vector_store"
+    VECTOR_LOCAL_ANN_MIN_VECTORS: int = 50000  # Namespaces this large are searched through an IVF index
+    VECTOR_LOCAL_IVF_NPROBE: int = 16  # IVF lists scanned per query
+    VECTOR_LOCAL_MAX_SEGMENTS: int = 32  # Upsert segments per namespace before they are merged
+    
+    # Streaming Ingestion
+    INGESTION_STREAMING: bool = False  # Overlap extract/chunk, embed and upsert stages
+    STREAMING_BATCH_SIZE: int = 50  # Chunks per embed/upsert batch
+    STREAMING_QUEUE_SIZE: int = 4  # Max batches buffered between stages
+    
     # OpenAI
     OPENAI_API_KEY: str = ""
     SUMMARY_MODEL: str = "gpt-4.1-mini"
@@ -71,6 +167,19 @@ class Settings(BaseSettings):
     PINECONE_RHP_INDEX: str = "drhp-summarizer"
     PINECONE_DRHP_HOST: str = "https://drhp-summarizer-y8firn8.svc.aped-4627-b74a.pinecone.io"
     PINECONE_RHP_HOST: str = "https://drhp-summarizer-y8firn8.svc.aped-4627-b74a.pinecone.io"
+    PINECONE_INDEX_DIMENSIONS: str = ""  # Per-index embedding dimension, e.g. "drhp-summarizer=1024,rhp-small=512" (default EMBEDDING_DIMENSION)
+    
+    # Pinecone Connections (index handles are pooled per (index, host) per process)
+    PINECONE_POOL_MAXSIZE: int = 16  # HTTP connections per client; half are kept alive between requests
+    PINECONE_TIMEOUT: float = 30.0  # Seconds per request
+    PINECONE_INDEX_HEALTH_CHECK: bool = True  # describe_index_stats before a new handle is pooled
+    
+    # Pinecone Upserts
+    PINECONE_UPSERT_MAX_BYTES: int = 1_800_000  # Serialized bytes per request (API limit 2 MB)
+    PINECONE_UPSERT_MAX_VECTORS: int = 1000  # API limit on vectors per request
+    PINECONE_UPSERT_CONCURRENCY: int = 8  # Upsert requests in flight
+    PINECONE_UPSERT_MAX_RETRIES: int = 3
+    
     PERPLEXITY_API_KEY: Optional[str] = None
     COHERE_API_KEY: Optional[str] = None
     
@@ -0,0 +1,118 @@
+"""
+Boilerplate detection.
+Finds running headers, footers and disclaimers repeated across the pages of
+one document and strips them before cleaning and chunking. Off by default
+(BOILERPLATE_STRIPPING): stripped text chunks differently, so turning it
+on re-addresses a document's vectors and needs a reindex.
+"""
+import re
+from collections import Counter
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_DIGITS = re.compile(r"\d+")
+
+
+class BoilerplateDetector:
+    """
+    Frequency-based boilerplate detector for one document.
+
+    Only the first and last `edge_lines` non-empty lines of each raw page
+    (as returned by PdfReader, before newlines are removed) are considered,
+    which is where running headers and footers live; table headers that
+    repeat inside page bodies are never touched. Lines are normalised
+    (whitespace collapsed, digit runs replaced) so "Page 12 of 410" and
+    "Page 13 of 410" count as the same line. A line that sits on the edge of
+    at least `min_fraction` of the fitted pages (and at least `min_pages`
+    pages) is boilerplate.
+    """
+
+    def __init__(
+        self,
+        min_fraction: float = None,
+        min_pages: int = None,
+        edge_lines: int = None
+    ):
+        self.min_fraction = min_fraction or settings.BOILERPLATE_MIN_PAGE_FRACTION
+        self.min_pages = min_pages or settings.BOILERPLATE_MIN_PAGES
+        self.edge_lines = edge_lines or settings.BOILERPLATE_EDGE_LINES
+        self.patterns: Set[str] = set()
+        self.stats: Dict[str, Any] = {
+            "pages": 0,
+            "patterns": 0,
+            "lines_removed": 0,
+            "chars_before": 0,
+            "chars_removed": 0,
+        }
+
+    @staticmethod
+    def _normalize(line: str) -> str:
+        return _DIGITS.sub("#", " ".join(line.split()))
+
+    def _edge_indexes(self, lines: List[str]) -> List[int]:
+        """Indexes of the header/footer zone lines of a page."""
+        non_empty = [i for i, line in enumerate(lines) if line.strip()]
+        if len(non_empty) <= 2 * self.edge_lines:
+            return non_empty
+        return non_empty[:self.edge_lines] + non_empty[-self.edge_lines:]
+
+    def fit(self, pages: Sequence[str]) -> "BoilerplateDetector":
+        """Learn boilerplate lines from a set of raw pages."""
+        page_frequency: Counter = Counter()
+        for page_text in pages:
+            lines = (page_text or "").split("\n")
+            page_frequency.update({self._normalize(lines[i]) for i in self._edge_indexes(lines)})
+
+        threshold = max(self.min_pages, int(len(pages) * self.min_fraction))
+        self.patterns = {line for line, count in page_frequency.items() if line and count >= threshold}
+        self.stats["patterns"] = len(self.patterns)
+        logger.debug("Boilerplate patterns learned", fitted_pages=len(pages), patterns=len(self.patterns))
+        return self
+
+    def strip(self, page_text: str) -> str:
+        """Remove boilerplate header/footer lines from one raw page."""
+        self.stats["pages"] += 1
+        if not page_text:
+            return page_text or ""
+        self.stats["chars_before"] += len(page_text)
+        if not self.patterns:
+            return page_text
+
+        lines = page_text.split("\n")
+        doomed = {i for i in self._edge_indexes(lines) if self._normalize(lines[i]) in self.patterns}
+        if not doomed:
+            return page_text
+        for i in doomed:
+            self.stats["chars_removed"] += len(lines[i]) + 1
+        self.stats["lines_removed"] += len(doomed)
+        return "\n".join(line for i, line in enumerate(lines) if i not in doomed)
+
+    def strip_pages(self, pages: Iterable[str], warmup: Optional[int] = None) -> Iterator[str]:
+        """
+        Fit on the first `warmup` pages (all pages when None), then yield
+        every page stripped, in order. A warmup keeps streaming ingestion
+        from having to hold the whole document.
+        """
+        remaining = iter(pages)
+        head = list(remaining) if warmup is None else list(islice(remaining, warmup))
+        self.fit(head)
+        for page_text in head:
+            yield self.strip(page_text)
+        for page_text in remaining:
+            yield self.strip(page_text)
+        self.log_summary()
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-document statistics."""
+        chars_before = self.stats["chars_before"]
+        return {
+            **self.stats,
+            "removed_ratio": round(self.stats["chars_removed"] / chars_before, 4) if chars_before else 0.0
+        }
+
+    def log_summary(self) -> None:
+        logger.info("Boilerplate stripped", **self.summary())
@@ -7,16 +7,13 @@ from typing import Dict, Any, List, Optional
 import openai
 from app.core.config import settings
 from app.core.logging import get_logger
-from app.services.vector_store import vector_store_service
-from app.services.embedding import EmbeddingService
-from app.services.rerank import rerank_service
+from app.services.retrieval import retrieval_engine
 from app.services.chat.prompts import CHAT_SYSTEM_PROMPT
 
 logger = get_logger(__name__)
 
 class ChatService:
     def __init__(self):
-        self.embedding = EmbeddingService()
         self.client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
     async def _retrieve_context(
@@ -30,77 +27,21 @@ class ChatService:
         metadata_filter: Optional[Dict[str, Any]] = None
     ) -> str:
         """
-        Retrieves context with fallback logic.
+        Retrieves reranked context with fallback logic (see app.services.retrieval).
+        Without a metadata_filter, a document with no recorded layout is
+        finally searched across the whole default namespace.
         """
-        try:
-            # 1. Vector Search
-            query_vector = await self.embedding.embed_text(query)
-            index = vector_store_service.get_index(index_name, host=host)
-            
-            # Construct Filter
-            # Default filter by documentName (namespace)
-            filter_criteria = {"documentName": namespace} if namespace and namespace != "" else {}
-            
-            # Merge with metadata_filter if provided via API (e.g. documentId, domainId)
-            if metadata_filter:
-                filter_criteria.update(metadata_filter)
-            
-            # If criteria is empty, set to None to allow querying (though generally unsafe without namespace)
-            query_filter = filter_criteria if filter_criteria else None
-
-            # First try: Default namespace ("") with filters
-            # This matches the single-index strategy where we rely on metadata for separation
-            search_res = index.query(
-                vector=query_vector,
-                top_k=top_k,
-                namespace="",
-                include_metadata=True,
-                filter=query_filter
-            )
-            initial_chunks = [m['metadata']['text'] for m in search_res['matches']]
-            
-            # Fallback 1: Specified namespace (legacy support)
-            if not initial_chunks and namespace and namespace != "":
-                # Remove "documentName" from filter for legacy namespace search
-                # Legacy documents using namespace for isolation might NOT have documentName metadata
-                legacy_filter = query_filter.copy() if query_filter else {}
-                if "documentName" in legacy_filter:
-                    del legacy_filter["documentName"]
-                if not legacy_filter:
-                    legacy_filter = None
-                
-                # logger.info(f"Chat retry in legacy namespace {namespace}")
-                search_res = index.query(
-                    vector=query_vector,
-                    top_k=top_k,
-                    namespace=namespace,
-                    include_metadata=True,
-                    filter=legacy_filter
-                )
-                initial_chunks = [m['metadata']['text'] for m in search_res['matches']]
-
-            # Fallback 2: "" namespace WITHOUT filter
-            # Skip if strict isolation is enforced via metadata_filter
-            if not initial_chunks and not metadata_filter and namespace and namespace != "":
-                logger.warning(f"Chat final fallback in \"\" for {namespace}")
-                search_res = index.query(
-                    vector=query_vector,
-                    top_k=top_k,
-                    namespace="",
-                    include_metadata=True
-                )
-                initial_chunks = [m['metadata']['text'] for m in search_res['matches']]
-
-            # 2. Rerank
-            if initial_chunks:
-                reranked_chunks = rerank_service.rerank(query, initial_chunks, top_n=rerank_n)
-                return "\n---\n".join(reranked_chunks)
-            
-            return ""
-
-        except Exception as e:
-            logger.error(f"Chat retrieval failed", error=str(e))
-            return ""
+        result = await retrieval_engine.retrieve(
+            [query],
+            namespace,
+            index_name,
+            host,
+            top_k=top_k,
+            metadata_filter=metadata_filter,
+            rerank_n=rerank_n,
+            unfiltered_fallback=True
+        )
+        return result.context()
 
     async def chat(
         self, 
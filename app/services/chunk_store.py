@@ -0,0 +1,167 @@
+"""
+Chunk text store.
+Keeps chunk text, offsets and pages in MongoDB keyed by
+(documentId, chunk_index), so Pinecone metadata only carries ids and
+filter fields and query responses stay small.
+"""
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from pymongo import ASCENDING, ReplaceOne
+from app.db.mongo import mongodb
+from app.services.chunk_batch import ChunkBatch
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+ChunkKey = Tuple[str, int]
+
+
+class ChunkStore:
+    """
+    Chunk store backed by one Mongo collection.
+
+    Each document holds documentId, chunk_index, documentName, domainId, text,
+    char_start/char_end (offsets into the cleaned document text, None when
+    the chunk came from streaming ingestion), page_start/page_end and
+    section. Reads are batched: get_many resolves any number of keys in
+    a single query.
+    """
+
+    def __init__(self, collection_name: str = None):
+        self.collection_name = collection_name or settings.CHUNK_STORE_COLLECTION
+        self._indexed = False
+
+    def _collection(self):
+        if mongodb.sync_db is None:
+            mongodb.connect_sync()
+        collection = mongodb.get_sync_collection(self.collection_name)
+        if not self._indexed:
+            collection.create_index([("documentId", ASCENDING), ("chunk_index", ASCENDING)], unique=True)
+            collection.create_index([("documentName", ASCENDING), ("domainId", ASCENDING)])
+            self._indexed = True
+        return collection
+
+    def put_batch(self, batch: ChunkBatch, document_name: str = "") -> int:
+        """Store every chunk of a batch (idempotent: re-ingestion overwrites by key)."""
+        document_id = batch.metadata.get("documentId")
+        if not document_id or not len(batch):
+            return 0
+        now = time.time()
+        starts, ends = batch.starts.tolist(), batch.ends.tolist()
+        pages = batch.pages.tolist() if batch.pages is not None else None
+        operations = []
+        for i, (chunk_index, chunk_text, section, _) in enumerate(batch.iter_rows()):
+            record = {
+                "documentId": document_id,
+                "chunk_index": chunk_index,
+                "documentName": document_name,
+                "domainId": batch.metadata.get("domainId", ""),
+                "text": chunk_text,
+                "char_start": starts[i] if batch.document_offsets else None,
+                "char_end": ends[i] if batch.document_offsets else None,
+                "page_start": pages[i][0] if pages else None,
+                "page_end": pages[i][1] if pages else None,
+                "section": section,
+                "updated_at": now,
+            }
+            operations.append(ReplaceOne({"documentId": document_id, "chunk_index": chunk_index}, record, upsert=True))
+        self._collection().bulk_write(operations, ordered=False)
+        logger.debug("Chunks stored", document_id=document_id, count=len(operations))
+        return len(operations)
+
+    def get_many(self, keys: Iterable[ChunkKey]) -> Dict[ChunkKey, Dict[str, Any]]:
+        """Fetch chunks for (documentId, chunk_index) keys in one query."""
+        by_document: Dict[str, List[int]] = defaultdict(list)
+        for document_id, chunk_index in keys:
+            by_document[document_id].append(chunk_index)
+        if not by_document:
+            return {}
+        query = {"$or": [
+            {"documentId": document_id, "chunk_index": {"$in": indexes}}
+            for document_id, indexes in by_document.items()
+        ]}
+        return {
+            (record["documentId"], record["chunk_index"]): record
+            for record in self._collection().find(query, {"_id": 0})
+        }
+
+    def get_adjacent(self, document_id: str, chunk_index: int, before: int = 1, after: int = 1) -> List[Dict[str, Any]]:
+        """A chunk and its neighbours, in document order."""
+        cursor = self._collection().find(
+            {"documentId": document_id, "chunk_index": {"$gte": chunk_index - before, "$lte": chunk_index + after}},
+            {"_id": 0}
+        ).sort("chunk_index", ASCENDING)
+        return list(cursor)
+
+    def hydrate(self, matches: Iterable[Any]) -> List[str]:
+        """
+        Chunk texts for Pinecone query matches, in match order.
+        Matches that still carry text in metadata (ingested before the
+        store) are used as-is; the rest are resolved with one get_many.
+        """
+        return self.hydrate_groups([matches])[0]
+
+    def hydrate_groups(self, groups: Iterable[Iterable[Any]]) -> List[List[str]]:
+        """hydrate() for several queries' matches with a single store read."""
+        return [[text for _, text in pairs] for pairs in self.hydrate_matches(groups)]
+
+    def hydrate_matches(self, groups: Iterable[Iterable[Any]]) -> List[List[Tuple[Any, str]]]:
+        """hydrate_groups() keeping each text's match (for its id and score)."""
+        groups = [list(matches) for matches in groups]
+        keyed: List[List[Tuple[Any, Optional[ChunkKey]]]] = []
+        for matches in groups:
+            keys = []
+            for match in matches:
+                metadata = match["metadata"] or {}
+                if "text" in metadata or not metadata.get("documentId"):
+                    keys.append((match, None))
+                else:
+                    # Pinecone returns numeric metadata as floats
+                    keys.append((match, (metadata["documentId"], int(metadata["chunk_index"]))))
+            keyed.append(keys)
+
+        wanted = {key for keys in keyed for _, key in keys if key}
+        records = self.get_many(wanted) if wanted else {}
+        results = []
+        missing = 0
+        for keys in keyed:
+            pairs = []
+            for match, key in keys:
+                if key is None:
+                    text = (match["metadata"] or {}).get("text")
+                else:
+                    text = records.get(key, {}).get("text")
+                if text:
+                    pairs.append((match, text))
+                elif key is not None:
+                    missing += 1
+            results.append(pairs)
+        if missing:
+            logger.warning("Chunk text missing from store", missing=missing, matches=sum(len(keys) for keys in keyed))
+        return results
+
+    def delete_chunks(self, document_id: str, chunk_indexes: List[int]) -> int:
+        """Remove specific chunks of a document (e.g. past the end of a shrunken re-ingest)."""
+        if not document_id or not chunk_indexes:
+            return 0
+        return self._collection().delete_many(
+            {"documentId": document_id, "chunk_index": {"$in": list(chunk_indexes)}}
+        ).deleted_count
+
+    def delete_document(self, document_id: str = None, document_name: str = None, domain_id: str = None) -> int:
+        """
+        Remove a document's chunks by documentId, or by documentName within
+        one domain. A filename alone is refused: tenants share filenames.
+        """
+        if document_id:
+            query = {"documentId": document_id}
+        elif document_name and domain_id:
+            query = {"documentName": document_name, "domainId": domain_id}
+        else:
+            raise ValueError("Chunk deletion needs a documentId, or a documentName with its domainId")
+        return self._collection().delete_many(query).deleted_count
+
+
+chunk_store = ChunkStore()
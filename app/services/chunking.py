@@ -2,36 +2,72 @@
 Text chunking service.
 Splits large documents into manageable chunks for processing.
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+import numpy as np
 from app.core.config import settings
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.services.text_splitter import SpanTextSplitter
+from app.services.chunk_batch import ChunkBatch
+from app.services.tokenizer import count_tokens_batch, token_position_counter
 from app.core.config import settings
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Rough chars per token, used only to size streaming buffers in token mode
+_CHARS_PER_TOKEN = 4
+
 
 class ChunkingService:
-    """Service for chunking large text documents using LangChain."""
+    """Service for chunking large text documents (RecursiveCharacterTextSplitter-compatible)."""
     
-    def __init__(self, chunk_size: int = None, chunk_overlap: int = None):
+    def __init__(self, chunk_size: int = None, chunk_overlap: int = None, mode: str = None):
         """
         Initialize chunking service.
+        
+        mode "characters" (default) sizes chunks in characters; "tokens" sizes
+        them in embedding-model tokens and records chunk_token_count.
         """
-        self.chunk_size = chunk_size or settings.MAX_CHUNK_SIZE
-        self.chunk_overlap = chunk_overlap or settings.CHUNK_OVERLAP
-        self.splitter = RecursiveCharacterTextSplitter(
+        self.mode = mode or settings.CHUNKING_MODE
+        if self.mode not in ("characters", "tokens"):
+            raise ValueError(f"Unsupported chunking mode: {self.mode}")
+        if self.mode == "tokens":
+            self.chunk_size = chunk_size or settings.CHUNK_TOKEN_SIZE
+            self.chunk_overlap = chunk_overlap or settings.CHUNK_TOKEN_OVERLAP
+        else:
+            self.chunk_size = chunk_size or settings.MAX_CHUNK_SIZE
+            self.chunk_overlap = chunk_overlap or settings.CHUNK_OVERLAP
+        self.tokenizer_model = settings.EMBEDDING_MODEL
+        # Native offset-based splitter; in character mode chunks are identical
+        # to LangChain's RecursiveCharacterTextSplitter for this configuration
+        self.splitter = SpanTextSplitter(
             chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len,
-            is_separator_regex=False,
+            chunk_overlap=self.chunk_overlap
         )
     
+    def split_spans(self, text: str, starts: Optional[List[int]] = None) -> List[Tuple[int, int]]:
+        """
+        Chunk boundaries as (start, end) offsets into text (starts: see SpanTextSplitter.split_spans).
+        """
+        if not text:
+            return []
+        if self.mode == "tokens":
+            # One encode of the whole text; piece lengths are token-offset differences
+            return self.splitter.split_spans(text, token_position_counter(text, self.tokenizer_model), starts)
+        return self.splitter.split_spans(text, starts=starts)
+    
+    def token_counts(self, chunks: List[str]) -> Optional[List[int]]:
+        """
+        Exact token counts for chunk texts (batch-encoded), or None in character mode.
+        """
+        if self.mode != "tokens":
+            return None
+        return count_tokens_batch(chunks, self.tokenizer_model)
+    
     def split_text(self, text: str) -> List[str]:
         """
         Split text into chunks using recursive character splitting.
@@ -39,18 +75,69 @@ class ChunkingService:
         if not text:
             return []
             
-        chunks = self.splitter.split_text(text)
+        chunks = [text[start:end] for start, end in self.split_spans(text)]
         
         logger.info(
             "Text split into chunks",
             total_chars=len(text),
             chunk_count=len(chunks),
             chunk_size=self.chunk_size,
-            overlap=self.chunk_overlap
+            overlap=self.chunk_overlap,
+            mode=self.mode
         )
         
         return chunks
     
+    def split_stream(self, parts: Iterable[str], flush_chars: int = None) -> Iterator[str]:
+        """
+        Incrementally split a stream of cleaned text parts (e.g. pages).
+        
+        Parts are joined with a single space. Whenever the buffer reaches
+        flush_chars it is split, the trailing chunks that more text could
+        still change are held back, and the buffer restarts where the first
+        held chunk's first word piece begins (its leading space included),
+        so the greedy merge resumes exactly where the batch splitter would.
+        Chunks inside a word longer than chunk_size are never a restart
+        point: the whole word is held and re-split. For newline-free text
+        (cleaned pages, which may still hold double spaces or tabs) the
+        output equals splitting the whole joined text; memory is bounded by
+        flush_chars plus any run of text with no restart point.
+        """
+        if not flush_chars:
+            flush_chars = self.chunk_size * 8
+            if self.mode == "tokens":
+                flush_chars *= _CHARS_PER_TOKEN
+        buffer = ""
+        
+        for part in parts:
+            if not part:
+                continue
+            buffer = f"{buffer} {part}" if buffer else part
+            if len(buffer) < flush_chars:
+                continue
+            
+            starts: List[int] = []
+            spans = self.split_spans(buffer, starts)
+            if len(spans) < 3:
+                continue
+            
+            # Restart where a word piece (" word", separator in front) begins. A chunk
+            # starting anywhere else is a fragment of a word longer than chunk_size,
+            # and chunks sharing a start are re-split together
+            keep = len(spans) - 2
+            while keep > 0 and (buffer[starts[keep]] != " " or starts[keep - 1] == starts[keep]):
+                keep -= 1
+            if keep == 0:
+                continue
+            
+            for start, end in spans[:keep]:
+                yield buffer[start:end]
+            buffer = buffer[starts[keep]:]
+        
+        if buffer:
+            for start, end in self.split_spans(buffer):
+                yield buffer[start:end]
+    
     def chunk_with_metadata(
         self,
         text: str,
@@ -60,6 +147,7 @@ class ChunkingService:
         Chunk text and attach metadata to each chunk.
         """
         chunks = self.split_text(text)
+        token_counts = self.token_counts(chunks)
         
         results = []
         for idx, chunk in enumerate(chunks):
@@ -69,6 +157,8 @@ class ChunkingService:
                 "chunk_size": len(chunk),
                 "metadata": metadata or {}
             }
+            if token_counts is not None:
+                chunk_data["chunk_token_count"] = token_counts[idx]
             results.append(chunk_data)
         
         logger.info(
@@ -78,6 +168,90 @@ class ChunkingService:
         
         return results
 
+    def chunk_sections(
+        self,
+        sections: List[Tuple[str, str]],
+        metadata: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Chunk each (section, text) block separately so no chunk spans two
+        sections, and tag every chunk with its section.
+        """
+        chunks: List[str] = []
+        chunk_sections: List[str] = []
+        for section, section_text in sections:
+            for start, end in self.split_spans(section_text):
+                chunks.append(section_text[start:end])
+                chunk_sections.append(section)
+        token_counts = self.token_counts(chunks)
+        
+        results = []
+        for idx, chunk in enumerate(chunks):
+            chunk_data = {
+                "chunk_index": idx,
+                "chunk_text": chunk,
+                "chunk_size": len(chunk),
+                "section": chunk_sections[idx],
+                "metadata": metadata or {}
+            }
+            if token_counts is not None:
+                chunk_data["chunk_token_count"] = token_counts[idx]
+            results.append(chunk_data)
+        
+        logger.info(
+            "Created section-aware chunks",
+            chunk_count=len(results),
+            section_count=len(sections)
+        )
+        
+        return results
+
+    def chunk_batch(
+        self,
+        text: str = "",
+        metadata: Dict[str, Any] = None,
+        sections: Optional[List[Tuple[str, str]]] = None,
+        page_starts: Optional[List[Tuple[int, int]]] = None
+    ) -> ChunkBatch:
+        """
+        Chunk a document into a columnar ChunkBatch.
+        
+        With sections, each (section, text) block is split on its own (as
+        chunk_sections) and the blocks are joined with a space into the
+        batch's shared text, so offsets still point into one string.
+        page_starts (from ExtractionService.extract_text) maps chunks to pages.
+        """
+        labels: Optional[List[str]] = None
+        if sections:
+            texts = []
+            spans: List[Tuple[int, int]] = []
+            labels = []
+            base = 0
+            for section, section_text in sections:
+                for start, end in self.split_spans(section_text):
+                    spans.append((base + start, base + end))
+                    labels.append(section)
+                texts.append(section_text)
+                base += len(section_text) + 1
+            text = " ".join(texts)
+        else:
+            spans = self.split_spans(text)
+        
+        batch = ChunkBatch.from_spans(text, spans, metadata=metadata, sections=labels)
+        batch.set_pages(page_starts)
+        token_counts = self.token_counts(batch.texts())
+        if token_counts is not None:
+            batch.token_counts = np.asarray(token_counts, dtype=np.int32)
+        
+        logger.info(
+            "Created chunk batch",
+            chunk_count=len(batch),
+            section_count=len(sections) if sections else 0,
+            total_chars=len(text)
+        )
+        
+        return batch
+
 
 # Global service instance
 chunking_service = ChunkingService()
@@ -7,9 +7,7 @@ import time
 from typing import Dict, Any, List, Optional
 from app.core.config import settings
 from app.core.logging import get_logger
-from app.services.vector_store import vector_store_service
-from app.services.embedding import EmbeddingService
-from app.services.rerank import rerank_service
+from app.services.retrieval import retrieval_engine
 from app.services.comparison.prompts import COMPARISON_SYSTEM_PROMPT, COMPARISON_QUERIES
 from app.services.comparison.formatter import comparison_formatter
 import openai
@@ -18,7 +16,6 @@ logger = get_logger(__name__)
 
 class ComparisonPipeline:
     def __init__(self):
-        self.embedding = EmbeddingService()
         self.client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
     async def _retrieve_context_from_index(
@@ -32,85 +29,19 @@ class ComparisonPipeline:
         metadata_filter: Optional[Dict[str, Any]] = None
     ) -> str:
         """
-        Retrieves context from a specific Pinecone index.
-        Matches the robust fallback logic in SummaryPipeline.
+        Retrieves reranked context from a specific Pinecone index.
+        Same retrieval path as SummaryPipeline (see app.services.retrieval).
         """
-        all_context = []
-        for query in queries:
-            try:
-                # 1. Vector Search
-                query_vector = await self.embedding.embed_text(query)
-                index = vector_store_service.get_index(index_name, host=host)
-                
-                # Construct Filter
-                # Default filter by documentName (namespace)
-                filter_criteria = {"documentName": namespace} if namespace and namespace != "" else {}
-                
-                # Merge with metadata_filter if provided via API (e.g. documentId, domainId)
-                if metadata_filter:
-                    filter_criteria.update(metadata_filter)
-                
-                # If criteria is empty, set to None to allow querying (though generally unsafe without namespace)
-                query_filter = filter_criteria if filter_criteria else None
-
-                logger.debug(f"Querying index {index_name}", namespace=namespace or "", filter=query_filter)
-
-                # First try: Query the default namespace ("") with filters
-                # This matches the single-index strategy where we rely on metadata for separation
-                safe_namespace = ""
-                
-                logger.debug(f"Querying index {index_name}", namespace=safe_namespace, filter=query_filter)
-                
-                search_res = index.query(
-                    vector=query_vector,
-                    top_k=vector_top_k,
-                    namespace=safe_namespace,
-                    include_metadata=True,
-                    filter=query_filter
-                )
-                initial_chunks = [m['metadata']['text'] for m in search_res['matches']]
-                
-                # Fallback: Query specific namespace (legacy support or if still used)
-                if not initial_chunks and namespace and namespace != "":
-                    # Remove "documentName" from filter for legacy namespace search
-                    # Legacy documents using namespace for isolation might NOT have documentName metadata
-                    legacy_filter = query_filter.copy() if query_filter else {}
-                    if "documentName" in legacy_filter:
-                        del legacy_filter["documentName"]
-                    if not legacy_filter:
-                        legacy_filter = None
-                        
-                    logger.warning(f"Fallback: Search in legacy namespace {namespace}")
-                    search_res = index.query(
-                        vector=query_vector,
-                        top_k=vector_top_k,
-                        namespace=namespace,
-                        include_metadata=True,
-                        filter=legacy_filter
-                    )
-                    initial_chunks = [m['metadata']['text'] for m in search_res['matches']]
-
-                # 2. Rerank
-                if initial_chunks:
-                    try:
-                        reranked_chunks = rerank_service.rerank(query, initial_chunks, top_n=rerank_top_n)
-                        all_context.extend(reranked_chunks)
-                    except Exception as re:
-                        logger.error("Rerank failed, using initial chunks", error=str(re))
-                        all_context.extend(initial_chunks[:rerank_top_n])
-            except Exception as e:
-                logger.error(f"Context retrieval failed for index {index_name}", query=query, error=str(e))
-                continue
-            
-        # Deduplicate
-        unique_context = []
-        seen = set()
-        for chunk in all_context:
-            if chunk not in seen:
-                unique_context.append(chunk)
-                seen.add(chunk)
-                
-        return "\n---\n".join(unique_context)
+        result = await retrieval_engine.retrieve(
+            queries,
+            namespace,
+            index_name,
+            host,
+            top_k=vector_top_k,
+            metadata_filter=metadata_filter,
+            rerank_n=rerank_top_n
+        )
+        return result.context()
 
     async def compare(
         self, 
@@ -2,7 +2,8 @@
 Embedding service.
 Generates vector embeddings for text chunks.
 """
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 from app.core.config import settings
 from app.core.logging import get_logger
@@ -10,7 +11,9 @@ from app.core.logging import get_logger
 logger = get_logger(__name__)
 
 
-from langchain_openai import OpenAIEmbeddings
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.chunk_batch import ChunkBatch
 from app.core.config import settings
 from app.core.logging import get_logger
 
@@ -20,36 +23,162 @@ logger = get_logger(__name__)
 class EmbeddingService:
     """Service for generating text embeddings using OpenAI."""
     
-    def __init__(self, model: str = None):
+    def __init__(self, model: str = None, dimensions: int = None):
         """
         Initialize embedding service.
+        
+        dimensions is the default output size; every embedding method also
+        takes a `dimensions` override so one service can feed indexes of
+        different sizes (see VectorStoreService.dimension_for).
         """
         self.model_name = model or settings.EMBEDDING_MODEL
-        self.embeddings = OpenAIEmbeddings(
-            model=self.model_name,
-            openai_api_key=settings.OPENAI_API_KEY
-        )
+        self.dimensions = dimensions or settings.EMBEDDING_DIMENSION
+        self.cache = embedding_cache if settings.EMBEDDING_CACHE_ENABLED else None
+        self.batcher = EmbeddingBatcher(model=self.model_name, dimensions=self.dimensions)
     
-    def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings_batch(self, texts: List[str], dimensions: Optional[int] = None) -> List[List[float]]:
         """
-        Generate embeddings for multiple texts in batch.
+        Generate embeddings for multiple texts in batch (blocking).
+        Must not be called from a running event loop; use aembed_texts there.
         """
         try:
             logger.info("Generating batch embeddings", batch_size=len(texts), model=self.model_name)
-            vectors = self.embeddings.embed_documents(texts)
+            vectors = asyncio.run(self.batcher.embed(texts, dimensions=dimensions))
             logger.info("Batch embeddings generated", count=len(vectors))
             return vectors
         except Exception as e:
             logger.error("Batch embedding generation failed", error=str(e), exc_info=True)
             raise
     
-    async def embed_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _cached_arrays(self, texts: List[str], dimensions: int) -> Tuple[List[Optional[np.ndarray]], List[str]]:
+        """
+        Resolve texts against the cache.
+        Returns (float32 vectors with None for misses, unique miss texts).
+        """
+        if not self.cache:
+            return [None] * len(texts), list(dict.fromkeys(texts))
+        cached = self.cache.get_many(texts, self.model_name, dimensions)
+        # Identical chunks (repeated boilerplate pages) are embedded once
+        miss_texts = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        return cached, miss_texts
+
+    def _lookup_cached(self, texts: List[str], dimensions: int) -> Tuple[List[Optional[List[float]]], List[str]]:
+        """
+        Resolve texts against the cache.
+        Returns (vectors with None for misses, unique miss texts).
+        """
+        cached, miss_texts = self._cached_arrays(texts, dimensions)
+        return [vector.tolist() if vector is not None else None for vector in cached], miss_texts
+
+    def _fill_misses(
+        self,
+        texts: List[str],
+        vectors: List[Optional[List[float]]],
+        miss_texts: List[str],
+        generated: List[List[float]],
+        dimensions: int
+    ) -> List[List[float]]:
+        """Store freshly generated vectors and slot them into the result."""
+        if self.cache and miss_texts:
+            self.cache.put_many(miss_texts, generated, self.model_name, dimensions)
+        by_text = dict(zip(miss_texts, generated))
+        vectors = [vector if vector is not None else by_text[text] for text, vector in zip(texts, vectors)]
+        
+        if self.cache:
+            logger.info(
+                "Embedding cache lookup",
+                requested=len(texts),
+                cache_misses=len(miss_texts),
+                cumulative_hit_rate=self.cache.stats()["hit_rate"]
+            )
+        return vectors
+
+    def embed_texts(self, texts: List[str], dimensions: Optional[int] = None) -> List[List[float]]:
+        """
+        Generate embeddings through the persistent cache (blocking).
+        Only cache misses are sent to the API.
+        """
+        dimensions = dimensions or self.dimensions
+        vectors, miss_texts = self._lookup_cached(texts, dimensions)
+        generated = self.generate_embeddings_batch(miss_texts, dimensions) if miss_texts else []
+        return self._fill_misses(texts, vectors, miss_texts, generated, dimensions)
+
+    async def aembed_texts(
+        self,
+        texts: List[str],
+        token_counts: Optional[List[Optional[int]]] = None,
+        dimensions: Optional[int] = None
+    ) -> List[List[float]]:
+        """
+        Generate embeddings through the persistent cache without blocking the event loop.
+        Cache misses go to the async, token-aware batcher.
+        """
+        dimensions = dimensions or self.dimensions
+        vectors, miss_texts = await asyncio.to_thread(self._lookup_cached, texts, dimensions)
+        generated: List[List[float]] = []
+        if miss_texts:
+            miss_tokens = None
+            if token_counts:
+                tokens_by_text = dict(zip(texts, token_counts))
+                miss_tokens = [tokens_by_text[text] for text in miss_texts]
+            generated = await self.batcher.embed(miss_texts, miss_tokens, dimensions=dimensions)
+        return await asyncio.to_thread(self._fill_misses, texts, vectors, miss_texts, generated, dimensions)
+
+    async def aembed_matrix(
+        self,
+        texts: List[str],
+        token_counts: Optional[List[Optional[int]]] = None,
+        dimensions: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Embeddings as one contiguous (n, dim) float32 matrix.
+        Cache hits are copied in as float32 rows and API responses are
+        written straight into a miss matrix, never held as a list of lists.
+        """
+        dimensions = dimensions or self.dimensions
+        matrix = np.empty((len(texts), dimensions), dtype=np.float32)
+        cached, miss_texts = await asyncio.to_thread(self._cached_arrays, texts, dimensions)
+        
+        miss_matrix = None
+        if miss_texts:
+            miss_tokens = None
+            if token_counts is not None:
+                tokens_by_text = dict(zip(texts, token_counts))
+                miss_tokens = [tokens_by_text[text] for text in miss_texts]
+            miss_matrix = np.empty((len(miss_texts), dimensions), dtype=np.float32)
+            await self.batcher.embed(miss_texts, miss_tokens, out=miss_matrix, dimensions=dimensions)
+            if self.cache:
+                await asyncio.to_thread(self.cache.put_many, miss_texts, miss_matrix, self.model_name, dimensions)
+        
+        miss_rows = {text: row for row, text in enumerate(miss_texts)}
+        for i, (text, vector) in enumerate(zip(texts, cached)):
+            matrix[i] = vector if vector is not None else miss_matrix[miss_rows[text]]
+        
+        if self.cache:
+            logger.info(
+                "Embedding cache lookup",
+                requested=len(texts),
+                cache_misses=len(miss_texts),
+                cumulative_hit_rate=self.cache.stats()["hit_rate"]
+            )
+        return matrix
+
+    async def embed_batch(self, batch: ChunkBatch, dimensions: Optional[int] = None) -> ChunkBatch:
+        """
+        Fill batch.embeddings with a float32 matrix for every chunk.
+        """
+        token_counts = batch.token_counts.tolist() if batch.token_counts is not None else None
+        batch.embeddings = await self.aembed_matrix(batch.texts(), token_counts, dimensions)
+        logger.info("Chunk batch embedded", chunk_count=len(batch), matrix_bytes=batch.embeddings.nbytes)
+        return batch
+
+    async def embed_chunks(self, chunks: List[Dict[str, Any]], dimensions: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Generate embeddings for text chunks.
         """
         texts = [chunk["chunk_text"] for chunk in chunks]
-        # langchain embed_documents is synchronous, but we can call it here
-        embeddings = self.generate_embeddings_batch(texts)
+        token_counts = [chunk.get("chunk_token_count") for chunk in chunks]
+        embeddings = await self.aembed_texts(texts, token_counts, dimensions)
         
         for chunk, embedding in zip(chunks, embeddings):
             chunk["embedding"] = embedding
@@ -57,12 +186,13 @@ class EmbeddingService:
         logger.info("Chunks embedded", chunk_count=len(chunks))
         return chunks
 
-    async def embed_text(self, text: str) -> List[float]:
+    async def embed_text(self, text: str, dimensions: Optional[int] = None) -> List[float]:
         """
         Generate embedding for a single text.
         """
         try:
-            return self.embeddings.embed_query(text)
+            vectors = await self.batcher.embed([text], dimensions=dimensions)
+            return vectors[0]
         except Exception as e:
             logger.error("Text embedding failed", error=str(e))
             raise
@@ -0,0 +1,239 @@
+"""
+Async embedding batcher.
+Packs texts into OpenAI embedding requests by estimated token count and
+keeps a bounded number of requests in flight.
+"""
+import asyncio
+import base64
+import time
+from typing import List, Optional, Sequence, Union
+import numpy as np
+import openai
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Models that accept the `dimensions` request parameter
+_DIMENSIONS_MODEL_PREFIXES = ("text-embedding-3",)
+
+def shorten_embeddings(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Truncate (n, dim) embeddings to their first `dimensions` values and
+    re-normalise each row to unit length.
+
+    text-embedding-3 models are trained Matryoshka-style, so this matches
+    what the API returns for the `dimensions` parameter; it lets stored
+    full-size vectors be evaluated or reused at a smaller size.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or vectors.shape[1] <= dimensions:
+        return vectors
+    shortened = np.ascontiguousarray(vectors[:, :dimensions])
+    norms = np.linalg.norm(shortened, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    shortened /= norms
+    return shortened
+
+
+# Errors worth retrying as-is; anything else is either fatal or a bad input
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+class EmbeddingBatcher:
+    """
+    Native async embedding engine.
+
+    - Texts are packed into requests by estimated tokens (max_batch_tokens)
+      and item count (max_batch_items), preserving input order.
+    - At most max_concurrency requests are in flight (semaphore).
+    - A failed request is retried on its own with exponential backoff; a
+      rejected request (400) is split in half so one bad input does not
+      fail its neighbours.
+    - Vectors are written back by input position, so output order always
+      matches input order regardless of completion order.
+    - Responses are requested base64-encoded and decoded with
+      numpy.frombuffer straight into float32 rows, instead of parsing a
+      JSON array of 3072 floats per vector.
+    - Vectors come back at the requested `dimensions`: via the API
+      parameter where the model supports it, otherwise shortened locally.
+    """
+
+    def __init__(
+        self,
+        model: str = None,
+        max_batch_tokens: int = None,
+        max_batch_items: int = None,
+        max_concurrency: int = None,
+        max_retries: int = None,
+        dimensions: Optional[int] = None,
+        send_dimensions: Optional[bool] = None
+    ):
+        self.model_name = model or settings.EMBEDDING_MODEL
+        self.dimensions = dimensions
+        if send_dimensions is None:
+            send_dimensions = settings.EMBEDDING_SEND_DIMENSIONS and self.supports_dimensions(self.model_name)
+        self.send_dimensions = send_dimensions
+        self.max_batch_tokens = max_batch_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+        self.max_batch_items = max_batch_items or settings.EMBEDDING_BATCH_MAX_ITEMS
+        self.max_concurrency = max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> openai.AsyncOpenAI:
+        """
+        AsyncOpenAI client bound to the running loop.
+        Celery tasks call asyncio.run() per job, and an httpx pool cannot
+        outlive the loop it was created on.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+            self._client_loop = loop
+        return self._client
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """
+        Cheap upper-bound token estimate.
+        ~4 chars/token for prose; dense numeric tables run closer to 3.
+        """
+        return len(text) // 3 + 1
+
+    def pack(self, texts: Sequence[str], token_counts: Optional[Sequence[Optional[int]]] = None) -> List[List[int]]:
+        """Group text positions into request-sized batches, in order."""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = token_counts[i] if token_counts and token_counts[i] else self.estimate_tokens(text)
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_items
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def supports_dimensions(model: str) -> bool:
+        """Whether the model accepts the `dimensions` request parameter."""
+        return model.startswith(_DIMENSIONS_MODEL_PREFIXES)
+
+    @staticmethod
+    def decode(embeddings: Sequence[Union[str, List[float]]]) -> np.ndarray:
+        """
+        Decode response embeddings into an (n, dim) float32 matrix.
+        base64 payloads are little-endian float32, so each one is a single
+        frombuffer over the decoded bytes; float lists are accepted too.
+        """
+        if embeddings and isinstance(embeddings[0], str):
+            raw = b"".join(base64.b64decode(embedding) for embedding in embeddings)
+            return np.frombuffer(raw, dtype="<f4").reshape(len(embeddings), -1)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    async def _request(self, texts: List[str], dimensions: Optional[int] = None) -> np.ndarray:
+        """One embeddings API call, returned as an (n, dim) float32 matrix."""
+        params = {"model": self.model_name, "input": texts, "encoding_format": "base64"}
+        if dimensions and self.send_dimensions:
+            params["dimensions"] = dimensions
+        response = await self._get_client().embeddings.create(**params)
+        # The API returns items with an explicit index; don't rely on list order
+        ordered = sorted(response.data, key=lambda item: item.index)
+        vectors = self.decode([item.embedding for item in ordered])
+        return shorten_embeddings(vectors, dimensions) if dimensions else vectors
+
+    async def _embed_batch(
+        self,
+        positions: List[int],
+        texts: Sequence[str],
+        results: Union[List[Optional[List[float]]], np.ndarray],
+        semaphore: asyncio.Semaphore,
+        dimensions: Optional[int] = None
+    ) -> None:
+        """Embed one packed batch, retrying only this batch on failure."""
+        batch_texts = [texts[i] for i in positions]
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    start = time.time()
+                    vectors = await self._request(batch_texts, dimensions)
+                logger.debug(
+                    "Embedding batch completed",
+                    size=len(positions),
+                    latency=round(time.time() - start, 3),
+                    attempt=attempt
+                )
+                if isinstance(results, np.ndarray):
+                    results[positions] = vectors
+                else:
+                    for i, vector in zip(positions, vectors.tolist()):
+                        results[i] = vector
+                return
+            except _RETRYABLE_ERRORS as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    logger.error("Embedding batch failed after retries", size=len(positions), error=str(e))
+                    raise
+                delay = min(2 ** attempt, 30)
+                logger.warning("Embedding batch failed, retrying", size=len(positions), attempt=attempt, delay=delay, error=str(e))
+                await asyncio.sleep(delay)
+            except openai.BadRequestError as e:
+                if len(positions) == 1:
+                    logger.error("Embedding input rejected", position=positions[0], error=str(e))
+                    raise
+                # Isolate the offending input by halving the batch
+                mid = len(positions) // 2
+                await asyncio.gather(
+                    self._embed_batch(positions[:mid], texts, results, semaphore, dimensions),
+                    self._embed_batch(positions[mid:], texts, results, semaphore, dimensions)
+                )
+                return
+
+    async def embed(
+        self,
+        texts: Sequence[str],
+        token_counts: Optional[Sequence[Optional[int]]] = None,
+        out: Optional[np.ndarray] = None,
+        dimensions: Optional[int] = None
+    ):
+        """
+        Embed texts concurrently. Returns vectors in input order.
+        
+        With `out` (an (n, dim) float32 matrix), each response is written
+        straight into its rows and `out` is returned, so list-of-floats
+        vectors only live for the duration of one request.
+        `dimensions` overrides the batcher's default target size.
+        """
+        dimensions = dimensions or self.dimensions
+        if not texts:
+            return out if out is not None else []
+        batches = self.pack(texts, token_counts)
+        results = out if out is not None else [None] * len(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        start = time.time()
+        await asyncio.gather(*(
+            self._embed_batch(positions, texts, results, semaphore, dimensions) for positions in batches
+        ))
+        logger.info(
+            "Async embeddings generated",
+            count=len(texts),
+            requests=len(batches),
+            concurrency=self.max_concurrency,
+            model=self.model_name,
+            dimensions=dimensions,
+            duration=round(time.time() - start, 3)
+        )
+        return results
@@ -0,0 +1,179 @@
+"""
+Persistent embedding cache.
+Content-addressed SQLite store for embedding vectors, keyed by
+(model, dimensions, sha256(text)).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Sequence
+import numpy as np
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Embedding cache backed by a local SQLite file.
+
+    Vectors are stored as float32 blobs. Every hit refreshes last_access,
+    and once the stored bytes exceed max_bytes the least recently used
+    rows are evicted down to 90% of the budget. The stored bytes are a
+    running total in cache_meta, kept by triggers on every insert, update
+    and delete. WAL mode lets several Celery worker processes on one host
+    share the same file; each process opens its own connection.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        self.path = path or settings.EMBEDDING_CACHE_PATH
+        self.max_bytes = max_bytes or settings.EMBEDDING_CACHE_MAX_BYTES
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """Content address of a chunk text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the cache file lazily (first use in each process, not import time)."""
+        if self._conn is not None and self._conn_pid != os.getpid():
+            # Forked worker: the connection belongs to the parent and must not be shared
+            self._conn = None
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " dimensions INTEGER NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " nbytes INTEGER NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " PRIMARY KEY (model, dimensions, text_hash))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # Seeded once from the rows already stored (caches created before the running total)
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_meta (key, value)"
+                " SELECT 'total_bytes', COALESCE(SUM(nbytes), 0) FROM embeddings"
+            )
+            conn.executescript(
+                "CREATE TRIGGER IF NOT EXISTS embeddings_bytes_insert AFTER INSERT ON embeddings BEGIN"
+                " UPDATE cache_meta SET value = value + NEW.nbytes WHERE key = 'total_bytes'; END;"
+                "CREATE TRIGGER IF NOT EXISTS embeddings_bytes_update AFTER UPDATE OF nbytes ON embeddings BEGIN"
+                " UPDATE cache_meta SET value = value + NEW.nbytes - OLD.nbytes WHERE key = 'total_bytes'; END;"
+                "CREATE TRIGGER IF NOT EXISTS embeddings_bytes_delete AFTER DELETE ON embeddings BEGIN"
+                " UPDATE cache_meta SET value = value - OLD.nbytes WHERE key = 'total_bytes'; END;"
+            )
+            conn.commit()
+            self._conn = conn
+            self._conn_pid = os.getpid()
+            logger.info("Embedding cache opened", path=self.path, max_bytes=self.max_bytes)
+        return self._conn
+
+    def get_many(self, texts: Sequence[str], model: str, dimensions: int) -> List[Optional[np.ndarray]]:
+        """
+        Look up vectors for texts. Returns one entry per text, None on a miss.
+        """
+        hashes = [self.text_hash(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            conn = self._connect()
+            unique = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique), _SQL_BATCH):
+                batch = unique[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings"
+                    f" WHERE model = ? AND dimensions = ? AND text_hash IN ({placeholders})",
+                    (model, dimensions, *batch)
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                    [(now, model, dimensions, text_hash) for text_hash in found]
+                )
+                conn.commit()
+
+        results = [found.get(text_hash) for text_hash in hashes]
+        hits = sum(1 for vector in results if vector is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]], model: str, dimensions: int) -> None:
+        """Store vectors for texts, then evict if over budget."""
+        if not texts:
+            return
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((model, dimensions, self.text_hash(text), blob, len(blob), now))
+
+        with self._lock:
+            conn = self._connect()
+            # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete does not fire triggers
+            conn.executemany(
+                "INSERT INTO embeddings"
+                " (model, dimensions, text_hash, vector, nbytes, last_access) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (model, dimensions, text_hash) DO UPDATE SET"
+                " vector = excluded.vector, nbytes = excluded.nbytes, last_access = excluded.last_access",
+                rows
+            )
+            conn.commit()
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least recently used rows until the cache is back under 90% of max_bytes."""
+        total = conn.execute("SELECT value FROM cache_meta WHERE key = 'total_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        cursor = conn.execute("SELECT rowid, nbytes FROM embeddings ORDER BY last_access ASC")
+        doomed = []
+        for rowid, nbytes in cursor:
+            if total <= target:
+                break
+            doomed.append((rowid,))
+            total -= nbytes
+            evicted += 1
+        conn.executemany("DELETE FROM embeddings WHERE rowid = ?", doomed)
+        conn.commit()
+        logger.info("Embedding cache evicted LRU entries", evicted=evicted, remaining_bytes=total)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cumulative hit-rate statistics for this process."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+embedding_cache = EmbeddingCache()
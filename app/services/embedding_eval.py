@@ -0,0 +1,149 @@
+"""
+Reduced-dimension embedding evaluation.
+Compares retrieval at shortened embedding sizes against the full-size
+baseline for the summary SUBQUERIES, to pick PINECONE_INDEX_DIMENSIONS
+from data.
+
+Usage:
+    python -m app.services.embedding_eval --file prospectus.pdf
+    python -m app.services.embedding_eval --namespace "Company DRHP.pdf"
+    python -m app.services.embedding_eval --file prospectus.pdf --dimensions 256,512,1024 --top-k 10
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Sequence
+import numpy as np
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.chunking import chunking_service
+from app.services.embedding import EmbeddingService
+from app.services.embedding_batcher import shorten_embeddings
+from app.services.extraction import extraction_service
+from app.services.summarization.prompts import SUBQUERIES
+from app.services.vector_registry import vector_registry
+from app.services.vector_store import vector_store_service
+
+logger = get_logger(__name__)
+
+DEFAULT_DIMENSIONS = (256, 512, 1024, 1536)
+
+# Pinecone fetch takes ids in the query string; keep requests short
+_FETCH_BATCH = 100
+
+
+def load_file_vectors(path: str, embedding: EmbeddingService) -> np.ndarray:
+    """Chunk a local document and embed it at full size (through the embedding cache)."""
+    file_type = "pdf" if path.lower().endswith(".pdf") else "txt"
+    with open(path, "rb") as fh:
+        extraction_result = extraction_service.extract_text(fh, file_type)
+    batch = chunking_service.chunk_batch(
+        extraction_result["text"],
+        sections=extraction_result.get("sections")
+    )
+    asyncio.run(embedding.embed_batch(batch, embedding.dimensions))
+    return batch.embeddings
+
+
+def load_index_vectors(namespace: str, index_name: str, host: str) -> np.ndarray:
+    """Fetch a document's stored vectors from Pinecone."""
+    index = vector_store_service.get_index(index_name, host=host)
+    ids = vector_registry.document_ids(index, vector_store_service._extract_index_name(index_name), namespace)
+    rows = []
+    for start in range(0, len(ids), _FETCH_BATCH):
+        fetched = index.fetch(ids=ids[start:start + _FETCH_BATCH], namespace="")
+        rows.extend(vector.values for vector in fetched.vectors.values())
+    if not rows:
+        raise SystemExit(f"No vectors found for {namespace!r} in {index_name}")
+    return np.asarray(rows, dtype=np.float32)
+
+
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Exact cosine top-k row indexes per query (rows are unit length)."""
+    scores = queries @ matrix.T
+    k = min(k, matrix.shape[0])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, candidates, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def evaluate(
+    chunk_vectors: np.ndarray,
+    query_vectors: np.ndarray,
+    dimensions: Sequence[int],
+    k: int,
+    repeat: int = 20
+) -> List[Dict[str, Any]]:
+    """
+    Per-dimension retrieval overlap with the full-size top-k and exact
+    search latency. Overlap@k is |top-k(d) ∩ top-k(full)| / k per query.
+    """
+    full_size = chunk_vectors.shape[1]
+    baseline = top_k(chunk_vectors, query_vectors, k)
+    results = []
+    for size in sorted({d for d in dimensions if d <= full_size} | {full_size}):
+        chunks = shorten_embeddings(chunk_vectors, size)
+        queries = shorten_embeddings(query_vectors, size)
+        found = top_k(chunks, queries, k)
+        overlap = np.array([
+            len(set(expected) & set(actual)) / len(expected)
+            for expected, actual in zip(baseline.tolist(), found.tolist())
+        ])
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                top_k(chunks, query[None, :], k)
+        latency_ms = (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+        results.append({
+            "dimensions": size,
+            "overlap_mean": round(float(overlap.mean()), 4),
+            "overlap_min": round(float(overlap.min()), 4),
+            "top1_match": round(float((found[:, 0] == baseline[:, 0]).mean()), 4),
+            "query_latency_ms": round(latency_ms, 3),
+            "bytes_per_vector": size * 4,
+            "index_bytes": size * 4 * chunks.shape[0],
+        })
+    return results
+
+
+def main(argv: List[str] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="Local PDF/TXT to chunk and embed at full size")
+    source.add_argument("--namespace", help="documentName of an ingested document (full-size index)")
+    parser.add_argument("--index", default=settings.PINECONE_DRHP_INDEX)
+    parser.add_argument("--host", default=settings.PINECONE_DRHP_HOST)
+    parser.add_argument("--dimensions", default=",".join(str(d) for d in DEFAULT_DIMENSIONS))
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    embedding = EmbeddingService()
+    if args.file:
+        chunk_vectors = load_file_vectors(args.file, embedding)
+    else:
+        chunk_vectors = load_index_vectors(args.namespace, args.index, args.host)
+    full_size = chunk_vectors.shape[1]
+    query_vectors = np.asarray(
+        asyncio.run(embedding.aembed_texts(list(SUBQUERIES), dimensions=full_size)),
+        dtype=np.float32
+    )
+    dimensions = [int(d) for d in args.dimensions.split(",") if d.strip()]
+    results = evaluate(chunk_vectors, query_vectors, dimensions, args.top_k)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Chunks: {chunk_vectors.shape[0]}, queries: {len(SUBQUERIES)}, baseline: {full_size}-d, k={args.top_k}")
+        print(f"{'dims':>6} {'overlap@k':>10} {'min':>6} {'top1':>6} {'query ms':>9} {'KB/vector':>10}")
+        for row in results:
+            print(
+                f"{row['dimensions']:>6} {row['overlap_mean']:>10.3f} {row['overlap_min']:>6.2f} "
+                f"{row['top1_match']:>6.2f} {row['query_latency_ms']:>9.3f} {row['bytes_per_vector'] / 1024:>10.1f}"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    main()
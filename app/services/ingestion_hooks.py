@@ -0,0 +1,77 @@
+"""
+Ingestion hooks.
+The bookkeeping every ingestion route runs around its upsert (the Celery
+task and the direct route alike): stale precomputed rankings are dropped
+before the new chunks are written, orphaned vectors are swept and the
+layout record gets its chunk count after, and the summary queries are
+ranked again once the document is recorded.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional
+from app.services.vector_store import vector_store_service
+from app.services.namespace_layout import namespace_layout
+from app.services.precomputed_retrieval import precomputed_retrieval
+from app.services.working_set import working_set_cache
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class IngestionHooks:
+    """Steps shared by IngestionPipeline.process and the process_document task."""
+
+    @staticmethod
+    def before_upsert(index_name: str, chunk_metadata: Dict[str, Any]) -> None:
+        """Rankings precomputed for a previous ingestion point at chunks this one replaces."""
+        precomputed_retrieval.forget(index_name, chunk_metadata["documentName"], chunk_metadata.get("domainId"))
+
+    @staticmethod
+    def after_upsert(index_name: str, host: str, chunk_metadata: Dict[str, Any], chunk_count: int) -> None:
+        """
+        Drop vectors a previous, longer ingestion left behind, record the
+        chunk count, and drop this process's cached working set of the copy.
+        """
+        namespace = chunk_metadata["documentName"]
+        vector_store_service.remove_orphans(index_name, namespace, chunk_metadata, host=host)
+        working_set_cache.invalidate(namespace, chunk_metadata.get("domainId"), chunk_metadata.get("documentId"))
+        namespace_layout.annotate(
+            vector_store_service._extract_index_name(index_name), namespace, chunk_metadata, chunk_count=chunk_count
+        )
+
+    @staticmethod
+    async def precompute(
+        index_name: str,
+        host: str,
+        document: Dict[str, Any],
+        subqueries: Optional[List[str]] = None
+    ) -> int:
+        """
+        Store the rankings of every query a summary of this document runs
+        (its domain's active subqueries unless given). Failures only log:
+        summaries then retrieve as usual, and the ingestion is not failed.
+        """
+        from app.services.fund_service import fund_service
+
+        try:
+            if subqueries is None:
+                domain_id = document.get("domainId")
+                tenant_config = await asyncio.to_thread(fund_service.get_fund_config_sync, domain_id) if domain_id else {}
+                subqueries = precomputed_retrieval.subqueries(tenant_config)
+            return await precomputed_retrieval.compute(index_name, host, document, subqueries)
+        except Exception as e:
+            logger.warning("Retrieval precompute failed", namespace=document.get("documentName"), error=str(e))
+            return 0
+
+    async def after_record(self, index_name: str, host: str, chunk_metadata: Dict[str, Any]) -> int:
+        """
+        Rank the summary queries once the processing record exists, before
+        the route notifies that the document is ready: a summary requested
+        straight away must find them.
+        """
+        if not settings.RETRIEVAL_PRECOMPUTE:
+            return 0
+        return await self.precompute(index_name, host, chunk_metadata)
+
+
+ingestion_hooks = IngestionHooks()
@@ -5,11 +5,13 @@ Handles document processing and vector storage directly.
 import time
 import asyncio
 from typing import Dict, Any, Optional
-import requests
+from app.services.document_source import document_source
 from app.services.extraction import ExtractionService
 from app.services.chunking import ChunkingService
 from app.services.embedding import EmbeddingService
 from app.services.vector_store import vector_store_service
+from app.services.streaming_ingestion import StreamingIngestionPipeline
+from app.services.ingestion_hooks import ingestion_hooks
 from app.services.backend_notifier import backend_notifier
 from app.db.mongo import mongodb
 from app.core.config import settings
@@ -22,6 +24,7 @@ class IngestionPipeline:
         self.extraction = ExtractionService()
         self.chunking = ChunkingService()
         self.embedding = EmbeddingService()
+        self.streaming = StreamingIngestionPipeline(self.extraction, self.chunking, self.embedding)
 
     async def process(
         self, 
@@ -41,16 +44,6 @@ class IngestionPipeline:
         logger.info("Starting direct document ingestion", job_id=job_id, filename=filename)
         
         try:
-            # 1. Download document
-            resp = requests.get(file_url, timeout=30)
-            resp.raise_for_status()
-            file_content = resp.content
-            
-            # 2. Extract and Clean
-            extraction_result = self.extraction.extract_text(file_content, file_type)
-            text = extraction_result["text"]
-            
-            # 3. Chunk
             chunk_metadata = {
                 "source": file_url,
                 "job_id": job_id,
@@ -61,29 +54,69 @@ class IngestionPipeline:
                 "type": doc_type.upper() if doc_type else "DRHP"
             }
             
-            chunks = self.chunking.chunk_with_metadata(
-                text,
-                metadata=chunk_metadata
-            )
-            
-            if not chunks:
-               logger.warning("No text extracted or chunks created", job_id=job_id)
-               return {"success": False, "error": "No text extracted from document"}
-
-            # 4. Embed
-            chunks_with_embeddings = await self.embedding.embed_chunks(chunks)
-            
-            # 5. Store in Pinecone (Unified Index)
             # Both DRHP and RHP are stored in the same index: drhp-summarizer
             index_name = settings.PINECONE_DRHP_INDEX
             host = settings.PINECONE_DRHP_HOST
+            
+            # Rankings precomputed for a previous ingestion point at chunks this one replaces
+            ingestion_hooks.before_upsert(index_name, chunk_metadata)
+            
+            # 1. Fetch document into a spooled file (URL, file:// or shared-volume path)
+            with document_source.fetch(file_url) as document:
+                file_content = document.file
                 
-            pinecone_res = vector_store_service.upsert_chunks(
-                chunks=chunks_with_embeddings,
-                index_name=index_name,
-                namespace=filename,
-                host=host
-            )
+                if settings.INGESTION_STREAMING:
+                    # 2-5. Extract, chunk, embed and upsert as overlapping stages
+                    stream_res = await self.streaming.run(
+                        file_content,
+                        file_type,
+                        chunk_metadata,
+                        index_name=index_name,
+                        namespace=filename,
+                        host=host
+                    )
+                    chunk_count = stream_res["chunk_count"]
+                    boilerplate_stats = stream_res.get("boilerplate")
+                    if not chunk_count:
+                        logger.warning("No text extracted or chunks created", job_id=job_id)
+                        return {"success": False, "error": "No text extracted from document"}
+                    pinecone_res = {
+                        "upserted_count": stream_res["upserted_count"],
+                        "namespace": filename,
+                        "index": index_name
+                    }
+                else:
+                    # 2. Extract and Clean
+                    extraction_result = self.extraction.extract_text(file_content, file_type)
+                    text = extraction_result["text"]
+                
+                    # 3. Chunk (per DRHP section when detected)
+                    batch = self.chunking.chunk_batch(
+                        text,
+                        metadata=chunk_metadata,
+                        sections=extraction_result.get("sections"),
+                        page_starts=extraction_result.get("page_starts")
+                    )
+                
+                    if not batch:
+                       logger.warning("No text extracted or chunks created", job_id=job_id)
+                       return {"success": False, "error": "No text extracted from document"}
+                    chunk_count = len(batch)
+                    boilerplate_stats = extraction_result.get("boilerplate")
+
+                    # 4. Embed
+                    await self.embedding.embed_batch(batch, vector_store_service.dimension_for(index_name))
+                
+                    # 5. Store in Pinecone (Unified Index)
+                    pinecone_res = vector_store_service.upsert_batch(
+                        batch=batch,
+                        index_name=index_name,
+                        namespace=filename,
+                        host=host
+                    )
+            
+            # Drop vectors a previous, longer ingestion of this document left behind
+            ingestion_hooks.after_upsert(index_name, host, chunk_metadata, chunk_count)
             
             # 6. MongoDB record
             try:
@@ -93,15 +126,21 @@ class IngestionPipeline:
                 collection.insert_one({
                     "job_id": job_id,
                     "filename": filename,
+                    "documentId": chunk_metadata["documentId"],
+                    "domainId": chunk_metadata["domainId"],
                     "doc_type": doc_type,
                     "status": "completed",
                     "pinecone_count": pinecone_res.get("upserted_count", 0),
+                    "boilerplate": boilerplate_stats,
                     "created_at": time.time()
                 })
             except Exception as mongo_err:
                 logger.warning("MongoDB record skipped", error=str(mongo_err))
 
-            # 7. Notify Backend
+            # 7. Rank the summary queries before the document is reported ready
+            await ingestion_hooks.after_record(index_name, host, chunk_metadata)
+            
+            # 8. Notify Backend
             backend_notifier.notify_status(
                 job_id=job_id,
                 status="completed",
@@ -114,7 +153,7 @@ class IngestionPipeline:
             return {
                 "success": True,
                 "filename": filename,
-                "chunk_count": len(chunks),
+                "chunk_count": chunk_count,
                 "pinecone": pinecone_res,
                 "duration": execution_time
             }
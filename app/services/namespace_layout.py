@@ -0,0 +1,251 @@
+"""
+Vector namespace layout.
+Decides which Pinecone namespace a document's vectors live in
+(NAMESPACE_STRATEGY) and records, per document, the layout it was
+written or migrated with, so queries go straight to the right namespace
+with only the filters that namespace still needs.
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ASCENDING, UpdateOne
+from app.db.mongo import mongodb
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Layouts: "shared" (everything in ""), "domain" (one namespace per domainId),
+# "document" (one per documentId) and "legacy" (a namespace named after the
+# document, whose vectors may lack documentName metadata).
+LAYOUTS = ("shared", "domain", "document", "legacy")
+
+# Filter keys each layout's namespace already guarantees
+_IMPLIED_KEYS = {
+    "shared": (),
+    "domain": ("domainId", "domain"),
+    "document": ("documentName", "documentId", "domainId", "domain"),
+    "legacy": ("documentName",),
+}
+
+
+class Route:
+    """
+    Where to query one document: namespace, filter and the layout they
+    came from (None = unknown), plus the document's domainId, which picks
+    its shard (see app.services.shard_router).
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        filter: Optional[Dict[str, Any]],
+        layout: Optional[str] = None,
+        domain_id: Optional[str] = None
+    ):
+        self.namespace = namespace
+        self.filter = filter
+        self.layout = layout
+        self.domain_id = domain_id
+
+    @property
+    def known(self) -> bool:
+        return self.layout is not None
+
+    def __repr__(self) -> str:
+        return (
+            f"Route(namespace={self.namespace!r}, filter={self.filter!r}, layout={self.layout!r}, "
+            f"domain_id={self.domain_id!r})"
+        )
+
+
+class NamespaceLayout:
+    """
+    Layout records live in one Mongo collection, one per document and
+    index: index, documentName, documentId, domainId, layout, namespace,
+    updated_at, plus host and chunk_count once ingestion recorded them,
+    and legacy_checked_at once the document was swept for legacy ids.
+    Records are written at ingestion and by the namespace migration, or
+    learned (learned_at set) where retrieval found a document that had
+    none; a written record replaces learned ones. Lookups are cached
+    in-process for NAMESPACE_LAYOUT_CACHE_TTL seconds.
+    """
+
+    def __init__(self, collection_name: str = None):
+        self.collection_name = collection_name or settings.NAMESPACE_LAYOUT_COLLECTION
+        self._indexed = False
+        self._cache: Dict[Tuple[str, str], Tuple[float, List[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+
+    def _collection(self):
+        if mongodb.sync_db is None:
+            mongodb.connect_sync()
+        collection = mongodb.get_sync_collection(self.collection_name)
+        if not self._indexed:
+            collection.create_index(
+                [("index", ASCENDING), ("documentName", ASCENDING), ("domainId", ASCENDING), ("documentId", ASCENDING)],
+                unique=True
+            )
+            self._indexed = True
+        return collection
+
+    @staticmethod
+    def namespace_for(metadata: Optional[Dict[str, Any]], strategy: str = None) -> Tuple[str, str]:
+        """
+        (layout, namespace) for a chunk's metadata under a strategy
+        (default NAMESPACE_STRATEGY). Chunks missing the key a strategy
+        partitions on stay in the shared namespace.
+        """
+        metadata = metadata or {}
+        strategy = strategy or settings.NAMESPACE_STRATEGY
+        domain_id = metadata.get("domainId") or ""
+        document_id = metadata.get("documentId") or ""
+        if strategy == "domain" and domain_id:
+            return "domain", f"domain-{domain_id}"
+        if strategy == "document" and document_id:
+            return "document", f"doc-{domain_id}-{document_id}"
+        return "shared", ""
+
+    def record(
+        self,
+        index_name: str,
+        document_name: str,
+        metadata: Optional[Dict[str, Any]],
+        layout: str,
+        namespace: str,
+        **fields: Any
+    ) -> None:
+        """Record the layout a document's vectors are now in (fields: e.g. host)."""
+        self.record_many(index_name, [(document_name, metadata or {}, layout, namespace)], **fields)
+
+    def record_many(self, index_name: str, entries: List[Tuple[str, Dict[str, Any], str, str]], **fields: Any) -> None:
+        """record() for (document_name, metadata, layout, namespace) entries in one write."""
+        if not entries:
+            return
+        # Learned records are only guesses of where an older ingestion put the document
+        self._collection().delete_many({
+            "index": index_name,
+            "documentName": {"$in": list({document_name for document_name, *_ in entries})},
+            "learned_at": {"$exists": True},
+        })
+        self._write(index_name, entries, fields)
+
+    def learn(
+        self,
+        index_name: str,
+        document_name: str,
+        metadata: Dict[str, Any],
+        layout: str,
+        namespace: str,
+        host: str = ""
+    ) -> None:
+        """Record where retrieval found a document that had no layout record."""
+        self._write(index_name, [(document_name, metadata, layout, namespace)], {"host": host, "learned_at": time.time()})
+        logger.info("Namespace layout learned", index=index_name, namespace=document_name, layout=layout, vector_namespace=namespace)
+
+    def annotate(self, index_name: str, document_name: str, metadata: Dict[str, Any], **fields: Any) -> None:
+        """Set fields (e.g. chunk_count after ingestion) on a document's layout record; failures only log."""
+        try:
+            self._collection().update_one(self._key(index_name, document_name, metadata), {"$set": fields})
+        except Exception as e:
+            logger.warning("Namespace layout update failed", namespace=document_name, error=str(e))
+        with self._lock:
+            self._cache.pop((index_name, document_name), None)
+
+    def record_for(self, index_name: str, document_name: str, metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The layout record of one tenant's copy of a document, if any."""
+        key = self._key(index_name, document_name, metadata)
+        for record in self.records(index_name, document_name):
+            if record.get("domainId", "") == key["domainId"] and record.get("documentId", "") == key["documentId"]:
+                return record
+        return None
+
+    @staticmethod
+    def _key(index_name: str, document_name: str, metadata: Dict[str, Any]) -> Dict[str, str]:
+        return {
+            "index": index_name,
+            "documentName": document_name,
+            "domainId": metadata.get("domainId") or "",
+            "documentId": metadata.get("documentId") or "",
+        }
+
+    def _write(self, index_name: str, entries: List[Tuple[str, Dict[str, Any], str, str]], fields: Dict[str, Any]) -> None:
+        now = time.time()
+        operations = [
+            UpdateOne(
+                self._key(index_name, document_name, metadata),
+                {"$set": {"layout": layout, "namespace": namespace, "updated_at": now, **fields}},
+                upsert=True
+            )
+            for document_name, metadata, layout, namespace in entries
+        ]
+        if not operations:
+            return
+        self._collection().bulk_write(operations, ordered=False)
+        with self._lock:
+            for document_name, *_ in entries:
+                self._cache.pop((index_name, document_name), None)
+
+    def records(self, index_name: str, document_name: str) -> List[Dict[str, Any]]:
+        """Layout records for a documentName (one per tenant copy), cached."""
+        key = (index_name, document_name)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and time.time() - cached[0] < settings.NAMESPACE_LAYOUT_CACHE_TTL:
+                return cached[1]
+        records = list(self._collection().find({"index": index_name, "documentName": document_name}, {"_id": 0}))
+        with self._lock:
+            self._cache[key] = (time.time(), records)
+        return records
+
+    def forget(self, index_name: str, document_name: str, document_id: str = None, domain_id: str = None) -> None:
+        """Drop layout records of a deleted document (one tenant's copy: documentId or domainId is required)."""
+        if not document_id and not domain_id:
+            raise ValueError("Layout deletion needs a documentId or domainId")
+        query = {"index": index_name, "documentName": document_name}
+        if document_id:
+            query["documentId"] = document_id
+        if domain_id:
+            query["domainId"] = domain_id
+        self._collection().delete_many(query)
+        with self._lock:
+            self._cache.pop((index_name, document_name), None)
+
+    def route(self, index_name: str, document_name: str, query_filter: Optional[Dict[str, Any]] = None) -> Route:
+        """
+        Namespace and filter for querying one document.
+
+        The document's layout records are narrowed by any documentId /
+        domainId in the filter. A single match (or several sharing one
+        namespace) gives a known route, with the filter keys its
+        namespace already implies removed. Otherwise the route is the
+        shared namespace with the full filter and layout None, and the
+        caller may still probe legacy namespaces (and learn() the result).
+        """
+        query_filter = dict(query_filter or {})
+        domain_id = query_filter.get("domainId") if isinstance(query_filter.get("domainId"), str) else None
+        unknown = Route("", query_filter or None, domain_id=domain_id or None)
+        if not document_name:
+            return unknown
+        try:
+            records = self.records(index_name, document_name)
+        except Exception as e:
+            logger.warning("Namespace layout lookup failed", namespace=document_name, error=str(e))
+            return unknown
+        for key in ("documentId", "domainId"):
+            value = query_filter.get(key)
+            if isinstance(value, str) and value:
+                records = [record for record in records if record.get(key) == value]
+        if not records or len({(record["layout"], record["namespace"]) for record in records}) > 1:
+            return unknown
+
+        layout, namespace = records[0]["layout"], records[0]["namespace"]
+        implied = _IMPLIED_KEYS.get(layout, ())
+        route_filter = {key: value for key, value in query_filter.items() if key not in implied}
+        domain_ids = {record.get("domainId") for record in records}
+        if len(domain_ids) == 1:
+            domain_id = domain_ids.pop() or domain_id
+        return Route(namespace, route_filter or None, layout, domain_id or None)
+
+
+namespace_layout = NamespaceLayout()
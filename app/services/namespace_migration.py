@@ -0,0 +1,255 @@
+"""
+Namespace layout migration.
+Copies existing vectors into the NAMESPACE_STRATEGY layout (and onto
+collision-free ids), records each migrated document's layout so queries
+are routed straight to it, and optionally removes the source copies.
+Resumable: progress is checkpointed in Mongo after every batch.
+
+Usage:
+    python -m app.services.namespace_migration --strategy document
+    python -m app.services.namespace_migration --strategy domain --rate 200 --source-namespace ""
+    python -m app.services.namespace_migration --strategy document --delete-source
+"""
+import argparse
+import json
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.db.mongo import mongodb
+from app.services.namespace_layout import namespace_layout
+from app.services.vector_backends import list_ids
+from app.services.vector_registry import vector_registry
+from app.services.vector_store import vector_store_service
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_CHECKPOINTS = "namespace_migrations"
+
+
+class NamespaceMigration:
+    """
+    Moves one index's vectors into a namespace strategy.
+
+    Per source namespace: list ids in order, fetch them in
+    NAMESPACE_MIGRATION_BATCH batches, and upsert each vector into its
+    target namespace under its collision-free id. The vector registry is
+    updated as batches land. Document layouts are recorded only once a
+    source namespace is fully copied, so queries never see a half-copied
+    document. Throughput is capped at NAMESPACE_MIGRATION_RATE vectors
+    per second.
+    """
+
+    def __init__(
+        self,
+        index_name: str = None,
+        host: str = None,
+        strategy: str = None,
+        rate: int = None,
+        batch_size: int = None
+    ):
+        self.index_name = vector_store_service._extract_index_name(index_name or settings.PINECONE_DRHP_INDEX)
+        self.host = settings.PINECONE_DRHP_HOST if host is None else host
+        self.strategy = strategy or settings.NAMESPACE_STRATEGY
+        self.rate = rate or settings.NAMESPACE_MIGRATION_RATE
+        self.batch_size = batch_size or settings.NAMESPACE_MIGRATION_BATCH
+        self.index = vector_store_service.get_index(self.index_name, host=self.host)
+
+    @staticmethod
+    def _checkpoints():
+        if mongodb.sync_db is None:
+            mongodb.connect_sync()
+        return mongodb.get_sync_collection(_CHECKPOINTS)
+
+    def _checkpoint_id(self, source: str) -> str:
+        return f"{self.index_name}|{source}|{self.strategy}"
+
+    def source_namespaces(self) -> List[str]:
+        """Namespaces holding vectors (the default namespace when stats are unavailable)."""
+        try:
+            stats = self.index.describe_index_stats()
+            namespaces = (stats.get("namespaces") if isinstance(stats, dict) else getattr(stats, "namespaces", None)) or {}
+            return sorted(namespaces) or [""]
+        except Exception as e:
+            logger.warning("Index stats unavailable, migrating the default namespace only", error=str(e))
+            return [""]
+
+    def _target(self, source: str, vector_id: str, metadata: Dict[str, Any]) -> Tuple[str, str, str, int]:
+        """(layout, target namespace, target id, chunk_index) for one source vector."""
+        if source and not metadata.get("documentName"):
+            # Legacy per-document namespaces are named after the document
+            metadata["documentName"] = source
+        chunk_index = metadata.get("chunk_index")
+        if chunk_index is None:
+            chunk_index = vector_id.rsplit("_", 1)[-1].rsplit(":", 1)[-1]
+        chunk_index = int(float(chunk_index))
+        layout, target_namespace = namespace_layout.namespace_for(metadata, self.strategy)
+        target_id = vector_registry.vector_id(metadata["documentName"], chunk_index, metadata)
+        return layout, target_namespace, target_id, chunk_index
+
+    def _pages(self, source: str, after: str = "") -> Iterator[List[str]]:
+        """Source ids in listing (lexicographic) order, in batches, skipping ids up to `after`."""
+        pending: List[str] = []
+        for page in list_ids(self.index, namespace=source):
+            pending.extend(vector_id for vector_id in page if vector_id > after)
+            while len(pending) >= self.batch_size:
+                yield pending[:self.batch_size]
+                pending = pending[self.batch_size:]
+        if pending:
+            yield pending
+
+    def _throttle(self, started: float, vectors: int) -> None:
+        """Sleep so that `vectors` since `started` stays under the rate limit."""
+        if self.rate > 0:
+            delay = vectors / self.rate - (time.time() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def copy_namespace(self, source: str, restart: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+        """Copy one source namespace into the target layout; resumes from its checkpoint."""
+        checkpoints = self._checkpoints()
+        checkpoint_id = self._checkpoint_id(source)
+        checkpoint = None if restart else checkpoints.find_one({"_id": checkpoint_id})
+        if checkpoint and checkpoint.get("status") in ("copied", "done"):
+            logger.info("Namespace already migrated", source=source, strategy=self.strategy)
+            return {"source": source, "copied": 0, "skipped": 0, "status": checkpoint["status"]}
+        if not dry_run:
+            checkpoints.update_one(
+                {"_id": checkpoint_id},
+                {"$setOnInsert": {"last_id": "", "copied": 0, "skipped": 0, "documents": [], "started_at": time.time()},
+                 "$set": {"status": "running", "index": self.index_name, "source": source, "strategy": self.strategy}},
+                upsert=True
+            )
+        after = (checkpoint or {}).get("last_id", "")
+        copied = skipped = 0
+        targets: Dict[str, int] = defaultdict(int)
+        started = time.time()
+
+        for ids in self._pages(source, after):
+            fetched = self.index.fetch(ids=ids, namespace=source)
+            by_target: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            registrations: Dict[Tuple, List[int]] = defaultdict(list)
+            documents = {}
+            for vector_id, vector in fetched.vectors.items():
+                metadata = dict(vector.metadata or {})
+                if not source and not metadata.get("documentName"):
+                    # Not attributable to a document; left where it is
+                    skipped += 1
+                    continue
+                layout, target_namespace, target_id, chunk_index = self._target(source, vector_id, metadata)
+                document_key = (metadata["documentName"], metadata.get("domainId") or "", metadata.get("documentId") or "")
+                documents[document_key] = {
+                    "documentName": document_key[0], "domainId": document_key[1], "documentId": document_key[2],
+                    "layout": layout, "namespace": target_namespace,
+                }
+                if (target_namespace, target_id) == (source, vector_id):
+                    skipped += 1
+                    continue
+                by_target[target_namespace].append({"id": target_id, "values": list(vector.values), "metadata": metadata})
+                registrations[document_key + (metadata.get("job_id", ""), target_namespace)].append(chunk_index)
+                targets[target_namespace] += 1
+
+            batch_copied = sum(len(vectors) for vectors in by_target.values())
+            if not dry_run:
+                for target_namespace, vectors in by_target.items():
+                    vector_store_service._upsert_batch(self.index, vectors, target_namespace, 0)
+                if settings.VECTOR_REGISTRY_ENABLED:
+                    for (name, domain_id, document_id, job_id, target_namespace), chunk_indexes in registrations.items():
+                        vector_registry.record(
+                            self.index_name, self.host, name,
+                            {"domainId": domain_id, "documentId": document_id, "job_id": job_id},
+                            chunk_indexes, target_namespace
+                        )
+                checkpoints.update_one(
+                    {"_id": checkpoint_id},
+                    {"$set": {"last_id": ids[-1], "updated_at": time.time()},
+                     "$inc": {"copied": batch_copied, "skipped": len(fetched.vectors) - batch_copied},
+                     "$addToSet": {"documents": {"$each": list(documents.values())}}}
+                )
+            copied += batch_copied
+            self._throttle(started, copied + skipped)
+            logger.debug("Migration batch done", source=source, last_id=ids[-1], copied=copied, skipped=skipped)
+
+        if not dry_run:
+            # Route queries to the new layout only now that every document in this source is complete
+            checkpoint = checkpoints.find_one({"_id": checkpoint_id})
+            namespace_layout.record_many(self.index_name, [
+                (document["documentName"], document, document["layout"], document["namespace"])
+                for document in checkpoint.get("documents", [])
+            ])
+            checkpoints.update_one({"_id": checkpoint_id}, {"$set": {"status": "copied", "copied_at": time.time()}})
+        if dry_run:
+            # Nothing was written: report what a real run would copy
+            logger.info("Namespace migration dry run", source=source, strategy=self.strategy, would_copy=copied, skipped=skipped)
+            return {"source": source, "copied": 0, "would_copy": copied, "skipped": skipped, "targets": dict(targets), "status": "dry_run"}
+        logger.info("Namespace copied", source=source, strategy=self.strategy, copied=copied, skipped=skipped)
+        return {"source": source, "copied": copied, "skipped": skipped, "targets": dict(targets), "status": "copied"}
+
+    def delete_source(self, source: str) -> Dict[str, Any]:
+        """
+        Remove source copies of vectors that now live elsewhere.
+        Only runs for a fully copied source; vectors already in place are kept.
+        """
+        checkpoints = self._checkpoints()
+        checkpoint = checkpoints.find_one({"_id": self._checkpoint_id(source)})
+        if not checkpoint or checkpoint.get("status") not in ("copied", "done"):
+            raise RuntimeError(f"Namespace {source!r} is not fully copied to the {self.strategy} layout yet")
+        deleted = 0
+        started = time.time()
+        for ids in self._pages(source):
+            fetched = self.index.fetch(ids=ids, namespace=source)
+            moved = []
+            for vector_id, vector in fetched.vectors.items():
+                metadata = dict(vector.metadata or {})
+                if not source and not metadata.get("documentName"):
+                    continue
+                _, target_namespace, target_id, _ = self._target(source, vector_id, metadata)
+                if (target_namespace, target_id) != (source, vector_id):
+                    moved.append(vector_id)
+            if moved:
+                vector_store_service._delete_ids(self.index, moved, source)
+                deleted += len(moved)
+            self._throttle(started, deleted)
+        checkpoints.update_one({"_id": checkpoint["_id"]}, {"$set": {"status": "done", "deleted": deleted, "done_at": time.time()}})
+        logger.info("Migrated source vectors deleted", source=source, deleted=deleted)
+        return {"source": source, "deleted": deleted}
+
+    def run(
+        self,
+        sources: Optional[List[str]] = None,
+        delete_source: bool = False,
+        restart: bool = False,
+        dry_run: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Migrate every source namespace (default: all namespaces in the index)."""
+        results = []
+        for source in (self.source_namespaces() if sources is None else sources):
+            result = self.copy_namespace(source, restart=restart, dry_run=dry_run)
+            if delete_source and not dry_run:
+                result.update(self.delete_source(source))
+            results.append(result)
+        return results
+
+
+def main(argv: List[str] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strategy", choices=["shared", "domain", "document"], default=settings.NAMESPACE_STRATEGY)
+    parser.add_argument("--index", default=settings.PINECONE_DRHP_INDEX)
+    parser.add_argument("--host", default=settings.PINECONE_DRHP_HOST)
+    parser.add_argument("--source-namespace", action="append", dest="sources", help="Repeatable; default: every namespace")
+    parser.add_argument("--rate", type=int, default=settings.NAMESPACE_MIGRATION_RATE, help="Vectors per second")
+    parser.add_argument("--batch-size", type=int, default=settings.NAMESPACE_MIGRATION_BATCH)
+    parser.add_argument("--delete-source", action="store_true", help="Remove source copies once a namespace is copied")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints and copy from the start")
+    parser.add_argument("--dry-run", action="store_true", help="Count vectors per target namespace without writing")
+    args = parser.parse_args(argv)
+
+    migration = NamespaceMigration(args.index, args.host, args.strategy, args.rate, args.batch_size)
+    results = migration.run(args.sources, delete_source=args.delete_source, restart=args.restart, dry_run=args.dry_run)
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional
 from pymongo import MongoClient
 from app.core.config import settings
+from app.services.query_embeddings import query_embeddings
 from app.services.summarization.prompts import (
     SUBQUERIES,
     SUMMARY_VALIDATOR_SYSTEM_PROMPT,
@@ -494,11 +495,35 @@ class OnboardingAgent:
                 f"matched={result.matched_count}, modified={result.modified_count}, "
                 f"upserted_id={result.upserted_id}"
             )
+            if "custom_subqueries" in update_data:
+                self._refresh_query_embeddings(domain_id, update_data["custom_subqueries"])
+                self._refresh_precomputed_retrieval(domain_id)
             return True
         except Exception as e:
             logger.error(f"Failed to save onboarding config to MongoDB: {e}")
             return False
 
+    def _refresh_query_embeddings(self, domain_id: str, subqueries: List[str]) -> None:
+        """Embeds the tenant's subqueries once, so summary jobs never embed them."""
+        try:
+            embedded = query_embeddings.refresh_domain(domain_id, subqueries)
+            logger.info(f"Query embeddings refreshed for {domain_id}: {embedded} newly embedded")
+        except Exception as e:
+            # Summary jobs register (and if needed embed) them on first use instead
+            logger.warning(f"Failed to refresh query embeddings for {domain_id}: {e}")
+
+    def _refresh_precomputed_retrieval(self, domain_id: str) -> None:
+        """Re-ranks the new subqueries for the tenant's documents in the background."""
+        if not settings.RETRIEVAL_PRECOMPUTE:
+            return
+        try:
+            from app.workers.celery_app import celery_app
+            celery_app.send_task("precompute_retrieval", args=[domain_id])
+            logger.info(f"Precomputed retrieval refresh queued for {domain_id}")
+        except Exception as e:
+            # Summary jobs retrieve subqueries that have no stored ranking
+            logger.warning(f"Failed to queue precomputed retrieval refresh for {domain_id}: {e}")
+
 
 # ─────────────────────────────────────────────
 # Public API Functions
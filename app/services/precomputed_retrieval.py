@@ -0,0 +1,207 @@
+"""
+Precomputed retrieval.
+The summary agents' queries (the Agent 1/2 queries and the domain's
+subqueries) are known before any summary is requested, so ingestion can
+retrieve them once and store each query's ranked chunk ids in Mongo.
+Summary jobs then read those rankings instead of embedding and querying.
+"""
+import hashlib
+import time
+from typing import Any, Dict, List, Optional
+from app.db.mongo import mongodb
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Filter fields a precomputed ranking can answer (every chunk of a document shares them)
+DOCUMENT_FIELDS = ("documentName", "documentId", "domainId", "domain", "type")
+
+AGENT_SECTIONS = ["capital_structure"]
+
+
+class PrecomputedRetrieval:
+    """
+    One Mongo record per (index, document, sections, query text): _id
+    (sha256 of those), index, host, documentName, documentId, domainId,
+    domain, type, query, sections, top_k, job_id (the ingestion it was
+    computed for), matches ([{id, score, metadata}] in rank order) and
+    updated_at.
+
+    Records of a document are dropped when it is re-ingested or deleted;
+    a domain's records for subqueries it no longer uses are dropped when
+    it is re-onboarded. Queries with no record are simply retrieved.
+    """
+
+    def __init__(self, collection_name: str = None):
+        self.collection_name = collection_name or settings.RETRIEVAL_PRECOMPUTE_COLLECTION
+        self._indexed = False
+
+    def _collection(self):
+        if mongodb.sync_db is None:
+            mongodb.connect_sync()
+        collection = mongodb.get_sync_collection(self.collection_name)
+        if not self._indexed:
+            collection.create_index([("index", 1), ("documentName", 1), ("domainId", 1)])
+            collection.create_index([("domainId", 1), ("query", 1)])
+            self._indexed = True
+        return collection
+
+    @staticmethod
+    def _index_name(index_name: str) -> str:
+        from app.services.vector_store import vector_store_service
+        return vector_store_service._extract_index_name(index_name)
+
+    @staticmethod
+    def key(
+        index_name: str,
+        document_name: str,
+        domain_id: Optional[str],
+        document_id: Optional[str],
+        query: str,
+        sections: Optional[List[str]]
+    ) -> str:
+        parts = [index_name, document_name, domain_id or "", document_id or "", ",".join(sections or ()), query]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def subqueries(tenant_config: Optional[Dict[str, Any]]) -> List[str]:
+        """The domain's active subqueries: its onboarded custom_subqueries, else the default SUBQUERIES."""
+        from app.services.summarization.prompts import SUBQUERIES
+        custom = (tenant_config or {}).get("custom_subqueries") or []
+        custom = [query for query in custom if isinstance(query, str) and query.strip()] if isinstance(custom, list) else []
+        return custom or list(SUBQUERIES)
+
+    @staticmethod
+    def query_sets(subqueries: List[str]) -> List[Dict[str, Any]]:
+        """The retrievals a summary runs: Agent 1/2 queries in capital_structure, then the subqueries."""
+        from app.services.summarization.prompts import INVESTOR_QUERY, CAPITAL_HISTORY_QUERY
+        return [
+            {"queries": [INVESTOR_QUERY, CAPITAL_HISTORY_QUERY], "sections": AGENT_SECTIONS},
+            {"queries": list(dict.fromkeys(subqueries)), "sections": None},
+        ]
+
+    def lookup(
+        self,
+        index_name: str,
+        queries: List[str],
+        top_k: int,
+        metadata_filter: Dict[str, Any],
+        sections: Optional[List[str]] = None
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Stored matches (the first top_k) by query position, for the queries
+        computed with at least top_k under the same document filter.
+        """
+        if not metadata_filter.get("documentName") or any(field not in DOCUMENT_FIELDS for field in metadata_filter):
+            return {}
+        index_name = self._index_name(index_name)
+        keys = [
+            self.key(
+                index_name, metadata_filter["documentName"], metadata_filter.get("domainId"),
+                metadata_filter.get("documentId"), query, sections
+            )
+            for query in queries
+        ]
+        records = {
+            record["_id"]: record
+            for record in self._collection().find({"_id": {"$in": list(set(keys))}}, {"top_k": 1, "matches": 1, **{field: 1 for field in DOCUMENT_FIELDS}})
+        }
+        served = {}
+        for position, key in enumerate(keys):
+            record = records.get(key)
+            # An empty ranking is retrieved live, so the caller's fallbacks still apply
+            if not record or record.get("top_k", 0) < top_k or not record.get("matches"):
+                continue
+            if any(record.get(field) != value for field, value in metadata_filter.items()):
+                continue
+            served[position] = record["matches"][:top_k]
+        return served
+
+    async def compute(
+        self,
+        index_name: str,
+        host: str,
+        document: Dict[str, Any],
+        subqueries: List[str]
+    ) -> int:
+        """
+        Retrieve every summary query for one document and store the
+        rankings; document holds its DOCUMENT_FIELDS and job_id. Returns
+        the number of records stored.
+        """
+        from app.services.retrieval import retrieval_engine
+        index_name = self._index_name(index_name)
+        namespace = document["documentName"]
+        metadata_filter = {field: document[field] for field in ("documentId", "domainId") if document.get(field)}
+        top_k = settings.RETRIEVAL_PRECOMPUTE_TOP_K
+        now = time.time()
+        records = []
+        for query_set in self.query_sets(subqueries):
+            result = await retrieval_engine.retrieve(
+                query_set["queries"], namespace, index_name, host, top_k=top_k,
+                metadata_filter=metadata_filter, sections=query_set["sections"]
+            )
+            if result.error is not None:
+                raise RuntimeError(result.error)
+            for query, chunks in zip(result.queries, result.chunks):
+                records.append({
+                    "_id": self.key(
+                        index_name, namespace, document.get("domainId"), document.get("documentId"),
+                        query, query_set["sections"]
+                    ),
+                    "index": index_name,
+                    "host": host,
+                    **{field: document.get(field, "") for field in DOCUMENT_FIELDS},
+                    "query": query,
+                    "sections": query_set["sections"],
+                    "top_k": top_k,
+                    "job_id": document.get("job_id", ""),
+                    "matches": [{"id": chunk.id, "score": chunk.score, "metadata": chunk.metadata} for chunk in chunks],
+                    "updated_at": now,
+                })
+
+        collection = self._collection()
+        collection.delete_many({"index": index_name, "documentName": namespace, "domainId": document.get("domainId", "")})
+        if records:
+            collection.insert_many(records, ordered=False)
+        logger.info("Retrieval precomputed", namespace=namespace, index=index_name, queries=len(records), duration=round(time.time() - now, 3))
+        return len(records)
+
+    def forget(self, index_name: str, document_name: str, domain_id: str = None, document_id: str = None) -> int:
+        """Drop a document's rankings (re-ingestion or deletion); failures only log."""
+        query = {"index": self._index_name(index_name), "documentName": document_name}
+        if domain_id:
+            query["domainId"] = domain_id
+        if document_id:
+            query["documentId"] = document_id
+        try:
+            return self._collection().delete_many(query).deleted_count
+        except Exception as e:
+            logger.warning("Precomputed retrieval invalidation failed", namespace=document_name, error=str(e))
+            return 0
+
+    def retain_domain(self, domain_id: str, subqueries: List[str]) -> List[Dict[str, Any]]:
+        """
+        After the domain's subqueries changed: drop its rankings of queries
+        no longer run, and return its documents (to compute the new ones).
+        """
+        collection = self._collection()
+        active = [query for query_set in self.query_sets(subqueries) for query in query_set["queries"]]
+        removed = collection.delete_many({"domainId": domain_id, "query": {"$nin": active}}).deleted_count
+        documents = {}
+        for record in collection.find({"domainId": domain_id}, {"index": 1, "host": 1, "job_id": 1, **{field: 1 for field in DOCUMENT_FIELDS}}):
+            documents.setdefault((record["index"], record["documentName"]), record)
+        logger.info("Precomputed retrieval retained", domain_id=domain_id, removed=removed, documents=len(documents))
+        return [
+            {
+                "index": record["index"],
+                "host": record.get("host", ""),
+                "job_id": record.get("job_id", ""),
+                **{field: record.get(field, "") for field in DOCUMENT_FIELDS},
+            }
+            for record in documents.values()
+        ]
+
+
+precomputed_retrieval = PrecomputedRetrieval()
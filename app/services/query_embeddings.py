@@ -0,0 +1,176 @@
+"""
+Query embedding registry.
+Embeds the fixed retrieval queries (summary SUBQUERIES, the Agent 1/2
+queries, COMPARISON_QUERIES) and tenants' onboarded custom subqueries
+once per embedding model and size, persists them in Mongo and serves
+them from memory, so summary and comparison jobs embed no queries.
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from pymongo import UpdateOne
+from app.db.mongo import mongodb
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+STATIC_SCOPE = "static"
+
+
+class QueryEmbeddingRegistry:
+    """
+    One Mongo record per (model, dimensions, query text): _id
+    "<model>:<dimensions>:<sha256 of text>", text, model, dimensions,
+    vector (float32 bytes), scopes ("static" and/or the domainIds whose
+    custom subqueries include it) and updated_at. Records are loaded
+    into a per-process map at worker startup and on first miss.
+    """
+
+    def __init__(self, collection_name: str = None, embedding=None):
+        self.collection_name = collection_name or settings.QUERY_EMBEDDING_COLLECTION
+        self._embedding = embedding
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def embedding(self):
+        if self._embedding is None:
+            from app.services.embedding import embedding_service
+            self._embedding = embedding_service
+        return self._embedding
+
+    def _collection(self):
+        if mongodb.sync_db is None:
+            mongodb.connect_sync()
+        return mongodb.get_sync_collection(self.collection_name)
+
+    def key(self, text: str, dimensions: int) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.embedding.model_name}:{dimensions}:{digest}"
+
+    @staticmethod
+    def static_queries() -> List[str]:
+        """Every query text hard-coded in the summary and comparison pipelines."""
+        from app.services.summarization.prompts import SUBQUERIES, INVESTOR_QUERY, CAPITAL_HISTORY_QUERY
+        from app.services.comparison.prompts import COMPARISON_QUERIES
+        return list(dict.fromkeys([*SUBQUERIES, INVESTOR_QUERY, CAPITAL_HISTORY_QUERY, *COMPARISON_QUERIES]))
+
+    @staticmethod
+    def dimensions() -> List[int]:
+        """Embedding sizes of the indexes queries run against."""
+        from app.services.vector_store import vector_store_service
+        return sorted({
+            vector_store_service.dimension_for(settings.PINECONE_DRHP_INDEX),
+            vector_store_service.dimension_for(settings.PINECONE_RHP_INDEX),
+        })
+
+    def lookup(self, texts: List[str], dimensions: int) -> List[Optional[np.ndarray]]:
+        """Registered vectors for texts (None where not registered); memory only, never blocks."""
+        with self._lock:
+            return [self._vectors.get(self.key(text, dimensions)) for text in texts]
+
+    def _remember(self, records: Iterable[Dict]) -> int:
+        count = 0
+        with self._lock:
+            for record in records:
+                self._vectors[record["_id"]] = np.frombuffer(record["vector"], dtype=np.float32)
+                count += 1
+        return count
+
+    def load(self, dimensions: Optional[int] = None) -> int:
+        """Load every registered query of the current model (and size) into memory."""
+        query = {"model": self.embedding.model_name}
+        if dimensions:
+            query["dimensions"] = dimensions
+        return self._remember(self._collection().find(query, {"vector": 1}))
+
+    def ensure(self, texts: List[str], dimensions: int, scope: str = STATIC_SCOPE) -> int:
+        """
+        Register texts under a scope: load any already persisted, embed
+        the rest in one request and persist them. Blocking; returns the
+        number embedded.
+        """
+        texts = list(dict.fromkeys(text for text in texts if text and text.strip()))
+        if not texts:
+            return 0
+        keys = [self.key(text, dimensions) for text in texts]
+        collection = self._collection()
+        collection.update_many({"_id": {"$in": keys}}, {"$addToSet": {"scopes": scope}})
+        stored = {record["_id"] for record in collection.find({"_id": {"$in": keys}}, {"_id": 1})}
+        with self._lock:
+            unloaded = [key for key in keys if key in stored and key not in self._vectors]
+        if unloaded:
+            self._remember(collection.find({"_id": {"$in": unloaded}}, {"vector": 1}))
+
+        # Unstored texts are persisted from memory where this process has them, else embedded
+        unstored = [
+            (text, key, vector)
+            for text, key, vector in zip(texts, keys, self.lookup(texts, dimensions))
+            if key not in stored
+        ]
+        if not unstored:
+            return 0
+        missing = [text for text, _, vector in unstored if vector is None]
+        embedded = {}
+        if missing:
+            vectors = np.asarray(self.embedding.embed_texts(missing, dimensions=dimensions), dtype=np.float32)
+            embedded = dict(zip(missing, vectors))
+        now = time.time()
+        records = [
+            {"_id": key, "text": text, "vector": (embedded[text] if vector is None else vector).tobytes()}
+            for text, key, vector in unstored
+        ]
+        collection.bulk_write([
+            UpdateOne(
+                {"_id": record["_id"]},
+                {"$set": {
+                    "text": record["text"],
+                    "vector": record["vector"],
+                    "model": self.embedding.model_name,
+                    "dimensions": dimensions,
+                    "updated_at": now,
+                }, "$addToSet": {"scopes": scope}},
+                upsert=True
+            )
+            for record in records
+        ], ordered=False)
+        self._remember(records)
+        logger.info("Query embeddings registered", scope=scope, stored=len(records), embedded=len(missing), dimensions=dimensions)
+        return len(missing)
+
+    def refresh_domain(self, domain_id: str, subqueries: List[str]) -> int:
+        """
+        Re-register a domain's custom subqueries after (re-)onboarding,
+        diffed by key (the text hash): texts it no longer uses lose its
+        scope (and are dropped when no scope is left), texts it kept are
+        left alone, new ones are embedded.
+        """
+        subqueries = [text for text in subqueries or [] if text and text.strip()]
+        all_dimensions = self.dimensions()
+        keys = [self.key(text, dimensions) for dimensions in all_dimensions for text in subqueries]
+        collection = self._collection()
+        collection.update_many({"scopes": domain_id, "_id": {"$nin": keys}}, {"$pull": {"scopes": domain_id}})
+        collection.delete_many({"scopes": {"$size": 0}, "_id": {"$nin": keys}})
+        return sum(self.ensure(subqueries, dimensions, scope=domain_id) for dimensions in all_dimensions)
+
+    def warm(self) -> int:
+        """
+        Worker startup: load the stored registry. Only static queries with
+        no stored vector (a new query, model or size) are embedded, so a
+        warm start makes one read and no writes.
+        """
+        loaded = self.load()
+        embedded = 0
+        static = self.static_queries()
+        for dimensions in self.dimensions():
+            unregistered = [text for text, vector in zip(static, self.lookup(static, dimensions)) if vector is None]
+            if unregistered:
+                embedded += self.ensure(unregistered, dimensions)
+        logger.info("Query embeddings loaded", loaded=loaded, embedded=embedded)
+        return loaded + embedded
+
+
+query_embeddings = QueryEmbeddingRegistry()
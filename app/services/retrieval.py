@@ -0,0 +1,522 @@
+"""
+Retrieval engine.
+The one retrieval path behind the summary, chat and comparison
+pipelines: route the document, embed every query in one request, search
+(the document's cached working set, else concurrent vector queries off
+the event loop), hydrate chunk text in one store read and optionally
+rerank.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.services.vector_store import vector_store_service
+from app.services.chunk_store import chunk_store
+from app.services.namespace_layout import Route, namespace_layout
+from app.services.working_set import DocumentWorkingSet, working_set_cache
+from app.services.embedding import EmbeddingService
+from app.services.query_embeddings import STATIC_SCOPE, query_embeddings
+from app.services.precomputed_retrieval import precomputed_retrieval
+from app.services.rerank import rerank_service
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class RetrievedChunk:
+    """One retrieved chunk: text, vector id, similarity score, metadata and rank among its query's matches."""
+
+    __slots__ = ("id", "text", "score", "metadata", "rank")
+
+    def __init__(self, id: str, text: str, score: float, metadata: Optional[Dict[str, Any]] = None, rank: int = 0):
+        self.id = id
+        self.text = text
+        self.score = score
+        self.metadata = metadata or {}
+        self.rank = rank
+
+    def __repr__(self) -> str:
+        return f"RetrievedChunk(id={self.id!r}, score={self.score:.4f})"
+
+
+class RetrievalResult:
+    """
+    Ranked chunks per query, where they were searched ("working_set",
+    "index", "precomputed" or "memo"), per-stage timings in seconds, and the error when
+    retrieval failed.
+    """
+
+    def __init__(
+        self,
+        queries: List[str],
+        chunks: List[List[RetrievedChunk]],
+        timings: Dict[str, float],
+        source: str = "index",
+        error: Optional[str] = None
+    ):
+        self.queries = queries
+        self.chunks = chunks
+        self.timings = timings
+        self.source = source
+        self.error = error
+
+    def context(self, per_query: Optional[int] = None) -> str:
+        """The top `per_query` chunks of every query, deduplicated in order, joined for a prompt."""
+        texts = []
+        seen = set()
+        for chunks in self.chunks:
+            for chunk in chunks[:per_query]:
+                if chunk.text not in seen:
+                    texts.append(chunk.text)
+                    seen.add(chunk.text)
+        return "\n---\n".join(texts)
+
+
+class RetrievalEngine:
+    """
+    Batch retrieval for one document.
+
+    Registered queries (see app.services.query_embeddings) are not
+    embedded at all; the rest share one cached embedding call. When the
+    document's working set fits in memory every query is scored against
+    it in one matrix product; otherwise each query is a blocking index
+    query run in a worker thread, at most RETRIEVAL_MAX_CONCURRENCY at a
+    time, each with the same fallbacks the pipelines used: without the
+    section filter, then (documents with no recorded layout) the legacy
+    per-document namespace. Where such a document was found is recorded
+    as its layout, so its later queries are one index query each.
+    """
+
+    def __init__(self, embedding: EmbeddingService = None, max_concurrency: int = None):
+        self.embedding = embedding or EmbeddingService()
+        self.max_concurrency = max_concurrency or settings.RETRIEVAL_MAX_CONCURRENCY
+
+    async def retrieve(
+        self,
+        queries: List[str],
+        namespace: str,
+        index_name: str = None,
+        host: str = None,
+        top_k: int = 10,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        sections: Optional[List[str]] = None,
+        rerank_n: Optional[int] = None,
+        unfiltered_fallback: bool = False,
+        memo: Optional["RetrievalMemo"] = None,
+        precomputed: bool = False
+    ) -> RetrievalResult:
+        """
+        Ranked chunks for every query.
+
+        metadata_filter is merged into the documentName filter (e.g.
+        documentId, domainId); sections restricts to chunks tagged with
+        those DRHP sections where any are tagged. rerank_n reranks each
+        query's chunks and keeps that many. unfiltered_fallback finally
+        searches the whole default namespace for documents with no
+        recorded layout and no metadata_filter. With a memo, queries it
+        already holds are not retrieved again. precomputed serves queries
+        ranked at ingestion (see app.services.precomputed_retrieval) from
+        their stored rankings. Failures are logged and give empty results.
+        """
+        if memo is not None:
+            return await memo.retrieve(
+                self, queries, namespace, index_name, host, top_k, metadata_filter, sections, rerank_n,
+                unfiltered_fallback, precomputed
+            )
+        index_name = index_name or settings.PINECONE_DRHP_INDEX
+        host = host or settings.PINECONE_DRHP_HOST
+        started = time.time()
+        timings: Dict[str, float] = {}
+        empty = [[] for _ in queries]
+        if not queries:
+            return RetrievalResult(queries, empty, timings)
+
+        try:
+            base_filter = {"documentName": namespace} if namespace else {}
+            base_filter.update(metadata_filter or {})
+            stored: Dict[int, List[Dict[str, Any]]] = {}
+            if precomputed and settings.RETRIEVAL_PRECOMPUTE and namespace:
+                stage = time.time()
+                stored = await self._lookup_precomputed(index_name, queries, top_k, base_filter, sections)
+                timings["lookup"] = time.time() - stage
+            remaining = [position for position in range(len(queries)) if position not in stored]
+
+            source = "precomputed"
+            match_groups = [stored.get(position, []) for position in range(len(queries))]
+            if remaining:
+                stage = time.time()
+                # The document's recorded layout gives its namespace, shard and the filters still needed there;
+                # unknown documents use the default namespace ("") with every filter
+                route = await asyncio.to_thread(
+                    namespace_layout.route, vector_store_service._extract_index_name(index_name), namespace, base_filter or None
+                )
+                index = await asyncio.to_thread(vector_store_service.get_index, index_name, host, route.domain_id)
+                timings["route"] = time.time() - stage
+
+                stage = time.time()
+                query_vectors = await self._embed(
+                    [queries[position] for position in remaining], vector_store_service.dimension_for(index_name)
+                )
+                timings["embed"] = time.time() - stage
+
+                stage = time.time()
+                source = "working_set"
+                searched = None
+                if settings.RETRIEVAL_WORKING_SET and namespace and DocumentWorkingSet.supports_filter(base_filter):
+                    searched = await self._search_working_set(
+                        index, index_name, namespace, route, base_filter, query_vectors, top_k, sections
+                    )
+                if searched is None:
+                    source = "index"
+                    searched = await self._search_index(
+                        index, index_name, host, route, namespace, query_vectors, top_k, metadata_filter, sections,
+                        unfiltered_fallback
+                    )
+                for position, matches in zip(remaining, searched):
+                    match_groups[position] = matches
+                timings["search"] = time.time() - stage
+
+            stage = time.time()
+            hydrated = await asyncio.to_thread(chunk_store.hydrate_matches, match_groups)
+            chunks = [
+                [
+                    RetrievedChunk(match["id"], text, float(match["score"] or 0.0), match["metadata"], rank)
+                    for rank, (match, text) in enumerate(pairs)
+                ]
+                for pairs in hydrated
+            ]
+            timings["hydrate"] = time.time() - stage
+
+            if rerank_n:
+                stage = time.time()
+                chunks = await self._rerank(queries, chunks, rerank_n)
+                timings["rerank"] = time.time() - stage
+        except Exception as e:
+            logger.error("Retrieval failed", namespace=namespace, index=index_name, queries=len(queries), error=str(e))
+            return RetrievalResult(queries, empty, timings, error=str(e))
+
+        timings = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+        timings["total"] = round(time.time() - started, 3)
+        logger.info(
+            "Context retrieved",
+            namespace=namespace,
+            queries=len(queries),
+            source=source,
+            precomputed=len(stored),
+            chunks=sum(len(group) for group in chunks),
+            **timings
+        )
+        return RetrievalResult(queries, chunks, timings, source)
+
+    async def _embed(self, queries: List[str], dimensions: int) -> np.ndarray:
+        """Query vectors: registered ones from memory, the others in one embedding request."""
+        registered = query_embeddings.lookup(queries, dimensions)
+        missing = [query for query, vector in zip(queries, registered) if vector is None]
+        if not missing:
+            return np.stack(registered)
+        embedded = dict(zip(missing, await self.embedding.aembed_matrix(missing, dimensions=dimensions)))
+        return np.stack([embedded[query] if vector is None else vector for query, vector in zip(queries, registered)])
+
+    @staticmethod
+    async def _lookup_precomputed(
+        index_name: str,
+        queries: List[str],
+        top_k: int,
+        base_filter: Dict[str, Any],
+        sections: Optional[List[str]]
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """Stored rankings by query position; on failure none (the queries are retrieved)."""
+        try:
+            return await asyncio.to_thread(
+                precomputed_retrieval.lookup, index_name, queries, top_k, base_filter, sections
+            )
+        except Exception as e:
+            logger.warning("Precomputed retrieval lookup failed", namespace=base_filter.get("documentName"), error=str(e))
+            return {}
+
+    async def register_queries(self, queries: List[str], index_name: str = None, scope: str = STATIC_SCOPE) -> None:
+        """Register queries for the index's embedding size (loaded, or embedded once); failures only log."""
+        dimensions = vector_store_service.dimension_for(index_name or settings.PINECONE_DRHP_INDEX)
+        try:
+            await asyncio.to_thread(query_embeddings.ensure, queries, dimensions, scope)
+        except Exception as e:
+            logger.warning("Query embedding registration failed", scope=scope, queries=len(queries), error=str(e))
+
+    @staticmethod
+    async def _search_working_set(
+        index,
+        index_name: str,
+        namespace: str,
+        route: Route,
+        base_filter: Dict[str, Any],
+        query_vectors,
+        top_k: int,
+        sections: Optional[List[str]]
+    ) -> Optional[List[List[Dict[str, Any]]]]:
+        """All queries against the document's working set, or None to query the index."""
+        try:
+            document_id = base_filter.get("documentId")
+            working_set = await asyncio.to_thread(
+                working_set_cache.get, index, index_name, namespace, route.namespace,
+                route.domain_id or "", document_id if isinstance(document_id, str) else ""
+            )
+            if working_set is None:
+                return None
+            query_filter = route.filter or {}
+            if sections:
+                match_groups = working_set.search(query_vectors, top_k, {**query_filter, "section": {"$in": sections}})
+                # Documents ingested before section tagging have no section metadata
+                if any(match_groups):
+                    return match_groups
+            match_groups = working_set.search(query_vectors, top_k, query_filter)
+            # Nothing matched locally: let the index (and its fallbacks) answer
+            return match_groups if any(match_groups) else None
+        except Exception as e:
+            logger.warning("Working set retrieval failed, querying the index", namespace=namespace, error=str(e))
+            return None
+
+    async def _search_index(
+        self,
+        index,
+        index_name: str,
+        host: str,
+        route: Route,
+        namespace: str,
+        query_vectors,
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]],
+        sections: Optional[List[str]],
+        unfiltered_fallback: bool
+    ) -> List[List[Any]]:
+        """
+        One index query (plus fallbacks) per query vector, concurrently in
+        worker threads. Where an unrouted document was found is learned,
+        so its later queries need no fallback probes.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def search(vector) -> Tuple[List[Any], Optional[str]]:
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(
+                        self._query, index, route, namespace, vector.tolist(), top_k,
+                        metadata_filter, sections, unfiltered_fallback
+                    )
+                except Exception as e:
+                    logger.error("Vector query failed", namespace=namespace, error=str(e))
+                    return [], None
+
+        results = await asyncio.gather(*(search(vector) for vector in query_vectors))
+        if not route.known and namespace and settings.NAMESPACE_LAYOUT_LEARN:
+            found = next(((matches, layout) for matches, layout in results if layout), None)
+            if found:
+                await asyncio.to_thread(self._learn_layout, index_name, host, namespace, metadata_filter, *found)
+        return [matches for matches, _ in results]
+
+    @staticmethod
+    def _learn_layout(
+        index_name: str,
+        host: str,
+        namespace: str,
+        metadata_filter: Optional[Dict[str, Any]],
+        matches: List[Any],
+        layout: str
+    ) -> None:
+        """Record the layout an unrouted document was found in, keyed by its ids from the match (or the filter)."""
+        metadata = matches[0]["metadata"] or {}
+        ids = {}
+        for key in ("domainId", "documentId"):
+            value = metadata.get(key) or (metadata_filter or {}).get(key)
+            ids[key] = value if isinstance(value, str) else ""
+        try:
+            namespace_layout.learn(
+                vector_store_service._extract_index_name(index_name), namespace, ids, layout,
+                namespace if layout == "legacy" else "", host
+            )
+        except Exception as e:
+            logger.warning("Namespace layout learning failed", namespace=namespace, error=str(e))
+
+    @staticmethod
+    def _query(
+        index,
+        route: Route,
+        namespace: str,
+        vector: List[float],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]],
+        sections: Optional[List[str]],
+        unfiltered_fallback: bool
+    ) -> Tuple[List[Any], Optional[str]]:
+        """
+        Matches for one query vector (blocking), and for an unrouted
+        document the layout they were found in ("shared" or "legacy").
+        """
+        query_filter = dict(route.filter or {})
+        if sections:
+            query_filter["section"] = {"$in": sections}
+        layout = "shared"
+        matches = index.query(
+            vector=vector, top_k=top_k, namespace=route.namespace, include_metadata=True, filter=query_filter or None
+        )["matches"]
+
+        # Documents ingested before section tagging have no section metadata
+        if not matches and sections:
+            matches = index.query(
+                vector=vector, top_k=top_k, namespace=route.namespace, include_metadata=True, filter=route.filter
+            )["matches"]
+
+        # Legacy per-document namespace, only for documents with no recorded layout;
+        # its vectors might not carry documentName metadata
+        if not matches and not route.known and namespace:
+            layout = "legacy"
+            legacy_filter = {key: value for key, value in (metadata_filter or {}).items() if key not in ("documentName", "section")}
+            matches = index.query(
+                vector=vector, top_k=top_k, namespace=namespace, include_metadata=True, filter=legacy_filter or None
+            )["matches"]
+
+        if not matches and unfiltered_fallback and not route.known and not metadata_filter and namespace:
+            logger.warning("Retrieval final fallback in default namespace without filter", namespace=namespace)
+            layout = None
+            matches = index.query(vector=vector, top_k=top_k, namespace="", include_metadata=True)["matches"]
+        return matches, (layout if matches and not route.known else None)
+
+    async def _rerank(self, queries: List[str], chunks: List[List[RetrievedChunk]], top_n: int) -> List[List[RetrievedChunk]]:
+        """Rerank each query's chunks (concurrently, bounded like the vector queries)."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def rerank(query: str, group: List[RetrievedChunk]) -> List[RetrievedChunk]:
+            if not group:
+                return group
+            async with semaphore:
+                texts = await asyncio.to_thread(rerank_service.rerank, query, [chunk.text for chunk in group], top_n)
+            by_text = {}
+            for chunk in group:
+                by_text.setdefault(chunk.text, chunk)
+            return [by_text[text] for text in texts if text in by_text]
+
+        return list(await asyncio.gather(*(rerank(query, group) for query, group in zip(queries, chunks))))
+
+
+class RetrievalMemo:
+    """
+    Retrieval results memoized for one job (e.g. one summary).
+
+    Keyed by query text, document, index, filters and whether rankings
+    precomputed at ingestion may answer it. A request is
+    served from a result retrieved with at least its top_k (the first
+    top_k of that ranking), and identical requests made while one is in
+    flight wait for it instead of querying again. Reranking is applied
+    per request, on top of the memoized vector ranking. Failed
+    retrievals are not memoized.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple, Tuple[int, asyncio.Future]] = {}
+        self.requests = 0
+        self.retrieved = 0
+        self.served = 0
+        self.shared = 0
+
+    @staticmethod
+    def key(
+        query: str,
+        namespace: str,
+        index_name: Optional[str],
+        host: Optional[str],
+        metadata_filter: Optional[Dict[str, Any]],
+        sections: Optional[List[str]],
+        unfiltered_fallback: bool,
+        precomputed: bool = False
+    ) -> Tuple:
+        return (
+            query,
+            namespace,
+            index_name or settings.PINECONE_DRHP_INDEX,
+            host or settings.PINECONE_DRHP_HOST,
+            json.dumps(metadata_filter or {}, sort_keys=True, default=str),
+            tuple(sections or ()),
+            unfiltered_fallback,
+            precomputed,
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Query counts; vector_queries_saved is the queries answered without retrieving them."""
+        return {
+            "requests": self.requests,
+            "retrieved": self.retrieved,
+            "served": self.served,
+            "shared": self.shared,
+            "vector_queries_saved": self.served + self.shared,
+        }
+
+    async def retrieve(
+        self,
+        engine: RetrievalEngine,
+        queries: List[str],
+        namespace: str,
+        index_name: Optional[str],
+        host: Optional[str],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]],
+        sections: Optional[List[str]],
+        rerank_n: Optional[int],
+        unfiltered_fallback: bool,
+        precomputed: bool = False
+    ) -> RetrievalResult:
+        """RetrievalEngine.retrieve, retrieving only the queries this memo cannot answer."""
+        started = time.time()
+        loop = asyncio.get_running_loop()
+        pending: Dict[int, asyncio.Future] = {}
+        owned: List[Tuple[int, str, Tuple, asyncio.Future]] = []
+        for position, query in enumerate(queries):
+            key = self.key(
+                query, namespace, index_name, host, metadata_filter, sections, unfiltered_fallback, precomputed
+            )
+            self.requests += 1
+            entry = self._entries.get(key)
+            if entry and entry[0] >= top_k:
+                pending[position] = entry[1]
+                if entry[1].done():
+                    self.served += 1
+                else:
+                    self.shared += 1
+                continue
+            future = loop.create_future()
+            self._entries[key] = (top_k, future)
+            pending[position] = future
+            owned.append((position, query, key, future))
+
+        timings: Dict[str, float] = {}
+        source = "memo"
+        if owned:
+            self.retrieved += len(owned)
+            result = None
+            try:
+                result = await engine.retrieve(
+                    [query for _, query, _, _ in owned], namespace, index_name, host, top_k,
+                    metadata_filter, sections, unfiltered_fallback=unfiltered_fallback, precomputed=precomputed
+                )
+                timings, source = result.timings, result.source
+            finally:
+                for number, (_, _, key, future) in enumerate(owned):
+                    failed = result is None or result.error is not None
+                    if failed and self._entries.get(key, (0, None))[1] is future:
+                        del self._entries[key]
+                    future.set_result([] if result is None else result.chunks[number])
+
+        chunks = []
+        for position in range(len(queries)):
+            group = await pending[position]
+            chunks.append([chunk for chunk in group if chunk.rank < top_k])
+        if rerank_n:
+            stage = time.time()
+            chunks = await engine._rerank(queries, chunks, rerank_n)
+            timings = {**timings, "rerank": round(time.time() - stage, 3)}
+        if not owned:
+            timings["total"] = round(time.time() - started, 3)
+        return RetrievalResult(queries, chunks, timings, source)
+
+
+retrieval_engine = RetrievalEngine()
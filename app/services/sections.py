@@ -0,0 +1,147 @@
+"""
+DRHP/RHP section detection.
+Labels raw extracted pages with the offer-document chapter they belong to.
+"""
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Pattern, Tuple
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Label for pages before the first detected heading (cover, notice to investors)
+FRONT_MATTER = "front_matter"
+
+# Chapters in the order SEBI ICDR Schedule VI lays out an offer document.
+# (order, label, uppercase heading variants). Headings are matched case-
+# sensitively and only as a whole line: chapter titles are printed in
+# capitals on a line of their own, body text is not.
+DRHP_SECTIONS: List[Tuple[int, str, Tuple[str, ...]]] = [
+    (1, "definitions", (r"DEFINITIONS AND ABBREVIATIONS",)),
+    (2, "presentation", (
+        r"CERTAIN CONVENTIONS",
+        r"PRESENTATION OF FINANCIAL,? INDUSTRY AND MARKET DATA",
+        r"FORWARD[- ]LOOKING STATEMENTS",
+    )),
+    (3, "offer_document_summary", (r"SUMMARY OF (?:THE )?(?:OFFER DOCUMENT|DRAFT RED HERRING PROSPECTUS|RED HERRING PROSPECTUS|DRAFT PROSPECTUS|PROSPECTUS)",)),
+    (4, "risk_factors", (r"RISK FACTORS",)),
+    (5, "the_offer", (r"THE (?:OFFER|ISSUE)",)),
+    (6, "summary_financial_information", (r"SUMMARY (?:OF )?FINANCIAL (?:INFORMATION|STATEMENTS)",)),
+    (7, "general_information", (r"GENERAL INFORMATION",)),
+    (8, "capital_structure", (r"CAPITAL STRUCTURE",)),
+    (9, "objects_of_the_offer", (r"OBJECTS? OF THE (?:OFFER|ISSUE)",)),
+    (10, "basis_for_offer_price", (r"BASIS (?:FOR|OF) (?:THE )?(?:OFFER|ISSUE) PRICE",)),
+    (11, "tax_benefits", (r"STATEMENT OF (?:POSSIBLE )?(?:SPECIAL )?TAX BENEFITS",)),
+    (12, "industry_overview", (r"INDUSTRY OVERVIEW", r"OUR INDUSTRY")),
+    (13, "business_overview", (r"(?:OUR )?BUSINESS OVERVIEW", r"OUR BUSINESS")),
+    (14, "key_regulations", (r"KEY (?:INDUSTRY )?REGULATIONS(?: AND POLICIES)?",)),
+    (15, "history_and_corporate_matters", (r"HISTORY AND (?:CERTAIN )?CORPORATE MATTERS",)),
+    (16, "management", (r"OUR MANAGEMENT",)),
+    (17, "promoters", (r"OUR PROMOTERS? AND PROMOTER GROUP",)),
+    (18, "group_companies", (r"(?:OUR )?GROUP (?:COMPANIES|ENTITIES)",)),
+    (19, "dividend_policy", (r"DIVIDEND POLICY",)),
+    (20, "financial_information", (
+        r"(?:OTHER )?FINANCIAL INFORMATION",
+        r"RESTATED (?:CONSOLIDATED |STANDALONE )?FINANCIAL (?:STATEMENTS|INFORMATION)",
+    )),
+    (21, "mdna", (r"MANAGEMENT[’']?S? DISCUSSION AND ANALYSIS",)),
+    (22, "capitalisation_statement", (r"CAPITALI[SZ]ATION STATEMENT",)),
+    (23, "financial_indebtedness", (r"FINANCIAL INDEBTEDNESS",)),
+    (24, "outstanding_litigation", (r"OUTSTANDING LITIGATIONS?(?: AND MATERIAL DEVELOPMENTS)?",)),
+    (25, "government_approvals", (r"GOVERNMENT AND OTHER (?:STATUTORY )?APPROVALS", r"GOVERNMENT APPROVALS")),
+    (26, "other_regulatory_disclosures", (r"OTHER REGULATORY AND STATUTORY DISCLOSURES",)),
+    (27, "offer_information", (
+        r"TERMS OF THE (?:OFFER|ISSUE)",
+        r"(?:OFFER|ISSUE) STRUCTURE",
+        r"(?:OFFER|ISSUE) PROCEDURE",
+        r"RESTRICTIONS ON FOREIGN OWNERSHIP",
+    )),
+    (28, "articles_of_association", (r"(?:MAIN )?PROVISIONS OF (?:THE )?ARTICLES OF ASSOCIATION",)),
+    (29, "material_contracts", (r"MATERIAL CONTRACTS AND DOCUMENTS FOR INSPECTION",)),
+    (30, "declaration", (r"DECLARATION",)),
+]
+
+# Section labels in document order (also the valid values for retrieval filters)
+SECTION_LABELS: List[str] = [FRONT_MATTER] + [label for _, label, _ in DRHP_SECTIONS]
+
+# A heading line: the chapter title alone, optionally with a trailing colon.
+# Body text ("... the Offer Document. DECLARATION of ...") and cross-
+# references ("see “RISK FACTORS” on page 30") never fill a whole line.
+_HEADING_LINE = r"^[ \t]*(?:{})[ \t]*:?[ \t\r]*$"
+
+
+class SectionDetector:
+    """
+    Streaming heading detector for raw offer-document pages.
+
+    Pages must still have their line breaks (detect before clean_text). A
+    page starts a new section when a line holding only one of the known
+    chapter headings appears in its first `window` characters (after the
+    running header). Pages with heading lines for many sections (table of
+    contents, index of defined terms) are ignored, and labels only move
+    forward in the canonical chapter order, so a stray heading-like line
+    can never send later pages back to an earlier chapter.
+    """
+
+    def __init__(self, window: int = None, toc_threshold: int = None):
+        self.window = window or settings.SECTION_HEADING_WINDOW
+        self.toc_threshold = toc_threshold or settings.SECTION_TOC_THRESHOLD
+        self._patterns: List[Tuple[int, str, Pattern]] = [
+            (order, label, re.compile(_HEADING_LINE.format("|".join(variants)), re.MULTILINE))
+            for order, label, variants in DRHP_SECTIONS
+        ]
+
+    def _headings(self, text: str) -> List[Tuple[int, int, str]]:
+        """All heading lines as (position, order, label)."""
+        found = []
+        for order, label, pattern in self._patterns:
+            for match in pattern.finditer(text):
+                found.append((match.start(), order, label))
+        found.sort()
+        return found
+
+    def detect(self, page_text: str) -> Optional[Tuple[int, str]]:
+        """(order, label) of the heading that opens this page, or None."""
+        headings = self._headings(page_text)
+        if len({label for _, _, label in headings}) >= self.toc_threshold:
+            return None
+        for position, order, label in headings:
+            if position >= self.window:
+                break
+            return order, label
+        return None
+
+    def label_pages(
+        self,
+        pages: Iterable[str],
+        clean: Optional[Callable[[str], str]] = None
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (section, page_text) for every raw page, in order; with
+        `clean`, headings are detected on the raw page and the cleaned
+        text is yielded.
+        """
+        current_order, current_label = 0, FRONT_MATTER
+        for page_text in pages:
+            heading = self.detect(page_text) if page_text else None
+            if heading and heading[0] >= current_order:
+                if heading[1] != current_label:
+                    logger.debug("Section heading detected", section=heading[1])
+                current_order, current_label = heading
+            yield current_label, clean(page_text) if clean else page_text
+
+
+def group_sections(labelled_pages: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Join consecutive pages of the same section into (section, text) blocks."""
+    blocks: List[Tuple[str, List[str]]] = []
+    for section, page_text in labelled_pages:
+        if not page_text:
+            continue
+        if blocks and blocks[-1][0] == section:
+            blocks[-1][1].append(page_text)
+        else:
+            blocks.append((section, [page_text]))
+    return [(section, " ".join(texts)) for section, texts in blocks]
+
+
+section_detector = SectionDetector()
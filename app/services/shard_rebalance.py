@@ -0,0 +1,180 @@
+"""
+Domain shard rebalance.
+Moves domains whose hash-ring shard changed (typically after adding
+entries to PINECONE_SHARDS) to their new shard: copy the domain's
+registered vectors, switch its placement, then delete the old copies.
+Resumable: a move's progress is kept on the domain's placement record.
+
+Usage:
+    python -m app.services.shard_rebalance --dry-run
+    python -m app.services.shard_rebalance --rate 200
+    python -m app.services.shard_rebalance --domain-id 64f0c1
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional
+from app.services.shard_router import shard_router
+from app.services.vector_registry import vector_registry
+from app.services.vector_store import vector_store_service
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class ShardRebalance:
+    """
+    Moves misplaced domains of one logical index in two passes.
+
+    Switch, per domain: mark the placement "moving" (reads and writes
+    still go to the source), copy every registered vector not yet on the
+    target in SHARD_REBALANCE_BATCH batches, then point the placement at
+    the target ("draining", with switched_at). Then one wait until
+    SHARD_PLACEMENT_CACHE_TTL has passed since the last switch, after
+    which no process writes to any source any more. Finish, per domain:
+    vectors written to the source meanwhile are copied over, the source
+    copies are deleted and the placement is "placed". Throughput is
+    capped at SHARD_REBALANCE_RATE vectors per second.
+    """
+
+    def __init__(self, index_name: str = None, rate: int = None, batch_size: int = None):
+        self.index_name = vector_store_service._extract_index_name(index_name or settings.PINECONE_DRHP_INDEX)
+        self.rate = rate or settings.SHARD_REBALANCE_RATE
+        self.batch_size = batch_size or settings.SHARD_REBALANCE_BATCH
+
+    def _throttle(self, started: float, vectors: int) -> None:
+        """Sleep so that `vectors` since `started` stays under the rate limit."""
+        if self.rate > 0:
+            delay = vectors / self.rate - (time.time() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def _copy(self, domain_id: str, source, target) -> int:
+        """Copy the domain's registered vectors missing from the target shard."""
+        copied = 0
+        started = time.time()
+        for vector_namespace, ids in vector_registry.ids_by_domain(self.index_name, domain_id=domain_id).get(domain_id, {}).items():
+            for start in range(0, len(ids), self.batch_size):
+                batch = ids[start:start + self.batch_size]
+                present = set(target.fetch(ids=batch, namespace=vector_namespace).vectors)
+                missing = [vector_id for vector_id in batch if vector_id not in present]
+                if not missing:
+                    continue
+                fetched = source.fetch(ids=missing, namespace=vector_namespace)
+                vectors = [
+                    {"id": vector_id, "values": list(vector.values), "metadata": dict(vector.metadata or {})}
+                    for vector_id, vector in fetched.vectors.items()
+                ]
+                if vectors:
+                    vector_store_service._upsert_batch(target, vectors, vector_namespace, 0)
+                    copied += len(vectors)
+                self._throttle(started, copied)
+        return copied
+
+    def plan(self, placement: Dict[str, Any]) -> Dict[str, Any]:
+        """A move's dry-run summary: source, target and vector count."""
+        domain_id = placement["domainId"]
+        draining = placement.get("status") == "draining"
+        # A draining placement already points at its target
+        target_shard = (placement["shard"], placement["host"]) if draining else placement["target"]
+        source = placement["source_shard"] if draining else placement["shard"]
+        ids = vector_registry.ids_by_domain(self.index_name, domain_id=domain_id).get(domain_id, {})
+        return {
+            "domainId": domain_id, "source": source, "target": target_shard[0],
+            "vectors": sum(len(batch) for batch in ids.values()), "status": "planned",
+        }
+
+    def switch(self, placement: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy one domain to its ring shard and point its placement there; returns the draining placement."""
+        domain_id = placement["domainId"]
+        source_shard = (placement["shard"], placement["host"])
+        target_shard = placement["target"]
+        shard_router.place(self.index_name, domain_id, source_shard, status="moving")
+        source = vector_store_service.get_index(source_shard[0], host=source_shard[1])
+        target = vector_store_service.get_index(target_shard[0], host=target_shard[1])
+        copied = self._copy(domain_id, source, target)
+        switched = {
+            "source_shard": source_shard[0], "source_host": source_shard[1],
+            "switched_at": time.time(), "copied": copied,
+        }
+        shard_router.place(self.index_name, domain_id, target_shard, status="draining", **switched)
+        return {"domainId": domain_id, "shard": target_shard[0], "host": target_shard[1], "status": "draining", **switched}
+
+    def finish(self, placement: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy what was written to the source since the switch, delete the source copies and mark the domain placed."""
+        domain_id = placement["domainId"]
+        source_shard = (placement["source_shard"], placement["source_host"])
+        target_shard = (placement["shard"], placement["host"])
+        source = vector_store_service.get_index(source_shard[0], host=source_shard[1])
+        target = vector_store_service.get_index(target_shard[0], host=target_shard[1])
+        copied = placement.get("copied", 0) + self._copy(domain_id, source, target)
+        deleted = 0
+        for vector_namespace, ids in vector_registry.ids_by_domain(self.index_name, domain_id=domain_id).get(domain_id, {}).items():
+            deleted += vector_store_service._delete_ids(source, ids, vector_namespace)
+        shard_router.place(self.index_name, domain_id, target_shard, status="placed")
+        logger.info("Domain moved", domain_id=domain_id, source=source_shard[0], target=target_shard[0], copied=copied, deleted=deleted)
+        return {
+            "domainId": domain_id, "source": source_shard[0], "target": target_shard[0],
+            "copied": copied, "deleted": deleted, "status": "placed",
+        }
+
+    def run(self, domain_ids: Optional[List[str]] = None, dry_run: bool = False) -> List[Dict[str, Any]]:
+        """Move every misplaced domain (or only the given ones), resuming interrupted moves."""
+        if not shard_router.enabled():
+            raise RuntimeError("PINECONE_SHARDS is not set; there is nothing to rebalance onto")
+        placements = [
+            placement for placement in shard_router.misplaced(self.index_name)
+            if not domain_ids or placement["domainId"] in domain_ids
+        ]
+        if dry_run:
+            return [self.plan(placement) for placement in placements]
+
+        results: Dict[str, Dict[str, Any]] = {}
+        draining = []
+        for placement in placements:
+            if placement.get("status") == "draining":
+                # Switched by an interrupted run
+                draining.append(placement)
+                continue
+            try:
+                draining.append(self.switch(placement))
+            except Exception as e:
+                logger.error("Domain move failed", domain_id=placement["domainId"], error=str(e))
+                results[placement["domainId"]] = {"domainId": placement["domainId"], "status": "failed", "error": str(e)}
+        if not draining:
+            return list(results.values())
+
+        # Other processes keep their cached placement (and may write to the source) this long after a switch;
+        # one wait covers every domain switched above
+        now = time.time()
+        wait = max(placement.get("switched_at", now) for placement in draining) + settings.SHARD_PLACEMENT_CACHE_TTL - now
+        if wait > 0:
+            logger.info("Waiting for cached shard placements to expire", domains=len(draining), seconds=round(wait, 1))
+            time.sleep(wait)
+
+        for placement in draining:
+            try:
+                results[placement["domainId"]] = self.finish(placement)
+            except Exception as e:
+                logger.error("Domain move failed", domain_id=placement["domainId"], error=str(e))
+                results[placement["domainId"]] = {"domainId": placement["domainId"], "status": "failed", "error": str(e)}
+        return list(results.values())
+
+
+def main(argv: List[str] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=settings.PINECONE_DRHP_INDEX, help="Logical (unsharded) index name")
+    parser.add_argument("--domain-id", action="append", dest="domain_ids", help="Repeatable; default: every misplaced domain")
+    parser.add_argument("--rate", type=int, default=settings.SHARD_REBALANCE_RATE, help="Vectors per second")
+    parser.add_argument("--batch-size", type=int, default=settings.SHARD_REBALANCE_BATCH)
+    parser.add_argument("--dry-run", action="store_true", help="List the moves and their vector counts without writing")
+    args = parser.parse_args(argv)
+
+    results = ShardRebalance(args.index, args.rate, args.batch_size).run(args.domain_ids, dry_run=args.dry_run)
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Domain shard router.
+Maps each domainId to one of the PINECONE_SHARDS indexes with a
+consistent-hash ring, and remembers where every domain's vectors
+actually are, so adding a shard never strands a domain before it is
+rebalanced.
+"""
+import bisect
+import hashlib
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ASCENDING
+from app.db.mongo import mongodb
+from app.services.vector_registry import vector_registry
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+Shard = Tuple[str, str]  # (index name, host)
+
+
+class ConsistentHashRing:
+    """
+    Hash ring with `vnodes` points per shard; adding a shard moves about
+    1/N of the keys. Points hash the index name and host, so two shards
+    sharing an index name (on different projects) get distinct points.
+    """
+
+    def __init__(self, shards: List[Shard], vnodes: int = 64):
+        self.shards = list(shards)
+        self._points: List[int] = []
+        self._owners: List[Shard] = []
+        for point, shard in sorted(
+            (self._hash(f"{shard[0]}@{shard[1]}#{replica}"), shard) for shard in self.shards for replica in range(vnodes)
+        ):
+            self._points.append(point)
+            self._owners.append(shard)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def get(self, key: str) -> Shard:
+        position = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[position]
+
+
+class ShardRouter:
+    """
+    Resolves the physical (index, host) for a logical index and domainId.
+
+    A domain's placement (the shard holding its vectors) is kept in a
+    Mongo collection and wins over the ring: it is written on the
+    domain's first upsert and only changed by rebalancing. Domains that
+    already had vectors before sharding was configured are placed on the
+    original index. Placements are cached in-process for
+    SHARD_PLACEMENT_CACHE_TTL seconds.
+    """
+
+    def __init__(self, collection_name: str = None):
+        self.collection_name = collection_name or settings.SHARD_PLACEMENT_COLLECTION
+        self._indexed = False
+        self._ring: Optional[ConsistentHashRing] = None
+        self._cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _collection(self):
+        if mongodb.sync_db is None:
+            mongodb.connect_sync()
+        collection = mongodb.get_sync_collection(self.collection_name)
+        if not self._indexed:
+            collection.create_index([("index", ASCENDING), ("domainId", ASCENDING)], unique=True)
+            self._indexed = True
+        return collection
+
+    @staticmethod
+    def shards() -> List[Shard]:
+        """PINECONE_SHARDS as (index, host) pairs, in configured order."""
+        shards = []
+        for entry in settings.PINECONE_SHARDS.split(","):
+            if entry.strip():
+                name, _, host = entry.strip().partition("=")
+                shards.append((name.strip(), host.strip()))
+        return shards
+
+    @property
+    def ring(self) -> ConsistentHashRing:
+        if self._ring is None:
+            self._ring = ConsistentHashRing(self.shards(), settings.PINECONE_SHARD_VNODES)
+        return self._ring
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(settings.PINECONE_SHARDS.strip())
+
+    @staticmethod
+    def is_logical(index_name: str) -> bool:
+        """Only the configured DRHP/RHP index names are sharded."""
+        return index_name in (settings.PINECONE_DRHP_INDEX, settings.PINECONE_RHP_INDEX)
+
+    def placement(self, index_name: str, domain_id: str) -> Optional[Dict[str, Any]]:
+        """The domain's recorded placement ({"shard", "host", ...}), cached."""
+        key = (index_name, domain_id)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and time.time() - cached[0] < settings.SHARD_PLACEMENT_CACHE_TTL:
+                return cached[1]
+        record = self._collection().find_one({"index": index_name, "domainId": domain_id}, {"_id": 0})
+        with self._lock:
+            self._cache[key] = (time.time(), record)
+        return record
+
+    def place(self, index_name: str, domain_id: str, shard: Shard, status: str = "placed", **fields: Any) -> None:
+        """Record (or move) a domain's placement; extra fields are stored on the record."""
+        self._collection().update_one(
+            {"index": index_name, "domainId": domain_id},
+            {"$set": {"shard": shard[0], "host": shard[1], "status": status, "updated_at": time.time(), **fields}},
+            upsert=True
+        )
+        with self._lock:
+            self._cache.pop((index_name, domain_id), None)
+
+    def resolve(self, index_name: str, host: str, domain_id: Optional[str], for_write: bool = False) -> Shard:
+        """
+        Physical (index, host) for a logical index and domain.
+
+        Unsharded indexes, and calls without a domainId, keep
+        (index_name, host). A domain with no placement can only have
+        vectors from before sharding, so reads stay on the original index;
+        its first write places it there too if the registry already knows
+        the domain, else on its ring shard.
+        """
+        if not domain_id or not self.enabled() or not self.is_logical(index_name):
+            return index_name, host
+        try:
+            record = self.placement(index_name, domain_id)
+            if record:
+                return record["shard"], record["host"]
+            if not for_write:
+                return index_name, host
+            shard = (index_name, host) if vector_registry.has_domain(index_name, domain_id) else self.ring.get(domain_id)
+            self.place(index_name, domain_id, shard)
+            return shard
+        except Exception as e:
+            # Unplaced domains live on the original index, so it is the safe default
+            logger.warning("Shard placement lookup failed, using the original index", domain_id=domain_id, error=str(e))
+            return index_name, host
+
+    def misplaced(self, index_name: str) -> List[Dict[str, Any]]:
+        """Placements whose ring shard changed (e.g. after adding shards), or whose move was interrupted."""
+        moves = []
+        for record in self._collection().find({"index": index_name}, {"_id": 0}):
+            target = self.ring.get(record["domainId"])
+            if (record["shard"], record["host"]) != target or record.get("status") != "placed":
+                moves.append({**record, "target": target})
+        return moves
+
+
+shard_router = ShardRouter()
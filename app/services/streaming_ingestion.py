@@ -0,0 +1,260 @@
+"""
+Streaming Ingestion Pipeline.
+Overlaps extract/chunk, embed and upsert stages with bounded asyncio queues.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import numpy as np
+from app.services.boilerplate import BoilerplateDetector
+from app.services.extraction import ExtractionService, DocumentContent
+from app.services.chunking import ChunkingService
+from app.services.chunk_batch import ChunkBatch
+from app.services.embedding import EmbeddingService
+from app.services.sections import section_detector
+from app.services.vector_store import vector_store_service
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class _StageCancelled(Exception):
+    """Raised inside the producer thread when a downstream stage has failed."""
+
+
+class StreamingIngestionPipeline:
+    """
+    Streams a document through extraction, chunking, embedding and upsert.
+
+    Stage layout:
+      producer thread: pages -> clean -> section labels -> incremental splitter -> chunk batches
+      embed task:      chunk batches -> embeddings
+      upsert task:     embedded batches -> Pinecone
+
+    Every hand-off is a bounded queue, so a slow stage applies backpressure
+    upstream and at most STREAMING_QUEUE_SIZE batches are in memory per stage.
+    The PDF itself must be fully fetched first (PdfReader needs the
+    trailing xref table), so streaming starts at extraction; the document
+    is read from its spooled file rather than held as bytes.
+    """
+
+    def __init__(
+        self,
+        extraction: Optional[ExtractionService] = None,
+        chunking: Optional[ChunkingService] = None,
+        embedding: Optional[EmbeddingService] = None,
+        batch_size: int = None,
+        queue_size: int = None
+    ):
+        self.extraction = extraction or ExtractionService()
+        self.chunking = chunking or ChunkingService()
+        self.embedding = embedding or EmbeddingService()
+        self.batch_size = batch_size or settings.STREAMING_BATCH_SIZE
+        self.queue_size = queue_size or settings.STREAMING_QUEUE_SIZE
+
+    def _iter_clean_parts(
+        self,
+        file_content: DocumentContent,
+        file_type: str,
+        boilerplate: Optional[BoilerplateDetector] = None
+    ) -> Iterator[str]:
+        """Yield cleaned text parts (one per PDF page) in document order."""
+        if file_type.lower() == "pdf":
+            pages = self.extraction.iter_content_pages(
+                file_content, boilerplate, warmup=settings.BOILERPLATE_WARMUP_PAGES
+            )
+            for page_text in pages:
+                yield self.extraction.clean_text(page_text)
+        elif file_type.lower() == "txt":
+            yield self.extraction.clean_text(self.extraction.read_bytes(file_content).decode("utf-8"))
+        else:
+            raise ValueError(f"Unsupported file type for this pipeline: {file_type}")
+
+    def _iter_labelled_parts(
+        self,
+        file_content: DocumentContent,
+        file_type: str,
+        boilerplate: Optional[BoilerplateDetector] = None
+    ) -> Iterator[Tuple[Optional[str], str]]:
+        """
+        Yield (section, cleaned part). With SECTION_CHUNKING, PDF pages are
+        labelled from their raw text (headings need its line breaks);
+        otherwise every section is None.
+        """
+        if settings.SECTION_CHUNKING and file_type.lower() == "pdf":
+            pages = self.extraction.iter_content_pages(
+                file_content, boilerplate, warmup=settings.BOILERPLATE_WARMUP_PAGES
+            )
+            yield from section_detector.label_pages(pages, clean=self.extraction.clean_text)
+        else:
+            for part in self._iter_clean_parts(file_content, file_type, boilerplate):
+                yield None, part
+
+    def _iter_chunks(self, parts: Iterator[Tuple[Optional[str], str]]) -> Iterator[Tuple[Optional[str], str]]:
+        """
+        Yield (section, chunk_text). Each run of parts in one section is
+        split on its own, so chunks never span sections.
+        """
+        for section, labelled in groupby(parts, key=itemgetter(0)):
+            for chunk in self.chunking.split_stream(part for _, part in labelled):
+                yield section, chunk
+
+    def _produce(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        queue: asyncio.Queue,
+        stop: threading.Event,
+        file_content: DocumentContent,
+        file_type: str,
+        chunk_metadata: Dict[str, Any],
+        stats: Dict[str, Any]
+    ) -> None:
+        """Extract, clean and chunk in a worker thread, pushing chunk batches to the queue."""
+
+        def put(item) -> None:
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=0.5)
+                    return
+                except FutureTimeoutError:
+                    if stop.is_set():
+                        future.cancel()
+                        raise _StageCancelled()
+
+        def counted(parts: Iterator[Tuple[Optional[str], str]]) -> Iterator[Tuple[Optional[str], str]]:
+            for section, part in parts:
+                if part:
+                    # + 1 for the space split_stream joins parts with
+                    stats["char_count"] += len(part) + (1 if stats["char_count"] else 0)
+                yield section, part
+
+        def emit(texts: List[str], sections: List[Optional[str]]) -> None:
+            batch = ChunkBatch.from_texts(
+                texts,
+                metadata=chunk_metadata,
+                sections=sections if any(sections) else None,
+                first_index=stats["chunk_count"] - len(texts)
+            )
+            token_counts = self.chunking.token_counts(texts)
+            if token_counts is not None:
+                batch.token_counts = np.asarray(token_counts, dtype=np.int32)
+            put(batch)
+
+        texts: List[str] = []
+        sections: List[Optional[str]] = []
+        boilerplate = BoilerplateDetector() if settings.BOILERPLATE_STRIPPING and file_type.lower() == "pdf" else None
+        parts = counted(self._iter_labelled_parts(file_content, file_type, boilerplate))
+        for section, chunk in self._iter_chunks(parts):
+            if stop.is_set():
+                raise _StageCancelled()
+            texts.append(chunk)
+            sections.append(section)
+            stats["chunk_count"] += 1
+            if len(texts) >= self.batch_size:
+                emit(texts, sections)
+                texts, sections = [], []
+        if texts:
+            emit(texts, sections)
+        if boilerplate:
+            stats["boilerplate"] = boilerplate.summary()
+        put(_DONE)
+
+    async def _embed_stage(self, inbox: asyncio.Queue, outbox: asyncio.Queue, dimensions: int) -> None:
+        """Embed chunk batches as they arrive."""
+        while True:
+            batch = await inbox.get()
+            if batch is _DONE:
+                await outbox.put(_DONE)
+                return
+            await outbox.put(await self.embedding.embed_batch(batch, dimensions))
+
+    async def _upsert_stage(
+        self,
+        inbox: asyncio.Queue,
+        index_name: str,
+        namespace: str,
+        host: str,
+        stats: Dict[str, Any]
+    ) -> None:
+        """Upsert embedded batches as they arrive."""
+        while True:
+            batch = await inbox.get()
+            if batch is _DONE:
+                return
+            result = await asyncio.to_thread(
+                vector_store_service.upsert_batch,
+                batch=batch,
+                index_name=index_name,
+                namespace=namespace,
+                host=host
+            )
+            stats["upserted_count"] += result.get("upserted_count", 0)
+            stats["batches"] += 1
+
+    async def run(
+        self,
+        file_content: DocumentContent,
+        file_type: str,
+        chunk_metadata: Dict[str, Any],
+        index_name: str,
+        namespace: str,
+        host: str = ""
+    ) -> Dict[str, Any]:
+        """
+        Stream one document into the vector store.
+
+        Returns:
+            {"chunk_count", "char_count", "upserted_count", "batches", "duration"}
+            plus "boilerplate" statistics for PDFs when stripping is enabled
+        """
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        stats = {"chunk_count": 0, "char_count": 0, "upserted_count": 0, "batches": 0}
+
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        embedded_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        logger.info(
+            "Starting streaming ingestion",
+            namespace=namespace,
+            batch_size=self.batch_size,
+            queue_size=self.queue_size
+        )
+
+        tasks = [
+            asyncio.ensure_future(asyncio.to_thread(
+                self._produce, loop, chunk_queue, stop, file_content, file_type, chunk_metadata, stats
+            )),
+            asyncio.ensure_future(self._embed_stage(chunk_queue, embedded_queue, vector_store_service.dimension_for(index_name))),
+            asyncio.ensure_future(self._upsert_stage(embedded_queue, index_name, namespace, host, stats)),
+        ]
+
+        try:
+            # Fail fast: the first stage error stops the whole stream
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None and not isinstance(task.exception(), _StageCancelled):
+                    raise task.exception()
+        finally:
+            stop.set()
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        stats["duration"] = time.time() - start_time
+        logger.info("Streaming ingestion completed", namespace=namespace, **stats)
+        return stats
+
+
+streaming_ingestion_pipeline = StreamingIngestionPipeline()
@@ -5,15 +5,16 @@ Stores summaries in markdown format with toggle-based conditional sections
 """
 import asyncio
 import time
+from contextvars import ContextVar
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from app.core.config import settings
 from app.core.logging import get_logger
-from app.services.vector_store import vector_store_service
-from app.services.embedding import EmbeddingService
-from app.services.rerank import rerank_service
+from app.services.retrieval import RetrievalMemo, retrieval_engine
 from app.services.summarization.prompts import (
     SUBQUERIES,
+    INVESTOR_QUERY,
+    CAPITAL_HISTORY_QUERY,
     INVESTOR_EXTRACTOR_SYSTEM_PROMPT,
     CAPITAL_HISTORY_EXTRACTOR_SYSTEM_PROMPT,
     MAIN_SUMMARY_SYSTEM_PROMPT,
@@ -26,6 +27,9 @@ import json
 
 logger = get_logger(__name__)
 
+# Retrieval memo of the summary job running in the current context (shared by its agents)
+_retrieval_memo: ContextVar[Optional[RetrievalMemo]] = ContextVar("summary_retrieval_memo", default=None)
+
 
 class SummaryPipeline:
     """
@@ -39,7 +43,6 @@ class SummaryPipeline:
     """
     
     def __init__(self):
-        self.embedding = EmbeddingService()
         self.client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.md_converter = MarkdownConverter()
     
@@ -51,82 +54,38 @@ class SummaryPipeline:
         host: str = None,
         vector_top_k: int = 15,
         rerank_top_n: int = 10,
-        metadata_filter: Optional[Dict[str, Any]] = None
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        sections: Optional[List[str]] = None
     ) -> str:
         """
-        Retrieves context from Pinecone with Cohere reranking.
-        Matches n8n workflow retrieval logic.
+        Retrieves context for a batch of queries (see app.services.retrieval).
+        Matches n8n workflow retrieval logic; reranking is disabled, so the
+        top rerank_top_n vector matches of each query are kept.
+        
+        sections optionally restricts the search to chunks tagged with those
+        DRHP sections (see app.services.sections); when the restricted search
+        finds nothing (untagged documents, a missed heading) the queries are
+        retrieved again without it. Queries ranked at ingestion
+        (RETRIEVAL_PRECOMPUTE) are read from their stored ranking.
         """
-        index_name = index_name or settings.PINECONE_DRHP_INDEX
-        host = host or settings.PINECONE_DRHP_HOST
-        
-        all_context = []
-        for query in queries:
-            try:
-                # 1. Vector Search
-                query_vector = await self.embedding.embed_text(query)
-                index = vector_store_service.get_index(index_name, host=host)
-                
-                # Construct Filter
-                # Default filter by documentName (namespace)
-                filter_criteria = {"documentName": namespace} if namespace and namespace != "" else {}
-                
-                # Merge with metadata_filter if provided via API (e.g. documentId, domainId)
-                if metadata_filter:
-                    filter_criteria.update(metadata_filter)
-                
-                # If criteria is empty, set to None to allow querying (though generally unsafe without namespace)
-                query_filter = filter_criteria if filter_criteria else None
-                
-                # First try: Query the default namespace ("") with filters
-                # This matches the single-index strategy where we rely on metadata for separation
-                safe_namespace = ""
-                
-                # Try default namespace with filter
-                search_res = index.query(
-                    vector=query_vector,
-                    top_k=vector_top_k,
-                    namespace=safe_namespace,
-                    include_metadata=True,
-                    filter=query_filter
-                )
-                initial_chunks = [m['metadata']['text'] for m in search_res['matches']]
-                
-                # Fallback: Query specific namespace (legacy support)
-                if not initial_chunks and namespace and namespace != "":
-                    # Remove "documentName" from filter for legacy namespace search
-                    # Legacy documents using namespace for isolation might NOT have documentName metadata
-                    # Create filtered copy without "documentName"
-                    legacy_filter_dict = {k: v for k, v in (query_filter or {}).items() if k != "documentName"}
-                    legacy_filter: Optional[Dict[str, Any]] = legacy_filter_dict if legacy_filter_dict else None
-                        
-                    # logger.info(f"Fallback search in legacy namespace {namespace} with filter {legacy_filter}")
-                    search_res = index.query(
-                        vector=query_vector,
-                        top_k=vector_top_k,
-                        namespace=namespace,
-                        include_metadata=True,
-                        filter=legacy_filter
-                    )
-                    initial_chunks = [m['metadata']['text'] for m in search_res['matches']]
-
-                # 2. Reranking (Disabled as requested)
-                if initial_chunks:
-                    all_context.extend(initial_chunks[:rerank_top_n])
-                    
-            except Exception as e:
-                logger.error(f"Context retrieval failed for query", query=query, error=str(e))
-                continue
-        
-        # Deduplicate
-        unique_context = []
-        seen = set()
-        for chunk in all_context:
-            if chunk not in seen:
-                unique_context.append(chunk)
-                seen.add(chunk)
-        
-        return "\n---\n".join(unique_context)
+        result = await retrieval_engine.retrieve(
+            queries,
+            namespace,
+            index_name,
+            host,
+            top_k=vector_top_k,
+            metadata_filter=metadata_filter,
+            sections=sections,
+            memo=_retrieval_memo.get(),
+            precomputed=True
+        )
+        context = result.context(rerank_top_n)
+        if sections and not context:
+            logger.info("No context in sections, retrieving without the section filter", namespace=namespace, sections=sections)
+            return await self._retrieve_context(
+                queries, namespace, index_name, host, vector_top_k, rerank_top_n, metadata_filter
+            )
+        return context
     
     async def _agent_1_investor_extractor(
         self,
@@ -143,15 +102,15 @@ class SummaryPipeline:
         logger.info("Agent 1: Investor Extractor - Starting", namespace=namespace)
         
         # Retrieve context (50 chunks, reranked via Cohere)
-        investor_query = ["Extract complete shareholding pattern, investor list, and capital structure from DRHP"]
         context = await self._retrieve_context(
-            investor_query,
+            [INVESTOR_QUERY],
             namespace,
             index_name,
             host,
             vector_top_k=10,
             rerank_top_n=10,
-            metadata_filter=metadata_filter
+            metadata_filter=metadata_filter,
+            sections=["capital_structure"]
         )
         
         if not context:
@@ -204,15 +163,15 @@ class SummaryPipeline:
         logger.info("Agent 2: Capital History Extractor - Starting", namespace=namespace)
         
         # Retrieve context (10 chunks, reranked via Cohere)
-        capital_query = ["Extract complete equity share capital history table and premium rounds from DRHP"]
         context = await self._retrieve_context(
-            capital_query,
+            [CAPITAL_HISTORY_QUERY],
             namespace,
             index_name,
             host,
             vector_top_k=10,
             rerank_top_n=10,
-            metadata_filter=metadata_filter
+            metadata_filter=metadata_filter,
+            sections=["capital_structure"]
         )
         
         if not context:
@@ -594,6 +553,9 @@ class SummaryPipeline:
             custom_subqueries = [sq for sq in custom_subqueries if isinstance(sq, str) and sq.strip()]
         else:
             custom_subqueries = None  # Will fall back to default SUBQUERIES in agents
+        if custom_subqueries and domain_id:
+            # Normally registered at onboarding; covers workers started before it
+            await retrieval_engine.register_queries(custom_subqueries, index_name, scope=domain_id)
 
         logger.info("Tenant config resolved", 
                     investor_match=investor_match_enabled,
@@ -603,6 +565,9 @@ class SummaryPipeline:
                     has_custom_validator=bool(custom_validator),
                     custom_subqueries_count=len(custom_subqueries) if custom_subqueries else 0)
         
+        # Agents repeat each other's queries (Agent 4 re-runs Agent 3's subqueries with a smaller top_k)
+        memo = RetrievalMemo()
+        memo_token = _retrieval_memo.set(memo)
         try:
             # PHASE 1: Parallel Data Extraction
             logger.info("Phase 1: Parallel Data Extraction")
@@ -770,7 +735,8 @@ class SummaryPipeline:
                     "agents_executed": 4,
                     "investor_match_enabled": investor_match_enabled,
                     "valuation_enabled": valuation_enabled,
-                    "adverse_enabled": adverse_enabled
+                    "adverse_enabled": adverse_enabled,
+                    "retrieval": memo.stats()
                 }
             }
             
@@ -781,6 +747,9 @@ class SummaryPipeline:
                 "message": f"Summary generation failed: {str(e)}",
                 "duration": time.time() - start_time
             }
+        finally:
+            _retrieval_memo.reset(memo_token)
+            logger.info("Summary retrieval memo", namespace=namespace, **memo.stats())
 
 
 # Singleton instance
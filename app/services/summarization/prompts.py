@@ -26,6 +26,10 @@ SUBQUERIES = [
     "Extract detailed objects of the issue including capex plans (greenfield, brownfield, expansion, debottlenecking), working capital requirements, debt repayment or prepayment details, timelines for utilization of funds, end-use applications of products or services, dominant production regions or geographies, industry overview including market size and CAGR, government initiatives and spending, key industry tailwinds and headwinds, and peer comparison of key performance indicators."
     ]
 
+# Fixed retrieval queries of Agent 1 and Agent 2
+INVESTOR_QUERY = "Extract complete shareholding pattern, investor list, and capital structure from DRHP"
+CAPITAL_HISTORY_QUERY = "Extract complete equity share capital history table and premium rounds from DRHP"
+
 # Agent 1: sectionVI investor extractor
 INVESTOR_EXTRACTOR_SYSTEM_PROMPT = """
 You are a specialized financial document extraction agent.
@@ -0,0 +1,168 @@
+"""
+Native recursive text splitter.
+Offset-based re-implementation of LangChain's RecursiveCharacterTextSplitter
+for the configuration this service uses (keep_separator=True, length=len,
+strip_whitespace=True, literal separators).
+"""
+import re
+from typing import Callable, Dict, List, Optional, Pattern, Sequence, Tuple
+
+DEFAULT_SEPARATORS = ("\n\n", "\n", " ", "")
+
+Span = Tuple[int, int]
+
+# f(position) -> cumulative length up to a character offset (e.g. tokens before it)
+Measure = Callable[[int], int]
+
+
+class SpanTextSplitter:
+    """
+    Recursive character splitter that works on (start, end) offsets.
+
+    Produces exactly the chunks RecursiveCharacterTextSplitter would for the
+    same chunk_size/chunk_overlap, so vector IDs (namespace_chunkindex) stay
+    stable. Differences are internal only:
+
+    - Separators are located with a compiled literal pattern scanned over
+      (pos, endpos); pieces are boundary offsets, never substrings.
+    - With keep_separator the pieces of one level are contiguous, so a
+      merged chunk is text[first_piece_start:last_piece_end] and the running
+      length is a subtraction instead of a list that is sliced on every pop.
+    - Whitespace stripping moves the span ends instead of copying.
+
+    Length is characters by default. Passing a measure (cumulative length at
+    a character offset, see tokenizer.token_position_counter) switches every
+    size and overlap comparison to that unit, e.g. model tokens.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, separators: Sequence[str] = DEFAULT_SEPARATORS):
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be > 0, got {chunk_size}")
+        if chunk_overlap < 0:
+            raise ValueError(f"chunk_overlap must be >= 0, got {chunk_overlap}")
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), should be smaller."
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators)
+        self._patterns: Dict[str, Pattern] = {
+            separator: re.compile(re.escape(separator)) for separator in self.separators if separator
+        }
+
+    def split_spans(
+        self,
+        text: str,
+        measure: Optional[Measure] = None,
+        starts: Optional[List[int]] = None
+    ) -> List[Span]:
+        """
+        Chunk boundaries as (start, end) offsets into text, in order.
+        starts, when given, is filled with each chunk's offset before
+        whitespace stripping: where its first merged piece begins.
+        """
+        spans: List[Span] = []
+        if text:
+            self._split(text, 0, len(text), self.separators, spans, measure, starts)
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        """Chunk strings (same output as RecursiveCharacterTextSplitter.split_text)."""
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def _split(
+        self,
+        text: str,
+        start: int,
+        end: int,
+        separators: List[str],
+        spans: List[Span],
+        measure: Optional[Measure] = None,
+        starts: Optional[List[int]] = None
+    ) -> None:
+        # First separator present in this range; "" means split into characters
+        separator = separators[-1]
+        new_separators: List[str] = []
+        for i, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                new_separators = separators[i + 1:]
+                break
+
+        # Piece boundaries: each separator occurrence starts a new piece
+        if separator:
+            bounds = [start]
+            bounds.extend(match.start() for match in self._patterns[separator].finditer(text, start, end))
+            # A separator at the very start would leave an empty first piece (dropped by LangChain)
+            if len(bounds) > 1 and bounds[1] == start:
+                del bounds[0]
+            if bounds[-1] != end:
+                bounds.append(end)
+        else:
+            bounds = list(range(start, end + 1))
+        # Cumulative length at each boundary; piece length is a difference
+        marks = [measure(position) for position in bounds] if measure else bounds
+
+        # Merge runs of short pieces; recurse into pieces that are too long
+        chunk_size = self.chunk_size
+        run_start = -1
+        for k in range(len(bounds) - 1):
+            if marks[k + 1] - marks[k] < chunk_size:
+                if run_start < 0:
+                    run_start = k
+                continue
+            if run_start >= 0:
+                self._merge(text, bounds, marks, run_start, k, spans, starts)
+                run_start = -1
+            if not new_separators:
+                spans.append((bounds[k], bounds[k + 1]))
+                if starts is not None:
+                    starts.append(bounds[k])
+            else:
+                self._split(text, bounds[k], bounds[k + 1], new_separators, spans, measure, starts)
+        if run_start >= 0:
+            self._merge(text, bounds, marks, run_start, len(bounds) - 1, spans, starts)
+
+    def _merge(
+        self,
+        text: str,
+        bounds: List[int],
+        marks: List[int],
+        first: int,
+        last: int,
+        spans: List[Span],
+        starts: Optional[List[int]] = None
+    ) -> None:
+        """Greedy merge of pieces [first, last) with overlap, as TextSplitter._merge_splits."""
+        chunk_size = self.chunk_size
+        chunk_overlap = self.chunk_overlap
+        lo = first
+        total = 0
+        for i in range(first, last):
+            length = marks[i + 1] - marks[i]
+            if total + length > chunk_size:
+                if i > lo:
+                    self._emit(text, bounds[lo], bounds[i], spans, starts)
+                    while total > chunk_overlap or (total + length > chunk_size and total > 0):
+                        total -= marks[lo + 1] - marks[lo]
+                        lo += 1
+            total += length
+        if lo < last:
+            self._emit(text, bounds[lo], bounds[last], spans, starts)
+
+    @staticmethod
+    def _emit(text: str, start: int, end: int, spans: List[Span], starts: Optional[List[int]] = None) -> None:
+        """Append the span with surrounding whitespace stripped; drop it if empty."""
+        piece_start = start
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            spans.append((start, end))
+            if starts is not None:
+                starts.append(piece_start)
@@ -0,0 +1,59 @@
+"""
+Tokenizer helpers.
+Cached tiktoken encodings for measuring text in model tokens.
+"""
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Callable, List, Sequence
+import tiktoken
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_FALLBACK_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = None) -> tiktoken.Encoding:
+    """
+    Encoding for a model, loaded once per process.
+    Unknown model names fall back to cl100k_base (used by all current
+    OpenAI embedding models).
+    """
+    model = model or settings.EMBEDDING_MODEL
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        logger.warning("No tiktoken encoding registered for model, using fallback", model=model, fallback=_FALLBACK_ENCODING)
+        return tiktoken.get_encoding(_FALLBACK_ENCODING)
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Token count of one text."""
+    return len(get_encoding(model).encode_ordinary(text))
+
+
+def count_tokens_batch(texts: Sequence[str], model: str = None) -> List[int]:
+    """Token counts of many texts, encoded in parallel by tiktoken's thread pool."""
+    if not texts:
+        return []
+    return [len(tokens) for tokens in get_encoding(model).encode_ordinary_batch(list(texts))]
+
+
+def token_position_counter(text: str, model: str = None) -> Callable[[int], int]:
+    """
+    Encode text once and return f(position) = number of tokens that start
+    before that character offset.
+
+    f(end) - f(start) is the token length of text[start:end] as tokenized
+    in context, and it is additive over adjacent spans, which is what a
+    splitter merging contiguous pieces needs.
+    """
+    encoding = get_encoding(model)
+    _, offsets = encoding.decode_with_offsets(encoding.encode_ordinary(text))
+
+    def tokens_before(position: int) -> int:
+        return bisect_left(offsets, position)
+
+    return tokens_before
@@ -0,0 +1,39 @@
+"""
+Vector backends.
+Pinecone (hosted) or a local on-disk engine behind one index interface,
+selected with VECTOR_BACKEND.
+"""
+from app.services.vector_backends.base import (
+    FetchResponse,
+    FetchedVector,
+    UpsertResponse,
+    VectorBackend,
+    VectorIndex,
+    list_ids,
+    matches_filter,
+)
+from app.core.config import settings
+
+
+def get_vector_backend(name: str = None) -> VectorBackend:
+    """Backend by name (default VECTOR_BACKEND); its module is imported on demand."""
+    name = name or settings.VECTOR_BACKEND
+    if name == "pinecone":
+        from app.services.vector_backends.pinecone_backend import PineconeBackend
+        return PineconeBackend()
+    if name == "local":
+        from app.services.vector_backends.local_backend import LocalVectorBackend
+        return LocalVectorBackend()
+    raise ValueError(f"Unknown vector backend: {name}")
+
+
+__all__ = [
+    "FetchResponse",
+    "FetchedVector",
+    "UpsertResponse",
+    "VectorBackend",
+    "VectorIndex",
+    "get_vector_backend",
+    "list_ids",
+    "matches_filter",
+]
@@ -0,0 +1,143 @@
+"""
+Vector backend interface.
+The surface of a Pinecone index the services rely on (upsert, query,
+fetch, delete, list), so any backend can stand in for Pinecone.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class UpsertResponse:
+    """Result of an upsert (mirrors Pinecone's upserted_count)."""
+
+    def __init__(self, upserted_count: int):
+        self.upserted_count = upserted_count
+
+
+class FetchedVector:
+    """One fetched vector (mirrors Pinecone's Vector)."""
+
+    def __init__(self, id: str, values: List[float], metadata: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.values = values
+        self.metadata = metadata
+
+
+class FetchResponse:
+    """Result of a fetch: vectors by id (mirrors Pinecone's FetchResponse)."""
+
+    def __init__(self, vectors: Dict[str, FetchedVector], namespace: str = ""):
+        self.vectors = vectors
+        self.namespace = namespace
+
+
+class VectorIndex(ABC):
+    """
+    One named index. Query results are Pinecone-shaped, so callers can
+    keep reading results["matches"] and match["metadata"].
+    """
+
+    @abstractmethod
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "") -> UpsertResponse:
+        """Insert or replace vectors given as {"id", "values", "metadata"} dicts."""
+
+    @abstractmethod
+    def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        namespace: str = "",
+        include_metadata: bool = False,
+        include_values: bool = False,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Top-k by cosine similarity: {"matches": [{"id", "score", "metadata"}], "namespace"}."""
+
+    @abstractmethod
+    def fetch(self, ids: List[str], namespace: str = "") -> FetchResponse:
+        """Vectors by id; unknown ids are omitted."""
+
+    @abstractmethod
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        delete_all: bool = False,
+        namespace: str = "",
+        filter: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Delete by ids, by metadata filter, or everything in a namespace."""
+
+    @abstractmethod
+    def list(self, prefix: str = "", namespace: str = "", limit: int = 100) -> Iterator[List[str]]:
+        """Vector ids starting with prefix, in pages of up to `limit` (read them with list_ids())."""
+
+
+class VectorBackend(ABC):
+    """Factory for index handles."""
+
+    name: str = ""
+
+    @abstractmethod
+    def get_index(self, index_name: str, host: str = "") -> VectorIndex:
+        """Handle for a named index (host is only meaningful to hosted backends)."""
+
+    def health_check(self, index: VectorIndex) -> None:
+        """Raise if a freshly created handle cannot serve requests."""
+
+
+def list_ids(index, prefix: str = "", namespace: str = "") -> Iterator[List[str]]:
+    """
+    index.list() pages as lists of id strings. The local backend (and
+    Pinecone SDKs before ListResponse pages) yield strings; current
+    Pinecone SDKs yield pages of ListItem objects carrying an id.
+    """
+    for page in index.list(prefix=prefix, namespace=namespace):
+        ids = [getattr(item, "id", item) for item in getattr(page, "vectors", page)]
+        yield [vector_id for vector_id in ids if isinstance(vector_id, str)]
+
+
+def matches_filter(metadata: Dict[str, Any], metadata_filter: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate a Pinecone metadata filter against one metadata dict.
+    Supports field equality, $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte,
+    $exists, and $and / $or.
+    """
+    if not metadata_filter:
+        return True
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+            if operator == "$exists" and (key in metadata) != bool(operand):
+                return False
+            if operator in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                if operator == "$gt" and not value > operand:
+                    return False
+                if operator == "$gte" and not value >= operand:
+                    return False
+                if operator == "$lt" and not value < operand:
+                    return False
+                if operator == "$lte" and not value <= operand:
+                    return False
+    return True
@@ -0,0 +1,516 @@
+"""
+Local vector backend.
+In-process vector search over files on disk: exact numpy scoring, an IVF
+index for large namespaces, Pinecone-style metadata filters, and
+memory-mapped segment loading.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from app.services.vector_backends.base import (
+    FetchResponse,
+    FetchedVector,
+    UpsertResponse,
+    VectorBackend,
+    VectorIndex,
+    matches_filter,
+)
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_MANIFEST = "manifest.json"
+_KMEANS_SAMPLE = 50_000
+_KMEANS_ITERATIONS = 10
+_SCORE_BLOCK = 65_536
+
+
+def _lock_file(lock_file) -> None:
+    """Block until this process holds the exclusive lock on an open lock file."""
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return
+    lock_file.seek(0)
+    while True:
+        try:
+            # Retries for about 10 seconds, then raises
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            time.sleep(0.1)
+
+
+def _unlock_file(lock_file) -> None:
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+    lock_file.seek(0)
+    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _Segment:
+    """One immutable upsert batch: a float32 .npy matrix (memory-mapped) plus ids and metadata."""
+
+    def __init__(self, directory: str, generation: int):
+        self.generation = generation
+        base = os.path.join(directory, f"seg-{generation:08d}")
+        self.matrix = np.load(f"{base}.npy", mmap_mode="r")
+        with open(f"{base}.json", "r", encoding="utf-8") as fh:
+            payload = json.load(fh)
+        self.ids: List[str] = payload["ids"]
+        self.metadata: List[Dict[str, Any]] = payload["metadata"]
+        norms = np.linalg.norm(self.matrix, axis=1) if len(self.ids) else np.zeros(0, dtype=np.float32)
+        norms[norms == 0] = 1.0
+        self.norms = norms.astype(np.float32)
+
+    @staticmethod
+    def write(directory: str, generation: int, ids: List[str], matrix: np.ndarray, metadata: List[Dict[str, Any]]) -> None:
+        base = os.path.join(directory, f"seg-{generation:08d}")
+        with open(f"{base}.npy.tmp", "wb") as fh:
+            np.save(fh, np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(f"{base}.json.tmp", "w", encoding="utf-8") as fh:
+            json.dump({"ids": ids, "metadata": metadata}, fh)
+        os.replace(f"{base}.npy.tmp", f"{base}.npy")
+        os.replace(f"{base}.json.tmp", f"{base}.json")
+
+    @staticmethod
+    def remove(directory: str, generation: int) -> None:
+        for suffix in (".npy", ".json"):
+            path = os.path.join(directory, f"seg-{generation:08d}{suffix}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except PermissionError:
+                # Windows: still memory-mapped by a reader; a later compaction removes it
+                logger.info("Local vector segment still in use", path=path)
+
+
+class _IVFIndex:
+    """
+    Inverted-file index over a namespace's live rows: k-means centroids,
+    one posting list per centroid, and `nprobe` lists scanned per query.
+    """
+
+    def __init__(self, vectors: np.ndarray, seed: int = 0):
+        count = len(vectors)
+        self.nlist = int(min(4096, max(16, np.sqrt(count))))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(count, size=min(count, _KMEANS_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)].copy()
+        for _ in range(_KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+        self.centroids = centroids
+        assignment = np.concatenate([
+            np.argmax(vectors[start:start + _SCORE_BLOCK] @ centroids.T, axis=1)
+            for start in range(0, count, _SCORE_BLOCK)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(self.nlist + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(self.nlist)]
+        self.vectors = vectors
+
+    def search(self, query: np.ndarray, nprobe: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Candidate rows and their scores from the `nprobe` closest lists."""
+        nprobe = min(nprobe, self.nlist)
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.lists[c] for c in probes])
+        if allowed is not None:
+            rows = rows[allowed[rows]]
+        return rows, self.vectors[rows] @ query
+
+
+class _NamespaceState:
+    """A namespace as of one manifest generation: live rows across segments."""
+
+    def __init__(self, directory: str, manifest: Dict[str, Any], segments: List[_Segment]):
+        self.directory = directory
+        self.generation = manifest["generation"]
+        self.segments = segments
+        self.locations: Dict[str, Tuple[int, int]] = {}
+        for position, segment in enumerate(segments):
+            for row, vector_id in enumerate(segment.ids):
+                self.locations[vector_id] = (position, row)
+        for vector_id, deleted_at in manifest.get("deleted", {}).items():
+            location = self.locations.get(vector_id)
+            if location and segments[location[0]].generation < deleted_at:
+                del self.locations[vector_id]
+        self.live = [np.zeros(len(segment.ids), dtype=bool) for segment in segments]
+        for position, row in self.locations.values():
+            self.live[position][row] = True
+        self.offsets = np.cumsum([0] + [len(segment.ids) for segment in segments])
+        self._value_index: Dict[str, Dict[Any, List[int]]] = {}
+        self._ivf: Optional[_IVFIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    @property
+    def dimension(self) -> Optional[int]:
+        for segment in self.segments:
+            if len(segment.ids):
+                return segment.matrix.shape[1]
+        return None
+
+    def flat(self, position: int, row: int) -> int:
+        return int(self.offsets[position]) + row
+
+    def unflat(self, flat_row: int) -> Tuple[int, int]:
+        position = int(np.searchsorted(self.offsets, flat_row, side="right")) - 1
+        return position, flat_row - int(self.offsets[position])
+
+    def metadata(self, flat_row: int) -> Dict[str, Any]:
+        position, row = self.unflat(flat_row)
+        return self.segments[position].metadata[row]
+
+    def value_index(self, key: str) -> Dict[Any, List[int]]:
+        """Live flat rows by metadata value for one key, built on first use."""
+        if key not in self._value_index:
+            index: Dict[Any, List[int]] = {}
+            for position, row in self.locations.values():
+                value = self.segments[position].metadata[row].get(key)
+                try:
+                    index.setdefault(value, []).append(self.flat(position, row))
+                except TypeError:  # unhashable (list) values are matched by scan
+                    pass
+            self._value_index[key] = index
+        return self._value_index[key]
+
+    def candidates(self, metadata_filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Boolean mask over flat rows that pass the filter (None = all live rows).
+        A top-level equality narrows candidates through a value index
+        before the full filter is evaluated.
+        """
+        live = np.concatenate(self.live) if self.live else np.zeros(0, dtype=bool)
+        if not metadata_filter:
+            return None if live.all() else live
+        rows: Optional[List[int]] = None
+        for key, condition in metadata_filter.items():
+            if key.startswith("$"):
+                continue
+            if isinstance(condition, dict) and set(condition) == {"$eq"}:
+                condition = condition["$eq"]
+            if isinstance(condition, dict):
+                continue
+            try:
+                rows = self.value_index(key).get(condition, [])
+            except TypeError:
+                continue
+            break
+        if rows is None:
+            rows = np.flatnonzero(live).tolist()
+        mask = np.zeros(len(live), dtype=bool)
+        for flat_row in rows:
+            if live[flat_row] and matches_filter(self.metadata(flat_row), metadata_filter):
+                mask[flat_row] = True
+        return mask
+
+    def ivf(self) -> _IVFIndex:
+        """IVF index over every row (dead rows are masked at query time), built on first use."""
+        if self._ivf is None:
+            vectors = np.concatenate([
+                np.asarray(segment.matrix, dtype=np.float32) / segment.norms[:, None]
+                for segment in self.segments if len(segment.ids)
+            ])
+            self._ivf = _IVFIndex(vectors)
+            logger.info("IVF index built", directory=self.directory, vectors=len(vectors), lists=self._ivf.nlist)
+        return self._ivf
+
+
+class LocalVectorIndex(VectorIndex):
+    """
+    One named index stored under VECTOR_LOCAL_DIR/<index>/<namespace>/.
+
+    Every upsert writes an immutable segment (.npy matrix + .json ids and
+    metadata) and bumps manifest.json; deletes are recorded in the
+    manifest as tombstones. Readers memory-map segments and reload only
+    when the manifest changes, so several worker processes can share one
+    directory. Writers serialise on a per-namespace file lock, and
+    segments are merged once there are more than VECTOR_LOCAL_MAX_SEGMENTS.
+
+    Queries are exact (block-wise matrix products over the mapped
+    segments) up to VECTOR_LOCAL_ANN_MIN_VECTORS live vectors, then go
+    through an IVF index probing VECTOR_LOCAL_IVF_NPROBE lists.
+    """
+
+    def __init__(self, root: str, name: str):
+        self.name = name
+        self.directory = os.path.join(root, name)
+        self._states: Dict[str, Tuple[int, _NamespaceState]] = {}
+        self._segments: Dict[Tuple[str, int], _Segment] = {}
+        # Re-entrant: writers reload state while holding it
+        self._lock = threading.RLock()
+
+    def _namespace_dir(self, namespace: str) -> str:
+        if not namespace:
+            return os.path.join(self.directory, "_default")
+        return os.path.join(self.directory, "ns-" + hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:16])
+
+    @staticmethod
+    def _read_manifest(directory: str) -> Dict[str, Any]:
+        path = os.path.join(directory, _MANIFEST)
+        if not os.path.exists(path):
+            return {"generation": 0, "segments": [], "deleted": {}}
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+    @staticmethod
+    def _write_manifest(directory: str, manifest: Dict[str, Any]) -> None:
+        path = os.path.join(directory, _MANIFEST)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh)
+        os.replace(f"{path}.tmp", path)
+
+    @contextmanager
+    def _writing(self, namespace: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Exclusive read-modify-write of a namespace's manifest."""
+        directory = self._namespace_dir(namespace)
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, open(os.path.join(directory, ".lock"), "w") as lock_file:
+            _lock_file(lock_file)
+            try:
+                manifest = self._read_manifest(directory)
+                manifest["namespace"] = namespace
+                yield directory, manifest
+                self._write_manifest(directory, manifest)
+            finally:
+                _unlock_file(lock_file)
+
+    def _state(self, namespace: str) -> Optional[_NamespaceState]:
+        """Current namespace state, reloaded when the manifest changed."""
+        directory = self._namespace_dir(namespace)
+        path = os.path.join(directory, _MANIFEST)
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._states.get(namespace)
+            if cached and cached[0] == stamp:
+                return cached[1]
+            manifest = self._read_manifest(directory)
+            segments = []
+            for generation in manifest["segments"]:
+                key = (directory, generation)
+                if key not in self._segments:
+                    self._segments[key] = _Segment(directory, generation)
+                segments.append(self._segments[key])
+            live_keys = {(directory, generation) for generation in manifest["segments"]}
+            for key in [key for key in self._segments if key[0] == directory and key not in live_keys]:
+                del self._segments[key]
+            state = _NamespaceState(directory, manifest, segments)
+            self._states[namespace] = (stamp, state)
+            return state
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "") -> UpsertResponse:
+        if not vectors:
+            return UpsertResponse(0)
+        # Within one request the last occurrence of an id wins
+        latest = {vector["id"]: vector for vector in vectors}
+        ids = list(latest)
+        matrix = np.asarray([latest[vector_id]["values"] for vector_id in ids], dtype=np.float32)
+        metadata = [latest[vector_id].get("metadata") or {} for vector_id in ids]
+
+        with self._writing(namespace) as (directory, manifest):
+            state = self._state(namespace)
+            dimension = state.dimension if state else None
+            if dimension and matrix.shape[1] != dimension:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match index dimension {dimension}")
+            manifest["generation"] += 1
+            _Segment.write(directory, manifest["generation"], ids, matrix, metadata)
+            manifest["segments"].append(manifest["generation"])
+            if len(manifest["segments"]) > settings.VECTOR_LOCAL_MAX_SEGMENTS:
+                self._compact(directory, manifest)
+        return UpsertResponse(len(ids))
+
+    def _compact(self, directory: str, manifest: Dict[str, Any]) -> None:
+        """Merge all live rows into one segment (caller holds the write lock)."""
+        state = _NamespaceState(directory, manifest, [_Segment(directory, g) for g in manifest["segments"]])
+        ids, rows, metadata = [], [], []
+        for vector_id, (position, row) in state.locations.items():
+            ids.append(vector_id)
+            rows.append(np.asarray(state.segments[position].matrix[row]))
+            metadata.append(state.segments[position].metadata[row])
+        old_segments = manifest["segments"]
+        manifest["generation"] += 1
+        dimension = state.dimension or 0
+        _Segment.write(directory, manifest["generation"], ids, np.asarray(rows, dtype=np.float32).reshape(len(rows), dimension), metadata)
+        manifest["segments"] = [manifest["generation"]]
+        manifest["deleted"] = {}
+        # Also segments an earlier compaction could not remove while they were mapped
+        leftover = {
+            int(name[4:12]) for name in os.listdir(directory)
+            if name.startswith("seg-") and name[4:12].isdigit() and int(name[4:12]) < manifest["generation"]
+        }
+        for generation in sorted(leftover | set(old_segments)):
+            _Segment.remove(directory, generation)
+        logger.info("Local vector segments compacted", index=self.name, segments=len(old_segments), vectors=len(ids))
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        namespace: str = "",
+        include_metadata: bool = False,
+        include_values: bool = False,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        state = self._state(namespace)
+        if state is None or not len(state) or top_k <= 0:
+            return {"matches": [], "namespace": namespace}
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        allowed = state.candidates(filter)
+
+        rows, scores = None, None
+        if len(state) >= settings.VECTOR_LOCAL_ANN_MIN_VECTORS:
+            if allowed is None:
+                allowed = np.concatenate(state.live)
+            rows, scores = state.ivf().search(query, settings.VECTOR_LOCAL_IVF_NPROBE, allowed)
+            if len(rows) < min(top_k, int(allowed.sum())):
+                rows, scores = None, None  # too few probed candidates under this filter; score exactly
+        if rows is None:
+            rows, scores = self._exact(state, query, allowed)
+
+        k = min(top_k, len(rows))
+        if not k:
+            return {"matches": [], "namespace": namespace}
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        matches = []
+        for flat_row, score in zip(rows[best].tolist(), scores[best].tolist()):
+            position, row = state.unflat(flat_row)
+            segment = state.segments[position]
+            match = {"id": segment.ids[row], "score": score}
+            if include_metadata:
+                match["metadata"] = segment.metadata[row]
+            if include_values:
+                match["values"] = np.asarray(segment.matrix[row]).tolist()
+            matches.append(match)
+        return {"matches": matches, "namespace": namespace}
+
+    @staticmethod
+    def _exact(state: _NamespaceState, query: np.ndarray, allowed: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Cosine scores of every allowed row, segment by segment over the mapped matrices."""
+        all_rows, all_scores = [], []
+        for position, segment in enumerate(state.segments):
+            if not len(segment.ids):
+                continue
+            start = int(state.offsets[position])
+            mask = allowed[start:start + len(segment.ids)] if allowed is not None else state.live[position]
+            local = np.flatnonzero(mask)
+            if not len(local):
+                continue
+            if len(local) == len(segment.ids):
+                scores = np.asarray(segment.matrix @ query) / segment.norms
+            else:
+                scores = np.asarray(segment.matrix[local] @ query) / segment.norms[local]
+            all_rows.append(local + start)
+            all_scores.append(scores)
+        if not all_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(all_rows), np.concatenate(all_scores)
+
+    def fetch(self, ids: List[str], namespace: str = "") -> FetchResponse:
+        state = self._state(namespace)
+        vectors = {}
+        if state is not None:
+            for vector_id in ids:
+                location = state.locations.get(vector_id)
+                if location is None:
+                    continue
+                segment = state.segments[location[0]]
+                vectors[vector_id] = FetchedVector(
+                    vector_id,
+                    np.asarray(segment.matrix[location[1]]).tolist(),
+                    segment.metadata[location[1]]
+                )
+        return FetchResponse(vectors, namespace)
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        delete_all: bool = False,
+        namespace: str = "",
+        filter: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        if delete_all:
+            directory = self._namespace_dir(namespace)
+            with self._lock:
+                self._states.pop(namespace, None)
+            shutil.rmtree(directory, ignore_errors=True)
+            return {}
+        with self._writing(namespace) as (directory, manifest):
+            state = self._state(namespace)
+            if state is None:
+                return {}
+            targets = set(ids or [])
+            if filter:
+                mask = state.candidates(filter)
+                rows = np.flatnonzero(mask) if mask is not None else np.arange(state.offsets[-1])
+                for flat_row in rows.tolist():
+                    position, row = state.unflat(flat_row)
+                    targets.add(state.segments[position].ids[row])
+            targets &= set(state.locations)
+            if targets:
+                manifest["generation"] += 1
+                for vector_id in targets:
+                    manifest["deleted"][vector_id] = manifest["generation"]
+        return {}
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        """Live vector counts per namespace (Pinecone's stats shape, as a dict)."""
+        namespaces = {}
+        if os.path.isdir(self.directory):
+            for entry in sorted(os.listdir(self.directory)):
+                manifest = self._read_manifest(os.path.join(self.directory, entry))
+                namespace = manifest.get("namespace", "")
+                state = self._state(namespace)
+                if state is not None and len(state):
+                    namespaces[namespace] = {"vector_count": len(state)}
+        return {"namespaces": namespaces, "total_vector_count": sum(n["vector_count"] for n in namespaces.values())}
+
+    def list(self, prefix: str = "", namespace: str = "", limit: int = 100) -> Iterator[List[str]]:
+        state = self._state(namespace)
+        if state is None:
+            return
+        ids = sorted(vector_id for vector_id in state.locations if vector_id.startswith(prefix))
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+
+class LocalVectorBackend(VectorBackend):
+    """Local indexes under one root directory, one handle per index per process."""
+
+    name = "local"
+
+    def __init__(self, root: str = None):
+        self.root = root or settings.VECTOR_LOCAL_DIR
+        self._indexes: Dict[str, LocalVectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def get_index(self, index_name: str, host: str = "") -> LocalVectorIndex:
+        with self._lock:
+            if index_name not in self._indexes:
+                self._indexes[index_name] = LocalVectorIndex(self.root, index_name)
+            return self._indexes[index_name]
@@ -0,0 +1,42 @@
+"""
+Pinecone vector backend.
+The hosted service; Pinecone's own Index objects already provide the
+VectorIndex surface.
+"""
+from typing import Optional
+from pinecone import Pinecone
+from app.services.vector_backends.base import VectorBackend
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class PineconeBackend(VectorBackend):
+    """Index handles from the Pinecone SDK client."""
+
+    name = "pinecone"
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key or settings.PINECONE_API_KEY
+        self._pc: Optional[Pinecone] = None
+
+    @property
+    def pc(self) -> Pinecone:
+        """Pinecone client, created on first use."""
+        if self._pc is None:
+            self._pc = Pinecone(
+                api_key=self.api_key,
+                timeout=settings.PINECONE_TIMEOUT,
+                connection_pool_maxsize=settings.PINECONE_POOL_MAXSIZE
+            )
+        return self._pc
+
+    def get_index(self, index_name: str, host: str = ""):
+        if host:
+            return self.pc.Index(index_name, host=host)
+        return self.pc.Index(index_name)
+
+    def health_check(self, index) -> None:
+        if settings.PINECONE_INDEX_HEALTH_CHECK:
+            index.describe_index_stats()
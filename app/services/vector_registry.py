@@ -0,0 +1,248 @@
+"""
+Vector ID registry.
+Records every vector id written for each (domainId, documentId), so
+deletes are batched delete-by-id calls and vectors left behind by a
+shrinking re-ingest can be found and removed.
+"""
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from pymongo import ASCENDING, UpdateOne
+from app.db.mongo import mongodb
+from app.services.vector_backends.base import list_ids
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class VectorRegistry:
+    """
+    Registry backed by one Mongo collection, one record per vector:
+    index, vector_id, host, domainId, documentId, documentName,
+    chunk_index, job_id (the ingestion that last wrote it) and updated_at.
+
+    A re-ingest rewrites the same ids under a new job_id, so whatever
+    still carries an older job_id once it completes is an orphan. Only a
+    job whose document_processing record is "completed" decides that: a
+    re-ingest that failed partway leaves the older vectors in place.
+    """
+
+    def __init__(self, collection_name: str = None):
+        self.collection_name = collection_name or settings.VECTOR_REGISTRY_COLLECTION
+        self._indexed = False
+
+    def _collection(self):
+        if mongodb.sync_db is None:
+            mongodb.connect_sync()
+        collection = mongodb.get_sync_collection(self.collection_name)
+        if not self._indexed:
+            collection.create_index([("index", ASCENDING), ("vector_id", ASCENDING)], unique=True)
+            collection.create_index([("index", ASCENDING), ("domainId", ASCENDING), ("documentId", ASCENDING)])
+            collection.create_index([("index", ASCENDING), ("documentName", ASCENDING)])
+            self._indexed = True
+        return collection
+
+    @staticmethod
+    def vector_id(namespace: str, chunk_index: int, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Collision-free vector id: "<domainId>:<documentId>:<chunk_index>".
+        Chunks without a documentId keep the legacy "<documentName>_<chunk_index>".
+        """
+        metadata = metadata or {}
+        document_id = metadata.get("documentId")
+        if not document_id:
+            return f"{namespace}_{chunk_index}"
+        return f"{metadata.get('domainId', '')}:{document_id}:{chunk_index}"
+
+    def record(
+        self,
+        index_name: str,
+        host: str,
+        namespace: str,
+        metadata: Optional[Dict[str, Any]],
+        chunk_indexes: Iterable[int],
+        vector_namespace: str = ""
+    ) -> int:
+        """Register the ids of one upsert (before it is sent, so a failed upsert is still deletable)."""
+        metadata = metadata or {}
+        now = time.time()
+        operations = []
+        for chunk_index in chunk_indexes:
+            vector_id = self.vector_id(namespace, chunk_index, metadata)
+            operations.append(UpdateOne(
+                {"index": index_name, "vector_id": vector_id},
+                {"$set": {
+                    "host": host,
+                    "namespace": vector_namespace,
+                    "domainId": metadata.get("domainId", ""),
+                    "documentId": metadata.get("documentId", ""),
+                    "documentName": namespace,
+                    "chunk_index": chunk_index,
+                    "job_id": metadata.get("job_id", ""),
+                    "updated_at": now,
+                }},
+                upsert=True
+            ))
+        if operations:
+            self._collection().bulk_write(operations, ordered=False)
+        return len(operations)
+
+    def ids(
+        self,
+        index_name: str,
+        document_name: str = None,
+        document_id: str = None,
+        domain_id: str = None
+    ) -> List[str]:
+        """Registered ids of a document, by any combination of name, documentId and domainId."""
+        return [vector_id for ids in self.ids_by_namespace(index_name, document_name, document_id, domain_id).values() for vector_id in ids]
+
+    def ids_by_namespace(
+        self,
+        index_name: str,
+        document_name: str = None,
+        document_id: str = None,
+        domain_id: str = None
+    ) -> Dict[str, List[str]]:
+        """ids() grouped by the vector namespace they were written to."""
+        grouped: Dict[str, List[str]] = {}
+        for by_namespace in self.ids_by_domain(index_name, document_name, document_id, domain_id).values():
+            for vector_namespace, ids in by_namespace.items():
+                grouped.setdefault(vector_namespace, []).extend(ids)
+        return grouped
+
+    def ids_by_domain(
+        self,
+        index_name: str,
+        document_name: str = None,
+        document_id: str = None,
+        domain_id: str = None
+    ) -> Dict[str, Dict[str, List[str]]]:
+        """ids() grouped by domainId (which decides the shard), then by vector namespace."""
+        query: Dict[str, Any] = {"index": index_name}
+        if document_name:
+            query["documentName"] = document_name
+        if document_id:
+            query["documentId"] = document_id
+        if domain_id:
+            query["domainId"] = domain_id
+        if len(query) == 1:
+            return {}
+        grouped: Dict[str, Dict[str, List[str]]] = {}
+        for record in self._collection().find(query, {"vector_id": 1, "namespace": 1, "domainId": 1, "_id": 0}):
+            by_namespace = grouped.setdefault(record.get("domainId") or "", {})
+            by_namespace.setdefault(record.get("namespace") or "", []).append(record["vector_id"])
+        return grouped
+
+    def copies(self, index_name: str, document_name: str) -> List[Tuple[str, str]]:
+        """(domainId, documentId) of every tenant copy registered under a documentName."""
+        records = self._collection().find(
+            {"index": index_name, "documentName": document_name}, {"domainId": 1, "documentId": 1, "_id": 0}
+        )
+        return sorted({(record.get("domainId") or "", record.get("documentId") or "") for record in records})
+
+    def has_domain(self, index_name: str, domain_id: str) -> bool:
+        """Whether any vector of the domain is registered in the index."""
+        return self._collection().find_one({"index": index_name, "domainId": domain_id}, {"_id": 1}) is not None
+
+    def document_ids(
+        self,
+        index,
+        index_name: str,
+        document_name: str,
+        vector_namespace: str = "",
+        domain_id: str = None,
+        document_id: str = None
+    ) -> List[str]:
+        """
+        A document's vector ids in one namespace (only the given tenant's
+        copy when domain_id / document_id are set): registered ids, else
+        (documents ingested before the registry) a list() of the legacy
+        "<documentName>_" prefix.
+        """
+        ids = []
+        if settings.VECTOR_REGISTRY_ENABLED:
+            try:
+                ids = self.ids_by_namespace(
+                    index_name, document_name=document_name, document_id=document_id, domain_id=domain_id
+                ).get(vector_namespace, [])
+            except Exception as e:
+                logger.warning("Vector registry read failed", namespace=document_name, error=str(e))
+        if ids:
+            return ids
+        return [vector_id for page in list_ids(index, prefix=f"{document_name}_", namespace=vector_namespace) for vector_id in page]
+
+    def orphans(
+        self,
+        index_name: str,
+        domain_id: str,
+        document_id: str,
+        job_id: str,
+        stale_jobs: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Records ({"vector_id", "chunk_index", "namespace"}) of a document not
+        rewritten by job_id (its latest completed ingestion); with stale_jobs,
+        only those last written by one of them.
+        """
+        job_filter = {"$in": stale_jobs} if stale_jobs is not None else {"$ne": job_id}
+        cursor = self._collection().find(
+            {"index": index_name, "domainId": domain_id, "documentId": document_id, "job_id": job_filter},
+            {"vector_id": 1, "chunk_index": 1, "namespace": 1, "_id": 0}
+        )
+        return list(cursor)
+
+    def forget(self, index_name: str, ids: List[str]) -> int:
+        """Drop registry records of deleted vectors."""
+        if not ids:
+            return 0
+        return self._collection().delete_many({"index": index_name, "vector_id": {"$in": ids}}).deleted_count
+
+    def stale_documents(self, grace_seconds: float) -> Iterator[Dict[str, Any]]:
+        """
+        Documents with vectors from more than one ingestion whose latest
+        ingestion last wrote over grace_seconds ago (so none is running).
+        Yields {"index", "host", "domainId", "documentId", "job_id",
+        "stale_jobs"}: job_id is the latest ingestion that completed,
+        stale_jobs the ingestions before it. Vectors of later ingestions
+        that did not complete are left alone, and a document with no
+        completed ingestion is skipped.
+        """
+        pipeline = [
+            {"$group": {
+                "_id": {"index": "$index", "domainId": "$domainId", "documentId": "$documentId", "job_id": "$job_id"},
+                "updated_at": {"$max": "$updated_at"},
+                "host": {"$first": "$host"},
+            }},
+            {"$sort": {"updated_at": -1}},
+            {"$group": {
+                "_id": {"index": "$_id.index", "domainId": "$_id.domainId", "documentId": "$_id.documentId"},
+                "jobs": {"$push": {"job_id": "$_id.job_id", "updated_at": "$updated_at"}},
+                "host": {"$first": "$host"},
+            }},
+            {"$match": {"jobs.1": {"$exists": True}, "_id.documentId": {"$ne": ""}}},
+        ]
+        cutoff = time.time() - grace_seconds
+        processing = mongodb.get_sync_collection("document_processing")
+        for group in self._collection().aggregate(pipeline, allowDiskUse=True):
+            if group["jobs"][0]["updated_at"] > cutoff:
+                continue
+            job_ids = [job["job_id"] for job in group["jobs"]]
+            completed = {
+                record["job_id"]
+                for record in processing.find({"job_id": {"$in": job_ids}, "status": "completed"}, {"job_id": 1, "_id": 0})
+            }
+            kept = next((position for position, job_id in enumerate(job_ids) if job_id in completed), None)
+            if kept is None or kept == len(job_ids) - 1:
+                continue
+            yield {
+                "index": group["_id"]["index"],
+                "host": group.get("host") or "",
+                "domainId": group["_id"]["domainId"],
+                "documentId": group["_id"]["documentId"],
+                "job_id": job_ids[kept],
+                "stale_jobs": job_ids[kept + 1:],
+            }
+
+
+vector_registry = VectorRegistry()
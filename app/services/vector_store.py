@@ -1,9 +1,23 @@
 """
-Pinecone vector store service.
-Handles upserting document chunks to the correct index.
+Vector store service.
+Handles upserting document chunks to the correct index, through the
+configured vector backend (Pinecone by default).
 """
-from typing import List, Dict, Any
-from pinecone import Pinecone
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from app.services.chunk_batch import ChunkBatch
+from app.services.chunk_store import chunk_store
+from app.services.vector_registry import vector_registry
+from app.services.namespace_layout import namespace_layout
+from app.services.shard_router import shard_router
+from app.services.vector_backends import get_vector_backend, list_ids
+from app.services.working_set import working_set_cache
+from app.services.precomputed_retrieval import precomputed_retrieval
+from app.services.embedding_batcher import shorten_embeddings
 from app.core.config import settings
 from app.core.logging import get_logger
 
@@ -11,11 +25,15 @@ logger = get_logger(__name__)
 
 
 class VectorStoreService:
-    """Service for interacting with Pinecone vector store."""
+    """Service for interacting with the vector store."""
     
     def __init__(self):
-        """Initialize Pinecone client."""
-        self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+        """Initialize the configured vector backend."""
+        self.backend = get_vector_backend()
+        # Index handles by (index name, host); each owns an HTTP connection pool
+        self._indexes: Dict[Tuple[str, str], Any] = {}
+        self._indexes_lock = threading.Lock()
+        self._indexes_pid = os.getpid()
 
     @staticmethod
     def _extract_index_name(name_or_url: str) -> str:
@@ -25,111 +43,438 @@ class VectorStoreService:
             return name_or_url.split("https://")[1].split("-")[0]
         return name_or_url
 
-    def get_index(self, index_name: str, host: str = ""):
-        """Get a Pinecone index instance."""
+    def dimension_for(self, index_name: str) -> int:
+        """
+        Embedding dimension of an index: its PINECONE_INDEX_DIMENSIONS entry,
+        else EMBEDDING_DIMENSION.
+        """
+        return self._index_dimensions().get(self._extract_index_name(index_name), settings.EMBEDDING_DIMENSION)
+
+    @staticmethod
+    def _index_dimensions() -> Dict[str, int]:
+        dimensions = {}
+        for entry in settings.PINECONE_INDEX_DIMENSIONS.split(","):
+            if "=" in entry:
+                name, size = entry.split("=", 1)
+                dimensions[name.strip()] = int(size)
+        return dimensions
+
+    def get_index(self, index_name: str, host: str = "", domain_id: Optional[str] = None):
+        """
+        Index handle from the process-wide registry, keyed by (name, host).
+        Handles are created on first use, health-checked, and reused by
+        every later query, so connection pools and TLS sessions persist.
+        With PINECONE_SHARDS set, a domainId selects the domain's shard of
+        the DRHP/RHP index.
+        """
         clean_name = self._extract_index_name(index_name)
-        try:
-            if host:
-                return self.pc.Index(clean_name, host=host)
-            # If index_name looks like a URL, use it as host
-            if index_name.startswith("https://"):
-                return self.pc.Index(clean_name, host=index_name)
-            return self.pc.Index(clean_name)
-        except Exception as e:
-            logger.error("Failed to get Pinecone index", index_name=clean_name, host=host or index_name, error=str(e))
-            raise
+        # If index_name looks like a URL, use it as host
+        if not host and index_name.startswith("https://"):
+            host = index_name
+        clean_name, host = shard_router.resolve(clean_name, host, domain_id)
+        key = (clean_name, host)
+
+        with self._indexes_lock:
+            if self._indexes_pid != os.getpid():
+                # Forked worker: pooled connections belong to the parent
+                self._indexes.clear()
+                self._indexes_pid = os.getpid()
+            index = self._indexes.get(key)
+            if index is not None:
+                return index
+            try:
+                index = self.backend.get_index(clean_name, host=host) if host else self.backend.get_index(clean_name)
+                self.backend.health_check(index)
+            except Exception as e:
+                logger.error("Failed to get vector index", backend=self.backend.name, index_name=clean_name, host=host, error=str(e))
+                raise
+            self._indexes[key] = index
+            logger.info("Vector index handle created", backend=self.backend.name, index_name=clean_name, host=host, pooled=len(self._indexes))
+            return index
 
-    def upsert_chunks(
+    def release_index(self, index_name: str, host: str = "") -> None:
+        """Drop a pooled handle (e.g. after connection errors) so the next call recreates it."""
+        clean_name = self._extract_index_name(index_name)
+        if not host and index_name.startswith("https://"):
+            host = index_name
+        with self._indexes_lock:
+            self._indexes.pop((clean_name, host), None)
+
+    def upsert_batch(
         self,
-        chunks: List[Dict[str, Any]],
+        batch: ChunkBatch,
         index_name: str,
         namespace: str = "",
         host: str = ""
     ) -> Dict[str, Any]:
         """
-        Upsert embeddings to Pinecone.
-        
-        Args:
-            chunks: List of chunk dicts (must contain 'embedding', 'chunk_text', 'chunk_index')
-            index_name: Pinecone index name (drhpdocuments or rhpdocuments)
-            namespace: Optional namespace (e.g. filename)
-            host: Optional index host URL
-        """
-        index = self.get_index(index_name, host=host)
-        
-        vectors = []
-        for chunk in chunks:
-            # Metadata as stored in n8n workflow
-            chunk_metadata = chunk.get("metadata", {})
-            metadata = {
-                "text": chunk["chunk_text"],
-                "chunk_index": chunk["chunk_index"],
-                "documentName": namespace,
-                "documentId": chunk_metadata.get("documentId", ""),
-                "domain": chunk_metadata.get("domain", ""),
-                "domainId": chunk_metadata.get("domainId", ""),
-                "type": chunk_metadata.get("type", "DRHP")
-            }
-            # Merge extra metadata if any
-            if "metadata" in chunk:
-                metadata.update(chunk["metadata"])
-            
-            # Create a unique ID for the vector
-            vector_id = f"{namespace}_{chunk['chunk_index']}"
-            
-            vectors.append({
-                "id": vector_id,
-                "values": chunk["embedding"],
-                "metadata": metadata
-            })
-            
+        Upsert an embedded ChunkBatch.
+        
+        Wire-format vectors (float lists, per-vector metadata) are built
+        lazily, one request at a time, so only the requests in flight are
+        ever expanded out of the float32 matrix.
+        
+        With the chunk store enabled (and a documentId to key it), chunk
+        text is written there first and left out of Pinecone metadata.
+        """
+        if batch.embeddings is None:
+            raise ValueError("ChunkBatch has no embeddings; run EmbeddingService.embed_batch first")
+        target = self.dimension_for(index_name)
+        if batch.embeddings.shape[1] < target:
+            raise ValueError(f"Embeddings have {batch.embeddings.shape[1]} dimensions, index {index_name} expects {target}")
+        if batch.embeddings.shape[1] > target:
+            # Full-size vectors headed for a reduced-dimension index
+            batch.embeddings = shorten_embeddings(batch.embeddings, target)
+        
+        include_text = True
+        if settings.CHUNK_STORE_ENABLED and batch.metadata.get("documentId"):
+            chunk_store.put_batch(batch, document_name=namespace)
+            include_text = False
+        
+        layout, vector_namespace = namespace_layout.namespace_for(batch.metadata)
+        self._register(
+            index_name, host, namespace, batch.metadata, range(batch.first_index, batch.first_index + len(batch)), layout, vector_namespace
+        )
+        
+        vectors = (
+            self._build_vector(
+                namespace, chunk_index, chunk_text, embedding.tolist(), batch.metadata, section, include_text
+            )
+            for chunk_index, chunk_text, section, embedding in batch.iter_rows()
+        )
+        return self._upsert(vectors, len(batch), index_name, namespace, host, vector_namespace, batch.metadata.get("domainId"))
+
+    @staticmethod
+    def _build_vector(
+        namespace: str,
+        chunk_index: int,
+        chunk_text: str,
+        values: List[float],
+        chunk_metadata: Optional[Dict[str, Any]] = None,
+        section: Optional[str] = None,
+        include_text: bool = True
+    ) -> Dict[str, Any]:
+        """One Pinecone vector in wire format."""
+        chunk_metadata = chunk_metadata or {}
+        # Metadata as stored in n8n workflow
+        metadata = {
+            "chunk_index": chunk_index,
+            "documentName": namespace,
+            "documentId": chunk_metadata.get("documentId", ""),
+            "domain": chunk_metadata.get("domain", ""),
+            "domainId": chunk_metadata.get("domainId", ""),
+            "type": chunk_metadata.get("type", "DRHP")
+        }
+        # Text is hydrated from the chunk store at query time when not carried here
+        if include_text:
+            metadata["text"] = chunk_text
+        # DRHP/RHP section, so retrieval can pre-filter by chapter
+        if section:
+            metadata["section"] = section
+        # Merge extra metadata if any
+        metadata.update(chunk_metadata)
+        
+        return {
+            # Unique per (domainId, documentId, chunk); see VectorRegistry.vector_id
+            "id": vector_registry.vector_id(namespace, chunk_index, chunk_metadata),
+            "values": values,
+            "metadata": metadata
+        }
+
+    def _register(
+        self,
+        index_name: str,
+        host: str,
+        namespace: str,
+        chunk_metadata: Optional[Dict[str, Any]],
+        chunk_indexes: Iterable[int],
+        layout: str = "shared",
+        vector_namespace: str = ""
+    ) -> None:
+        """Record the domain's shard, vector ids and the document's namespace layout ahead of the upsert."""
+        clean_name = self._extract_index_name(index_name)
+        try:
+            # Placement first: a domain already in the registry stays on the index it is on
+            shard_router.resolve(clean_name, host, (chunk_metadata or {}).get("domainId"), for_write=True)
+            if settings.VECTOR_REGISTRY_ENABLED:
+                vector_registry.record(clean_name, host, namespace, chunk_metadata, chunk_indexes, vector_namespace)
+            if namespace:
+                namespace_layout.record(clean_name, namespace, chunk_metadata, layout, vector_namespace, host=host)
+        except Exception as e:
+            # Vectors stay deletable by documentName filter; the upsert itself must not fail
+            logger.warning("Vector registry write failed", namespace=namespace, error=str(e))
+
+    def _upsert(
+        self,
+        vectors: Iterable[Dict[str, Any]],
+        vector_count: int,
+        index_name: str,
+        namespace: str,
+        host: str,
+        vector_namespace: str = "",
+        domain_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        index = self.get_index(index_name, host=host, domain_id=domain_id)
+        
         logger.info(
             "Upserting vectors to Pinecone",
             index=index_name,
             namespace=namespace,
-            vector_count=len(vectors)
+            vector_namespace=vector_namespace,
+            vector_count=vector_count
         )
         
-        # Pinecone upsert in batches (Limit to 50 vectors per request to avoid size limits)
-        batch_size = 50
-        # ALWAYS use default namespace for single-index strategy, rely on metadata for separation
-        safe_namespace = "" 
-        
-        total_upserted = 0
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            try:
-                upsert_response = index.upsert(
-                    vectors=batch,
-                    namespace=safe_namespace
-                )
-                upserted = getattr(upsert_response, "upserted_count", len(batch))
-                total_upserted += upserted
-                logger.debug(f"Upserted batch {i//batch_size + 1}", count=upserted)
-            except Exception as e:
-                logger.error(f"Failed to upsert batch {i}", error=str(e))
-                raise
-        
-        count = total_upserted
+        # vector_namespace follows NAMESPACE_STRATEGY ("" for the shared single-index layout)
+        stats = self._upsert_vectors(index, vectors, vector_namespace)
+        count = stats["upserted_count"]
         
         logger.info(
             "Pinecone upsert completed",
             index=index_name,
             namespace=namespace,
-            upserted_count=count
+            upserted_count=count,
+            batches=stats["batches"],
+            retries=stats["retries"],
+            batch_latency_p50=stats["batch_latency_p50"],
+            batch_latency_max=stats["batch_latency_max"],
+            duration=stats["duration"]
         )
         
         return {
             "upserted_count": count,
             "namespace": namespace,
-            "index": index_name
+            "index": index_name,
+            "batches": stats["batches"],
+            "duration": stats["duration"]
         }
 
-    def delete_vectors(self, index_name: str, namespace: str, host: str = ""):
+    @staticmethod
+    def _pack_by_size(vectors: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Group vectors into requests under PINECONE_UPSERT_MAX_BYTES.
+        
+        Every vector is sized from its own serialized values, metadata and
+        id: the length of a float's JSON varies from vector to vector, so
+        one sample misestimates a batch. Vectors are consumed lazily and
+        requests yielded as they fill.
+        """
+        current: List[Dict[str, Any]] = []
+        current_bytes = 0
+        for vector in vectors:
+            size = (
+                len(json.dumps(list(vector["values"])))
+                + len(json.dumps(vector.get("metadata", {})).encode("utf-8"))
+                + len(vector["id"])
+                + 64  # keys and punctuation
+            )
+            if current and (
+                current_bytes + size > settings.PINECONE_UPSERT_MAX_BYTES
+                or len(current) >= settings.PINECONE_UPSERT_MAX_VECTORS
+            ):
+                yield current
+                current, current_bytes = [], 0
+            current.append(vector)
+            current_bytes += size
+        if current:
+            yield current
+
+    @staticmethod
+    def _upsert_batch(index, batch: List[Dict[str, Any]], namespace: str, batch_no: int) -> Tuple[int, float, int]:
+        """
+        Upsert one batch, retrying only this batch on failure.
+        Returns (upserted_count, latency_seconds, retries).
+        """
+        attempt = 0
+        while True:
+            start = time.time()
+            try:
+                upsert_response = index.upsert(vectors=batch, namespace=namespace)
+                latency = time.time() - start
+                upserted = getattr(upsert_response, "upserted_count", len(batch))
+                logger.debug(f"Upserted batch {batch_no}", count=upserted, latency=round(latency, 3))
+                return upserted, latency, attempt
+            except Exception as e:
+                attempt += 1
+                if attempt > settings.PINECONE_UPSERT_MAX_RETRIES:
+                    logger.error(f"Failed to upsert batch {batch_no}", error=str(e), attempts=attempt)
+                    raise
+                delay = min(2 ** attempt, 30)
+                logger.warning(f"Upsert batch {batch_no} failed, retrying", attempt=attempt, delay=delay, error=str(e))
+                time.sleep(delay)
+
+    def _upsert_vectors(self, index, vectors: Iterable[Dict[str, Any]], namespace: str) -> Dict[str, Any]:
+        """
+        Upsert vectors as byte-sized batches sent concurrently from a bounded thread pool.
+        At most 2x the pool size of requests are built ahead of the ones in flight.
+        """
+        start = time.time()
+        workers = max(1, settings.PINECONE_UPSERT_CONCURRENCY)
+        futures = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch_no, batch in enumerate(self._pack_by_size(vectors), start=1):
+                pending = [future for future in futures if not future.done()]
+                if len(pending) >= workers * 2:
+                    wait(pending, return_when=FIRST_COMPLETED)
+                futures.append(executor.submit(self._upsert_batch, index, batch, namespace, batch_no))
+            # result() re-raises the first batch that exhausted its retries
+            results = [future.result() for future in futures]
+        
+        if not results:
+            return {"upserted_count": 0, "batches": 0, "retries": 0,
+                    "batch_latency_p50": 0.0, "batch_latency_max": 0.0, "duration": 0.0}
+        
+        latencies = sorted(latency for _, latency, _ in results)
+        return {
+            "upserted_count": sum(upserted for upserted, _, _ in results),
+            "batches": len(results),
+            "retries": sum(retries for _, _, retries in results),
+            "batch_latency_p50": round(latencies[len(latencies) // 2], 3),
+            "batch_latency_max": round(latencies[-1], 3),
+            "duration": round(time.time() - start, 3)
+        }
+
+    @staticmethod
+    def _delete_ids(index, ids: List[str], namespace: str = "") -> int:
+        """Delete by id in VECTOR_DELETE_BATCH_SIZE requests, VECTOR_DELETE_CONCURRENCY at a time."""
+        size = max(1, settings.VECTOR_DELETE_BATCH_SIZE)
+        batches = [ids[start:start + size] for start in range(0, len(ids), size)]
+        with ThreadPoolExecutor(max_workers=max(1, settings.VECTOR_DELETE_CONCURRENCY)) as executor:
+            for future in [executor.submit(index.delete, ids=batch, namespace=namespace) for batch in batches]:
+                future.result()
+        return len(ids)
+
+    @staticmethod
+    def _legacy_ids(index, namespace: str, document_id: str) -> List[str]:
+        """
+        A document's vectors under the old "<documentName>_<chunk_index>" ids.
+        Ids must be exactly the name plus a number, and fetched metadata
+        must carry the same documentId, so other documents are never matched.
+        """
+        try:
+            candidates = [
+                vector_id
+                for page in list_ids(index, prefix=f"{namespace}_", namespace="")
+                for vector_id in page
+                if vector_id[len(namespace) + 1:].isdigit()
+            ]
+        except Exception as e:
+            # list() is only available on serverless indexes
+            logger.debug("Legacy id listing unavailable", namespace=namespace, error=str(e))
+            return []
+        legacy = []
+        for start in range(0, len(candidates), 100):
+            fetched = index.fetch(ids=candidates[start:start + 100], namespace="")
+            for vector_id, vector in fetched.vectors.items():
+                if (vector.metadata or {}).get("documentId") == document_id:
+                    legacy.append(vector_id)
+        return legacy
+
+    def delete_orphans(
+        self,
+        index,
+        index_name: str,
+        document_id: str,
+        orphans: List[Dict[str, Any]],
+        extra_ids: Optional[List[str]] = None
+    ) -> int:
+        """Delete registered orphan vectors, their registry records and their stored chunk text."""
+        by_namespace: Dict[str, List[str]] = {}
+        for record in orphans:
+            by_namespace.setdefault(record.get("namespace") or "", []).append(record["vector_id"])
+        if extra_ids:
+            by_namespace.setdefault("", []).extend(extra_ids)
+        for vector_namespace, ids in by_namespace.items():
+            self._delete_ids(index, ids, vector_namespace)
+        orphan_ids = [record["vector_id"] for record in orphans]
+        vector_registry.forget(index_name, orphan_ids)
+        if settings.CHUNK_STORE_ENABLED:
+            chunk_store.delete_chunks(document_id, [record["chunk_index"] for record in orphans])
+        return len(orphan_ids) + len(extra_ids or [])
+
+    def remove_orphans(
+        self,
+        index_name: str,
+        namespace: str,
+        chunk_metadata: Dict[str, Any],
+        host: str = "",
+        include_legacy: bool = True
+    ) -> int:
+        """
+        After an ingestion completes, delete the document's vectors it did
+        not rewrite: chunks past the new end of a shrunken document, and
+        vectors still under legacy ids. The legacy list+fetch scan runs
+        once per document; its layout record remembers that it was done.
+        Returns the number deleted.
+        """
+        document_id = chunk_metadata.get("documentId")
+        job_id = chunk_metadata.get("job_id")
+        if not settings.VECTOR_REGISTRY_ENABLED or not document_id or not job_id:
+            return 0
+        clean_name = self._extract_index_name(index_name)
+        try:
+            index = self.get_index(index_name, host=host, domain_id=chunk_metadata.get("domainId"))
+            orphans = vector_registry.orphans(clean_name, chunk_metadata.get("domainId", ""), document_id, job_id)
+            legacy = []
+            if include_legacy and not (namespace_layout.record_for(clean_name, namespace, chunk_metadata) or {}).get("legacy_checked_at"):
+                legacy = self._legacy_ids(index, namespace, document_id)
+            if orphans or legacy:
+                self.delete_orphans(index, clean_name, document_id, orphans, extra_ids=legacy)
+            if include_legacy:
+                namespace_layout.annotate(clean_name, namespace, chunk_metadata, legacy_checked_at=time.time())
+            if not orphans and not legacy:
+                return 0
+        except Exception as e:
+            # The ingestion itself succeeded; sweep_vector_orphans retries registered orphans later
+            logger.warning("Orphan removal failed", index=clean_name, namespace=namespace, error=str(e))
+            return 0
+        working_set_cache.invalidate(namespace, chunk_metadata.get("domainId"), document_id)
+        logger.info("Orphan vectors removed", index=clean_name, namespace=namespace, orphans=len(orphans), legacy=len(legacy))
+        return len(orphans) + len(legacy)
+
+    def _delete_all_copies(self, index_name: str, namespace: str, host: str = "") -> Dict[str, Any]:
+        """delete_vectors by documentName alone: each registered tenant copy in turn."""
+        clean_name = self._extract_index_name(index_name)
+        copies = set(vector_registry.copies(clean_name, namespace)) if settings.VECTOR_REGISTRY_ENABLED else set()
+        copies.update((record.get("domainId", ""), record.get("documentId", "")) for record in namespace_layout.records(clean_name, namespace))
+        copies = sorted(copy for copy in copies if any(copy))
+        logger.warning(
+            "Deleting a document by name alone is deprecated; pass documentId or domainId",
+            index=index_name, namespace=namespace, copies=len(copies)
+        )
+        if not copies:
+            index = self.get_index(index_name, host=host)
+            response = index.delete(namespace="", filter={"documentName": namespace})
+            working_set_cache.invalidate(namespace)
+            logger.info("Deletion request sent (filtered by documentName)", index=index_name, namespace=namespace)
+            return response
+        deleted = 0
+        for domain_id, document_id in copies:
+            response = self.delete_vectors(index_name, namespace, host=host, document_id=document_id or None, domain_id=domain_id or None)
+            deleted += (response or {}).get("deleted_count", 0) if isinstance(response, dict) else 0
+        return {"deleted_count": deleted}
+
+    def delete_vectors(
+        self,
+        index_name: str,
+        namespace: str,
+        host: str = "",
+        document_id: str = None,
+        domain_id: str = None
+    ):
         """
-        Delete all vectors in a namespace.
+        Delete all vectors of one tenant's copy of a document.
+        Registered ids are deleted by id in concurrent batches, from the
+        shard of the domain they belong to; documents ingested before the
+        registry fall back to a metadata filter. Tenants share filenames,
+        so callers should pass a documentId or domainId alongside the name.
+        
+        Deprecated: without either, every tenant copy registered under the
+        name is deleted one by one (the old behaviour of this call), and a
+        name nobody registered falls back to the documentName filter.
         """
-        index = self.get_index(index_name, host=host)
+        clean_name = self._extract_index_name(index_name)
+        if not document_id and not domain_id:
+            return self._delete_all_copies(index_name, namespace, host)
         
         logger.info(
             "Deleting vectors from Pinecone",
@@ -138,14 +483,42 @@ class VectorStoreService:
         )
         
         try:
-            # Delete vectors using metadata filter on default namespace
-            # Pinecone requires namespace="" for default
-            response = index.delete(
-                namespace="",
-                filter={"documentName": namespace}
-            )
+            ids_by_domain = {}
+            if settings.VECTOR_REGISTRY_ENABLED:
+                ids_by_domain = vector_registry.ids_by_domain(
+                    clean_name, document_name=namespace, document_id=document_id, domain_id=domain_id
+                )
+            if ids_by_domain:
+                start = time.time()
+                deleted = 0
+                for domain, ids_by_namespace in ids_by_domain.items():
+                    index = self.get_index(index_name, host=host, domain_id=domain)
+                    for vector_namespace, ids in ids_by_namespace.items():
+                        deleted += self._delete_ids(index, ids, vector_namespace)
+                        vector_registry.forget(clean_name, ids)
+                response = {"deleted_count": deleted}
+                logger.info("Deleted vectors by id", index=index_name, namespace=namespace, count=deleted, duration=round(time.time() - start, 3))
+            else:
+                # Delete vectors using metadata filter on default namespace
+                # Pinecone requires namespace="" for default
+                document_filter = {"documentName": namespace}
+                if document_id:
+                    document_filter["documentId"] = document_id
+                if domain_id:
+                    document_filter["domainId"] = domain_id
+                index = self.get_index(index_name, host=host, domain_id=domain_id)
+                response = index.delete(
+                    namespace="",
+                    filter=document_filter
+                )
+                logger.info("Deletion request sent (filtered by document)", index=index_name, namespace=namespace, filter=document_filter)
             
-            logger.info("Deletion request sent (filtered by documentName)", index=index_name, namespace=namespace)
+            working_set_cache.invalidate(namespace, domain_id, document_id)
+            precomputed_retrieval.forget(clean_name, namespace, domain_id=domain_id, document_id=document_id)
+            namespace_layout.forget(clean_name, namespace, document_id=document_id, domain_id=domain_id)
+            if settings.CHUNK_STORE_ENABLED:
+                removed = chunk_store.delete_document(document_id=document_id, document_name=namespace, domain_id=domain_id)
+                logger.info("Chunk text removed from store", namespace=namespace, count=removed)
             return response
             
         except Exception as e:
@@ -0,0 +1,324 @@
+"""
+Per-document vector working set.
+Loads one document's vectors into a float32 matrix and answers every
+subquery locally with exact top-k, instead of one Pinecone round trip per
+subquery per agent.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.db.mongo import mongodb
+from app.services.vector_registry import vector_registry
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Pinecone fetch takes ids in the query string; keep requests short
+_FETCH_BATCH = 100
+
+
+class DocumentWorkingSet:
+    """
+    All vectors of one document: ids, metadata and a row-normalised
+    (n, dim) float32 matrix, so cosine similarity is a matrix product.
+    """
+
+    def __init__(self, ids: List[str], matrix: np.ndarray, metadata: List[Dict[str, Any]], version: Any = None):
+        self.ids = ids
+        self.metadata = metadata
+        self.version = version
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    @staticmethod
+    def _matches(metadata: Dict[str, Any], metadata_filter: Dict[str, Any]) -> bool:
+        for key, condition in metadata_filter.items():
+            value = metadata.get(key)
+            if isinstance(condition, dict):
+                if "$in" in condition and value not in condition["$in"]:
+                    return False
+                if "$eq" in condition and value != condition["$eq"]:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    @staticmethod
+    def supports_filter(metadata_filter: Optional[Dict[str, Any]]) -> bool:
+        """Only equality, $eq and $in filters are evaluated locally."""
+        for condition in (metadata_filter or {}).values():
+            if isinstance(condition, dict) and set(condition) - {"$in", "$eq"}:
+                return False
+        return True
+
+    def search(
+        self,
+        query_vectors: np.ndarray,
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Exact top-k for every query row in one matrix product.
+        Returns Pinecone-shaped matches ({"id", "score", "metadata"}) per query.
+        """
+        rows = np.arange(len(self.ids))
+        if metadata_filter:
+            rows = np.fromiter(
+                (i for i, metadata in enumerate(self.metadata) if self._matches(metadata, metadata_filter)),
+                dtype=np.int64
+            )
+        query_vectors = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        if not len(rows):
+            return [[] for _ in range(len(query_vectors))]
+
+        scores = query_vectors @ self.matrix[rows].T
+        k = min(top_k, len(rows))
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(scores, candidates, axis=1).argsort(axis=1)[:, ::-1]
+        top = np.take_along_axis(candidates, order, axis=1)
+
+        results = []
+        for query_row, columns in enumerate(top.tolist()):
+            results.append([
+                {
+                    "id": self.ids[rows[column]],
+                    "score": float(scores[query_row, column]),
+                    "metadata": self.metadata[rows[column]],
+                }
+                for column in columns
+            ])
+        return results
+
+
+class WorkingSetCache:
+    """
+    Per-worker LRU of document working sets, bounded by matrix bytes.
+
+    Entries are keyed by (index, vector namespace, domainId, documentId,
+    documentName), so tenants that upload the same filename never share
+    one, and carry the document's ingestion version (created_at of its
+    latest document_processing record); a re-ingested document has a
+    newer version and is reloaded. The version lookup is cached for
+    WORKING_SET_VERSION_CACHE_TTL seconds, so another process's re-ingest
+    is seen within that time (this process's own re-ingests and deletes
+    invalidate at once). Loaded sets can also be snapshotted to .npz files
+    so a restarted worker does not refetch them from Pinecone.
+    """
+
+    def __init__(self, max_bytes: int = None, snapshot_dir: str = None):
+        self.max_bytes = max_bytes or settings.WORKING_SET_CACHE_MAX_BYTES
+        self.snapshot_dir = settings.WORKING_SET_SNAPSHOT_DIR if snapshot_dir is None else snapshot_dir
+        self._entries: "OrderedDict[Tuple[str, ...], DocumentWorkingSet]" = OrderedDict()
+        self._bytes = 0
+        # Documents not served locally (no vectors / too large), by version
+        self._unavailable: Dict[Tuple[str, ...], Any] = {}
+        # (documentName, documentId, domainId) -> (looked up at, version)
+        self._versions: Dict[Tuple[str, str, str], Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    @staticmethod
+    def document_version(namespace: str, document_id: str = "", domain_id: str = "") -> Any:
+        """
+        created_at of the document's latest processing record, or None.
+        Looked up by documentId (and domainId) when known, else by filename.
+        """
+        query: Dict[str, Any] = {"status": "completed"}
+        if document_id:
+            query["documentId"] = document_id
+            if domain_id:
+                query["domainId"] = domain_id
+        else:
+            query["filename"] = namespace
+        if mongodb.sync_db is None:
+            mongodb.connect_sync()
+        record = mongodb.get_sync_collection("document_processing").find_one(
+            query,
+            {"created_at": 1},
+            sort=[("created_at", -1)]
+        )
+        return record.get("created_at") if record else None
+
+    def _version(self, namespace: str, document_id: str, domain_id: str) -> Any:
+        """document_version, cached; a failed lookup logs, returns None and is not cached."""
+        key = (namespace, document_id, domain_id)
+        with self._lock:
+            cached = self._versions.get(key)
+            if cached and time.time() - cached[0] < settings.WORKING_SET_VERSION_CACHE_TTL:
+                return cached[1]
+        try:
+            version = self.document_version(namespace, document_id, domain_id)
+        except Exception as e:
+            logger.warning("Document version lookup failed", namespace=namespace, error=str(e))
+            return None
+        with self._lock:
+            self._versions[key] = (time.time(), version)
+        return version
+
+    def _snapshot_path(self, key: Tuple[str, ...]) -> str:
+        digest = hashlib.sha1("\0".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.snapshot_dir, f"{digest}.npz")
+
+    def _load_snapshot(self, key: Tuple[str, ...], version: Any) -> Optional[DocumentWorkingSet]:
+        path = self._snapshot_path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=True) as snapshot:
+            if snapshot["version"].item() != version:
+                return None
+            return DocumentWorkingSet(
+                snapshot["ids"].tolist(), snapshot["matrix"], snapshot["metadata"].tolist(), version
+            )
+
+    def _save_snapshot(self, key: Tuple[str, ...], working_set: DocumentWorkingSet) -> None:
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = self._snapshot_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            ids=np.array(working_set.ids, dtype=object),
+            matrix=working_set.matrix,
+            metadata=np.array(working_set.metadata, dtype=object),
+            version=np.array(working_set.version, dtype=object)
+        )
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _fetch(
+        index,
+        namespace: str,
+        ids: List[str],
+        version: Any,
+        vector_namespace: str = "",
+        domain_id: str = "",
+        document_id: str = ""
+    ) -> DocumentWorkingSet:
+        """Load a document's vectors from Pinecone."""
+        expected = {"documentName": namespace, "domainId": domain_id, "documentId": document_id}
+        kept_ids, rows, metadata = [], [], []
+        for start in range(0, len(ids), _FETCH_BATCH):
+            fetched = index.fetch(ids=ids[start:start + _FETCH_BATCH], namespace=vector_namespace)
+            for vector_id, vector in fetched.vectors.items():
+                vector_metadata = vector.metadata or {}
+                # A legacy id prefix can also match a longer documentName (or another tenant's copy)
+                if any(value and vector_metadata.get(key, value) != value for key, value in expected.items()):
+                    continue
+                kept_ids.append(vector_id)
+                rows.append(vector.values)
+                metadata.append(vector_metadata)
+        matrix = np.asarray(rows, dtype=np.float32).reshape(len(rows), -1)
+        return DocumentWorkingSet(kept_ids, matrix, metadata, version)
+
+    def get(
+        self,
+        index,
+        index_name: str,
+        namespace: str,
+        vector_namespace: str = "",
+        domain_id: str = "",
+        document_id: str = ""
+    ) -> Optional[DocumentWorkingSet]:
+        """
+        The document's working set, loaded on first use from the vector
+        namespace its layout puts it in; with a domainId / documentId only
+        that tenant's copy of the document is loaded.
+        Returns None for documents with no vectors under the single-index
+        id scheme (legacy namespaces) or above WORKING_SET_MAX_VECTORS.
+        """
+        domain_id, document_id = domain_id or "", document_id or ""
+        key = (index_name, vector_namespace, domain_id, document_id, namespace)
+        version = self._version(namespace, document_id, domain_id)
+        with self._lock:
+            working_set = self._entries.get(key)
+            if working_set is not None and working_set.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return working_set
+            if key in self._unavailable and self._unavailable[key] == version:
+                return None
+
+        working_set = None
+        if self.snapshot_dir:
+            try:
+                working_set = self._load_snapshot(key, version)
+            except Exception as e:
+                logger.warning("Working set snapshot unreadable", namespace=namespace, error=str(e))
+        if working_set is None:
+            ids = vector_registry.document_ids(
+                index, index_name, namespace, vector_namespace, domain_id=domain_id, document_id=document_id
+            )
+            if not ids or len(ids) > settings.WORKING_SET_MAX_VECTORS:
+                logger.info("Document not served from a working set", namespace=namespace, vectors=len(ids))
+                with self._lock:
+                    self._unavailable[key] = version
+                return None
+            working_set = self._fetch(index, namespace, ids, version, vector_namespace, domain_id, document_id)
+            if self.snapshot_dir and len(working_set):
+                self._save_snapshot(key, working_set)
+        self.loads += 1
+        logger.info(
+            "Working set loaded",
+            namespace=namespace,
+            vectors=len(working_set),
+            matrix_bytes=working_set.nbytes,
+            version=version
+        )
+
+        if not len(working_set):
+            with self._lock:
+                self._unavailable[key] = version
+            return None
+        self._put(key, working_set)
+        return working_set
+
+    def _put(self, key: Tuple[str, ...], working_set: DocumentWorkingSet) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[key] = working_set
+            self._bytes += working_set.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def invalidate(self, namespace: str, domain_id: str = None, document_id: str = None) -> None:
+        """
+        Drop one tenant's cached working sets of a documentName (every
+        tenant's without a domainId or documentId). Entries loaded without
+        a tenant may hold that tenant's vectors, so they are dropped too.
+        """
+        def matches(document_name: str, entry_domain: str, entry_document: str) -> bool:
+            return (
+                document_name == namespace
+                and (not domain_id or not entry_domain or entry_domain == domain_id)
+                and (not document_id or not entry_document or entry_document == document_id)
+            )
+
+        with self._lock:
+            for key in [key for key in self._entries if matches(key[4], key[2], key[3])]:
+                self._bytes -= self._entries.pop(key).nbytes
+            for key in [key for key in self._unavailable if matches(key[4], key[2], key[3])]:
+                del self._unavailable[key]
+            for key in [key for key in self._versions if matches(key[0], key[2], key[1])]:
+                del self._versions[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "loads": self.loads}
+
+
+working_set_cache = WorkingSetCache()
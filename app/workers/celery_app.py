@@ -4,7 +4,7 @@ Configures Celery with Redis backend and task autodiscovery.
 """
 import time
 from celery import Celery
-from celery.signals import task_prerun, task_postrun, task_failure
+from celery.signals import task_prerun, task_postrun, task_failure, worker_process_init
 from app.core.config import settings
 from app.core.logging import get_logger
 
@@ -33,6 +33,15 @@ celery_app.conf.update(
     task_reject_on_worker_lost=True,
 )
 
+# Periodic tasks (run with `celery beat`)
+if settings.VECTOR_REGISTRY_ENABLED and settings.VECTOR_ORPHAN_SWEEP_INTERVAL > 0:
+    celery_app.conf.beat_schedule = {
+        "sweep-vector-orphans": {
+            "task": "sweep_vector_orphans",
+            "schedule": float(settings.VECTOR_ORPHAN_SWEEP_INTERVAL),
+        },
+    }
+
 # Auto-discover tasks
 # Import tasks explicitly to ensure they are registered
 import app.workers.document_pipeline
@@ -40,6 +49,19 @@ import app.workers.document_pipeline
 celery_app.autodiscover_tasks(['app.workers'])
 
 
+@worker_process_init.connect
+def worker_process_init_handler(**extra):
+    """Load registered query embeddings, so summary and comparison jobs embed no fixed queries."""
+    if not settings.QUERY_EMBEDDING_PRELOAD:
+        return
+    from app.services.query_embeddings import query_embeddings
+    
+    try:
+        query_embeddings.warm()
+    except Exception as e:
+        logger.warning("Query embedding preload failed", error=str(e))
+
+
 @task_prerun.connect
 def task_prerun_handler(sender=None, task_id=None, task=None, args=None, kwargs=None, **extra):
     """Log task start."""
@@ -1,15 +1,19 @@
 import asyncio
 import time
 import traceback
-from typing import Dict, Any
+from typing import Dict, Any, List
 from celery import Task
 
 from app.workers.celery_app import celery_app
+from app.services.document_source import document_source
 from app.services.extraction import extraction_service
 from app.services.chunking import chunking_service
 from app.services.embedding import embedding_service
 from app.services.vector_store import vector_store_service
+from app.services.streaming_ingestion import streaming_ingestion_pipeline
 from app.services.backend_notifier import backend_notifier
+from app.services.ingestion_hooks import ingestion_hooks
+from app.services.precomputed_retrieval import precomputed_retrieval
 from app.db.mongo import mongodb
 from app.core.config import settings
 from app.core.logging import get_logger, log_job_start, log_job_complete, log_job_error
@@ -39,35 +43,6 @@ def process_document(
         # Determine Pinecone Index (Consolidated)
         index_name = settings.PINECONE_DRHP_INDEX
             
-        # Stage 1: Retrieve document (In prod, you would download from S3/Vercel Blob)
-        bound_logger.info("Retrieving document", file_url=file_url)
-        import requests
-        resp = requests.get(file_url, timeout=30)
-        resp.raise_for_status()
-        file_content = resp.content
-        bound_logger.info(f"Document downloaded. Size: {len(file_content)} bytes")
-        
-        # Stage 2: Extract and Clean Text (Matched to n8n "Cleaned text1" logic)
-        bound_logger.info("Extracting and cleaning text")
-        extraction_result = extraction_service.extract_text(file_content, file_type)
-        text = extraction_result["text"]
-        
-        if not text or len(text) < 100:
-             bound_logger.error("Text extraction failed or returned very little text", text_len=len(text) if text else 0)
-             raise Exception("Text extraction yielded insufficient content")
-             
-        bound_logger.info(f"Text extracted. Length: {len(text)} characters")
-
-        
-        # Stage 3: Chunk text (Matched to n8n "Recursive Character Text Splitter" 4000/800)
-        bound_logger.info("Splitting text into chunks")
-        
-        # Debug: Check specifically for "SECTION III" content in raw text
-        if "SECTION III" in text or "BUSINESS OVERVIEW" in text:
-             bound_logger.info("SECTION III / BUSINESS OVERVIEW header found in raw extracted text")
-        else:
-             bound_logger.warning("SECTION III / BUSINESS OVERVIEW header NOT found in extracted text")
-
         chunk_metadata = {
             "source": file_url,
             "job_id": job_id,
@@ -78,35 +53,93 @@ def process_document(
             "type": doc_type.upper() if doc_type else "DRHP"
         }
         
-        chunks = chunking_service.chunk_with_metadata(
-            text,
-            metadata=chunk_metadata
-        )
-        bound_logger.info(f"Generated {len(chunks)} chunks")
-        
-        # Monitor chunk content sample
-        if len(chunks) > 0:
-             bound_logger.info(f"Sample Chunk 0 Length: {len(chunks[0]['chunk_text'])}")
+        # Rankings precomputed for a previous ingestion point at chunks this one replaces
+        ingestion_hooks.before_upsert(index_name, chunk_metadata)
+
+        # Stage 1: Retrieve document into a spooled file (URL, file:// or shared-volume path)
+        bound_logger.info("Retrieving document", file_url=file_url)
+        with document_source.fetch(file_url) as document:
+            file_content = document.file
+            bound_logger.info(f"Document retrieved. Size: {document.size} bytes")
+        
+            if settings.INGESTION_STREAMING:
+                # Stages 2-5: Extract, chunk, embed and upsert as overlapping stages
+                bound_logger.info("Streaming document through extract/chunk/embed/upsert stages")
+                stream_res = asyncio.run(streaming_ingestion_pipeline.run(
+                    file_content,
+                    file_type,
+                    chunk_metadata,
+                    index_name=index_name,
+                    namespace=filename,
+                    host=settings.PINECONE_DRHP_HOST
+                ))
+                if stream_res["char_count"] < 100:
+                    bound_logger.error("Text extraction failed or returned very little text", text_len=stream_res["char_count"])
+                    raise Exception("Text extraction yielded insufficient content")
+                char_count = stream_res["char_count"]
+                chunk_count = stream_res["chunk_count"]
+                boilerplate_stats = stream_res.get("boilerplate")
+                bound_logger.info(f"Streamed {chunk_count} chunks", upserted=stream_res["upserted_count"])
+            else:
+                # Stage 2: Extract and Clean Text (Matched to n8n "Cleaned text1" logic)
+                bound_logger.info("Extracting and cleaning text")
+                extraction_result = extraction_service.extract_text(file_content, file_type)
+                text = extraction_result["text"]
+        
+                if not text or len(text) < 100:
+                     bound_logger.error("Text extraction failed or returned very little text", text_len=len(text) if text else 0)
+                     raise Exception("Text extraction yielded insufficient content")
+             
+                bound_logger.info(f"Text extracted. Length: {len(text)} characters")
 
         
-        # Stage 4: Generate Embeddings (Matched to n8n "text-embedding-3-large")
-        bound_logger.info("Generating OpenAI embeddings", count=len(chunks))
-        # Embedding service call (sync wrapper around LangChain)
-        chunks_with_embeddings = asyncio.run(embedding_service.embed_chunks(chunks))
+                # Stage 3: Chunk text (Matched to n8n "Recursive Character Text Splitter" 4000/800)
+                bound_logger.info("Splitting text into chunks")
         
-        if len(chunks_with_embeddings) > 0:
-             emb_len = len(chunks_with_embeddings[0].get("values", []))
-             bound_logger.info(f"Embedding generated. Dimension: {emb_len}")
+                # Debug: Check specifically for "SECTION III" content in raw text
+                if "SECTION III" in text or "BUSINESS OVERVIEW" in text:
+                     bound_logger.info("SECTION III / BUSINESS OVERVIEW header found in raw extracted text")
+                else:
+                     bound_logger.warning("SECTION III / BUSINESS OVERVIEW header NOT found in extracted text")
+
+                # Chunk per DRHP section when detected; every chunk carries its section label
+                batch = chunking_service.chunk_batch(
+                    text,
+                    metadata=chunk_metadata,
+                    sections=extraction_result.get("sections"),
+                    page_starts=extraction_result.get("page_starts")
+                )
+                bound_logger.info(f"Generated {len(batch)} chunks")
+        
+                # Monitor chunk content sample
+                if len(batch) > 0:
+                     bound_logger.info(f"Sample Chunk 0 Length: {len(batch.chunk_text(0))}")
+
         
-        # Stage 5: Upsert to Pinecone
-        bound_logger.info("Upserting to Pinecone", index=index_name)
-        upsert_res = vector_store_service.upsert_chunks(
-            chunks=chunks_with_embeddings,
-            index_name=index_name,
-            namespace=filename,
-            host=settings.PINECONE_DRHP_HOST
-        )
-        bound_logger.info(f"Upsert Response: {upsert_res}")
+                # Stage 4: Generate Embeddings (Matched to n8n "text-embedding-3-large")
+                bound_logger.info("Generating OpenAI embeddings", count=len(batch))
+                # Fills batch.embeddings with one float32 matrix
+                asyncio.run(embedding_service.embed_batch(batch, vector_store_service.dimension_for(index_name)))
+        
+                if len(batch) > 0:
+                     emb_len = batch.embeddings.shape[1]
+                     bound_logger.info(f"Embedding generated. Dimension: {emb_len}")
+        
+                # Stage 5: Upsert to Pinecone
+                bound_logger.info("Upserting to Pinecone", index=index_name)
+                upsert_res = vector_store_service.upsert_batch(
+                    batch=batch,
+                    index_name=index_name,
+                    namespace=filename,
+                    host=settings.PINECONE_DRHP_HOST
+                )
+                bound_logger.info(f"Upsert Response: {upsert_res}")
+                char_count = len(text)
+                chunk_count = len(batch)
+                boilerplate_stats = extraction_result.get("boilerplate")
+        
+        # Drop vectors a previous, longer ingestion of this document left behind
+        ingestion_hooks.after_upsert(index_name, settings.PINECONE_DRHP_HOST, chunk_metadata, chunk_count)
         
         # Stage 6: Store processing record in MongoDB
         if not mongodb.sync_db:
@@ -116,15 +149,22 @@ def process_document(
         collection.insert_one({
             "job_id": job_id,
             "filename": filename,
+            "documentId": chunk_metadata["documentId"],
+            "domainId": chunk_metadata["domainId"],
             "doc_type": doc_type,
             "index_name": index_name,
-            "char_count": len(text),
-            "chunk_count": len(chunks),
+            "char_count": char_count,
+            "chunk_count": chunk_count,
+            "boilerplate": boilerplate_stats,
             "status": "completed",
             "created_at": time.time()
         })
         
-        # Stage 7: Notify Backend (Matched to n8n "Respond to Webhook9")
+        # Stage 7: Rank the summary queries once, so summaries read stored results.
+        # Before the notification: a summary requested as soon as the document is ready must find them
+        asyncio.run(ingestion_hooks.after_record(index_name, settings.PINECONE_DRHP_HOST, chunk_metadata))
+        
+        # Stage 8: Notify Backend (Matched to n8n "Respond to Webhook9")
         backend_notifier.notify_status(
             job_id=job_id,
             status="completed",
@@ -171,6 +211,83 @@ def process_document(
         raise
 
 
+@celery_app.task(name="precompute_retrieval")
+def precompute_retrieval(domain_id: str) -> Dict[str, Any]:
+    """
+    Re-rank a domain's documents after its subqueries changed: rankings of
+    subqueries it no longer uses are dropped, the new ones are stored.
+    """
+    from app.services.fund_service import fund_service
+    
+    start_time = time.time()
+    subqueries = precomputed_retrieval.subqueries(fund_service.get_fund_config_sync(domain_id))
+    documents = precomputed_retrieval.retain_domain(domain_id, subqueries)
+    stored = sum(
+        asyncio.run(ingestion_hooks.precompute(document["index"], document["host"], document, subqueries))
+        for document in documents
+    )
+    
+    logger.info("Precomputed retrieval refreshed", domain_id=domain_id, documents=len(documents), stored=stored, duration=round(time.time() - start_time, 3))
+    return {"documents": len(documents), "stored": stored}
+
+
+@celery_app.task(name="sweep_vector_orphans")
+def sweep_vector_orphans() -> Dict[str, Any]:
+    """
+    Remove vectors no longer written by their document's latest completed
+    ingestion (e.g. when an ingestion died before its own orphan cleanup ran).
+    """
+    from app.services.vector_registry import vector_registry
+    
+    start_time = time.time()
+    documents = 0
+    deleted = 0
+    for document in vector_registry.stale_documents(settings.VECTOR_ORPHAN_SWEEP_GRACE):
+        try:
+            orphans = vector_registry.orphans(
+                document["index"], document["domainId"], document["documentId"], document["job_id"], document["stale_jobs"]
+            )
+            if not orphans:
+                continue
+            index = vector_store_service.get_index(document["index"], host=document["host"], domain_id=document["domainId"])
+            deleted += vector_store_service.delete_orphans(index, document["index"], document["documentId"], orphans)
+            documents += 1
+        except Exception as e:
+            logger.error("Orphan sweep failed for document", document_id=document["documentId"], error=str(e))
+    
+    logger.info("Orphan sweep completed", documents=documents, deleted=deleted, duration=round(time.time() - start_time, 3))
+    return {"documents": documents, "deleted": deleted}
+
+
+@celery_app.task(name="migrate_namespaces", time_limit=None, soft_time_limit=None)
+def migrate_namespaces(
+    strategy: str = None,
+    sources: List[str] = None,
+    delete_source: bool = False,
+    index_name: str = None,
+    host: str = None
+) -> List[Dict[str, Any]]:
+    """
+    Move existing vectors into a namespace strategy in the background.
+    Safe to re-run: each source namespace resumes from its checkpoint.
+    """
+    from app.services.namespace_migration import NamespaceMigration
+    
+    migration = NamespaceMigration(index_name, host, strategy)
+    return migration.run(sources, delete_source=delete_source)
+
+
+@celery_app.task(name="rebalance_shards", time_limit=None, soft_time_limit=None)
+def rebalance_shards(index_name: str = None, domain_ids: List[str] = None) -> List[Dict[str, Any]]:
+    """
+    Move domains onto their hash-ring shard after PINECONE_SHARDS changed.
+    Safe to re-run: interrupted moves resume from their placement record.
+    """
+    from app.services.shard_rebalance import ShardRebalance
+    
+    return ShardRebalance(index_name).run(domain_ids)
+
+
 @celery_app.task(name="process_news_article")
 def process_news_article(
     article_url: str,
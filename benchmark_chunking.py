@@ -0,0 +1,85 @@
+"""
+Benchmark: native span splitter vs LangChain RecursiveCharacterTextSplitter.
+Checks that both produce identical chunks for the production configuration
+and reports split time.
+
+Usage:
+    python benchmark_chunking.py                 # synthetic ~4 MB cleaned text
+    python benchmark_chunking.py prospectus.pdf  # real document (pdf or txt)
+"""
+import random
+import sys
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.config import settings
+from app.services.extraction import ExtractionService
+from app.services.text_splitter import SpanTextSplitter
+
+
+def load_text(path: str = None, target_chars: int = 4_000_000) -> str:
+    """Cleaned text of a document, or synthetic prospectus-like text."""
+    if path:
+        with open(path, "rb") as fh:
+            content = fh.read()
+        file_type = "pdf" if path.lower().endswith(".pdf") else "txt"
+        return ExtractionService.extract_text(content, file_type)["text"]
+
+    rng = random.Random(42)
+    vocabulary = [
+        "the", "Company", "equity", "shares", "of", "face", "value", "₹10", "each",
+        "Promoter", "Group", "allotment", "pursuant", "to", "Offer", "Red", "Herring",
+        "Prospectus", "SEBI", "ICDR", "Regulations", "1,23,45,678", "12.34%", "FY2024",
+        "Subsidiaries", "risk", "factors", "consolidated", "restated", "financial",
+    ]
+    words = []
+    size = 0
+    while size < target_chars:
+        word = rng.choice(vocabulary)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    text = load_text(sys.argv[1] if len(sys.argv) > 1 else None)
+    chunk_size, chunk_overlap = settings.MAX_CHUNK_SIZE, settings.CHUNK_OVERLAP
+
+    langchain_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        is_separator_regex=False,
+    )
+    native_splitter = SpanTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    expected = langchain_splitter.split_text(text)
+    actual = native_splitter.split_text(text)
+    identical = expected == actual
+
+    langchain_time = best_of(lambda: langchain_splitter.split_text(text))
+    spans_time = best_of(lambda: native_splitter.split_spans(text))
+    native_time = best_of(lambda: native_splitter.split_text(text))
+
+    print(f"Text: {len(text):,} chars, chunk_size={chunk_size}, overlap={chunk_overlap}")
+    print(f"Chunks: {len(expected)} (identical: {identical})")
+    print(f"LangChain split_text: {langchain_time * 1000:8.1f} ms")
+    print(f"Native split_spans:   {spans_time * 1000:8.1f} ms  ({langchain_time / spans_time:.1f}x)")
+    print(f"Native split_text:    {native_time * 1000:8.1f} ms  ({langchain_time / native_time:.1f}x)")
+
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
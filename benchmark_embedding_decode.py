@@ -0,0 +1,88 @@
+"""
+Benchmark: embedding response decoding, JSON float lists vs base64 + numpy.frombuffer.
+Builds a synthetic /v1/embeddings response body in both encodings and
+reports parse+decode time and peak Python memory per path.
+
+Usage:
+    python benchmark_embedding_decode.py             # 512 x 3072-d vectors
+    python benchmark_embedding_decode.py 2048 1024   # count, dimensions
+"""
+import base64
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+def response_body(vectors: np.ndarray, encoding_format: str) -> bytes:
+    """An embeddings API response body for the given float32 vectors."""
+    if encoding_format == "base64":
+        items = [base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii") for vector in vectors]
+    else:
+        items = vectors.tolist()
+    return json.dumps({
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": item} for i, item in enumerate(items)],
+        "model": "text-embedding-3-large",
+    }).encode("utf-8")
+
+
+def decode_float(body: bytes) -> np.ndarray:
+    """Previous path: JSON float lists, kept as Python lists and then converted."""
+    data = json.loads(body)["data"]
+    vectors = [item["embedding"] for item in sorted(data, key=lambda item: item["index"])]
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def decode_base64(body: bytes) -> np.ndarray:
+    """New path: base64 payloads decoded with numpy.frombuffer."""
+    data = json.loads(body)["data"]
+    return EmbeddingBatcher.decode([item["embedding"] for item in sorted(data, key=lambda item: item["index"])])
+
+
+def measure(fn, body: bytes, repeat: int = 3):
+    """(best time in seconds, peak traced bytes, result)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(body)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    dimensions = int(sys.argv[2]) if len(sys.argv) > 2 else 3072
+
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((count, dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    float_body = response_body(vectors, "float")
+    base64_body = response_body(vectors, "base64")
+
+    float_time, float_peak, float_result = measure(decode_float, float_body)
+    base64_time, base64_peak, base64_result = measure(decode_base64, base64_body)
+    identical = np.array_equal(float_result, base64_result)
+
+    print(f"Vectors: {count} x {dimensions}")
+    print(f"Response body: float {len(float_body) / 1e6:7.1f} MB, base64 {len(base64_body) / 1e6:7.1f} MB")
+    print(f"float  (json lists):        {float_time * 1000:8.1f} ms  peak {float_peak / 1e6:7.1f} MB")
+    print(f"base64 (numpy.frombuffer):  {base64_time * 1000:8.1f} ms  peak {base64_peak / 1e6:7.1f} MB"
+          f"  ({float_time / base64_time:.1f}x faster)")
+    print(f"Decoded vectors identical: {identical}")
+
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
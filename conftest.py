@@ -0,0 +1,154 @@
+"""
+Shared pytest fixtures.
+An in-memory stand-in for the synchronous Mongo collections the services
+use, and a local on-disk vector index, so service tests run without
+MongoDB or Pinecone.
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("PINECONE_API_KEY", "test")
+
+import pytest
+
+
+def _matches(document: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (query or {}).items():
+        present = key in document
+        value = document.get(key)
+        if isinstance(condition, dict) and any(operator.startswith("$") for operator in condition):
+            for operator, operand in condition.items():
+                if operator == "$in" and not (value in operand or (isinstance(value, list) and set(value) & set(operand))):
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$exists" and present != bool(operand):
+                    return False
+                if operator == "$size" and (not isinstance(value, list) or len(value) != operand):
+                    return False
+                if operator == "$gt" and not (present and value > operand):
+                    return False
+                if operator == "$lt" and not (present and value < operand):
+                    return False
+        elif isinstance(value, list) and not isinstance(condition, list):
+            if condition not in value:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class _Result:
+    def __init__(self, deleted_count: int = 0, matched_count: int = 0, modified_count: int = 0, upserted_id: Any = None):
+        self.deleted_count = deleted_count
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+
+class FakeCollection:
+    """The subset of pymongo's Collection the services call."""
+
+    def __init__(self):
+        self.docs: List[Dict[str, Any]] = []
+        self._next_id = 0
+
+    def create_index(self, *args, **kwargs) -> str:
+        return "index"
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def find(self, query: Dict[str, Any] = None, projection: Dict[str, Any] = None, sort=None):
+        found = [dict(document) for document in self.docs if _matches(document, query)]
+        for key, direction in reversed(sort or []):
+            found.sort(key=lambda document: document.get(key), reverse=direction < 0)
+        return found
+
+    def find_one(self, query: Dict[str, Any] = None, projection: Dict[str, Any] = None, sort=None):
+        found = self.find(query, projection, sort)
+        return found[0] if found else None
+
+    def count_documents(self, query: Dict[str, Any]) -> int:
+        return len(self.find(query))
+
+    def insert_one(self, document: Dict[str, Any]) -> _Result:
+        document.setdefault("_id", self._new_id())
+        self.docs.append(dict(document))
+        return _Result(upserted_id=document["_id"])
+
+    def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True) -> _Result:
+        for document in documents:
+            self.insert_one(document)
+        return _Result()
+
+    @staticmethod
+    def _apply(document: Dict[str, Any], update: Dict[str, Any], inserted: bool) -> None:
+        if not any(operator.startswith("$") for operator in update):
+            update = {"$set": update}
+        for operator, fields in update.items():
+            for key, value in fields.items():
+                if operator == "$set" or (operator == "$setOnInsert" and inserted):
+                    document[key] = value
+                elif operator == "$unset":
+                    document.pop(key, None)
+                elif operator == "$inc":
+                    document[key] = document.get(key, 0) + value
+                elif operator == "$max":
+                    document[key] = value if key not in document else max(document[key], value)
+                elif operator == "$addToSet":
+                    items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                    existing = document.setdefault(key, [])
+                    existing.extend(item for item in items if item not in existing)
+                elif operator == "$pull":
+                    document[key] = [item for item in document.get(key, []) if item != value]
+
+    def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> _Result:
+        for document in self.docs:
+            if _matches(document, query):
+                self._apply(document, update, False)
+                return _Result(matched_count=1, modified_count=1)
+        if upsert:
+            document = {key: value for key, value in query.items() if not isinstance(value, dict)}
+            document.setdefault("_id", self._new_id())
+            self._apply(document, update, True)
+            self.docs.append(document)
+            return _Result(upserted_id=document["_id"])
+        return _Result()
+
+    def update_many(self, query: Dict[str, Any], update: Dict[str, Any]) -> _Result:
+        matched = [document for document in self.docs if _matches(document, query)]
+        for document in matched:
+            self._apply(document, update, False)
+        return _Result(matched_count=len(matched), modified_count=len(matched))
+
+    def delete_many(self, query: Dict[str, Any]) -> _Result:
+        before = len(self.docs)
+        self.docs = [document for document in self.docs if not _matches(document, query)]
+        return _Result(deleted_count=before - len(self.docs))
+
+    def bulk_write(self, operations, ordered: bool = True) -> _Result:
+        for operation in operations:
+            self.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+        return _Result()
+
+
+@pytest.fixture
+def fake_mongo(monkeypatch):
+    """Every sync collection becomes a FakeCollection; returns them by name."""
+    from app.db.mongo import mongodb
+    collections: Dict[str, FakeCollection] = {}
+    monkeypatch.setattr(mongodb, "sync_db", object())
+    monkeypatch.setattr(mongodb, "get_sync_collection", lambda name: collections.setdefault(name, FakeCollection()))
+    return collections
+
+
+@pytest.fixture
+def local_index(tmp_path):
+    """A fresh local-backend vector index on disk."""
+    from app.services.vector_backends.local_backend import LocalVectorBackend
+    return LocalVectorBackend(str(tmp_path / "vectors")).get_index("test-index")
@@ -0,0 +1,55 @@
+"""
+Streaming chunking: split_stream over a document's pages must give
+exactly the chunks of splitting the joined text, including words longer
+than a chunk near a flush and the double spaces and tabs cleaned pages
+keep.
+"""
+import random
+import pytest
+from app.services.chunking import ChunkingService
+
+WORDS = ["a", "bb", "ccc", "Company", "₹10", "12.34%"]
+
+
+def _pages(rng, chunk_size, long_word_rate):
+    pages = []
+    for _ in range(rng.randint(1, 40)):
+        words = [
+            rng.choice("xyz") * rng.randint(chunk_size - 2, chunk_size * 4) if rng.random() < long_word_rate else rng.choice(WORDS)
+            for _ in range(rng.randint(1, 25))
+        ]
+        pages.append(rng.choice([" ", " ", "  ", " \t ", "\xa0"]).join(words))
+    return pages
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(10, 3), (20, 20), (40, 1), (64, 16)])
+@pytest.mark.parametrize("long_word_rate", [0.05, 0.3])
+def test_stream_matches_whole_text(chunk_size, chunk_overlap, long_word_rate):
+    chunking = ChunkingService(chunk_size=chunk_size, chunk_overlap=chunk_overlap, mode="characters")
+    rng = random.Random(chunk_size * 1000 + chunk_overlap)
+    for _ in range(50):
+        pages = _pages(rng, chunk_size, long_word_rate)
+
+        assert list(chunking.split_stream(pages)) == chunking.splitter.split_text(" ".join(pages))
+
+
+def test_long_word_at_a_flush_boundary():
+    chunking = ChunkingService(chunk_size=10, chunk_overlap=2, mode="characters")
+    pages = ["bb ccc", "y" * 23, "a bb", "ccc " + "z" * 9, "a"]
+
+    for flush_chars in range(1, 40):
+        assert list(chunking.split_stream(pages, flush_chars)) == chunking.splitter.split_text(" ".join(pages))
+
+
+def test_stream_flushes_before_the_end():
+    chunking = ChunkingService(chunk_size=40, chunk_overlap=8, mode="characters")
+    consumed = []
+
+    def pages():
+        for number in range(1000):
+            consumed.append(number)
+            yield "word  other\tthing " * 5 + "y" * 100
+
+    next(chunking.split_stream(pages()))
+
+    assert len(consumed) < 10
@@ -0,0 +1,89 @@
+"""
+Document deletion: tenants share filenames, so a delete names one
+tenant's copy and leaves the others' vectors and chunk text alone. The
+deprecated name-only delete removes every registered copy, one at a time.
+"""
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.db.mongo import mongodb
+from app.services.chunk_store import chunk_store
+from app.services.namespace_layout import namespace_layout
+from app.services.vector_registry import vector_registry
+from app.services.vector_store import vector_store_service
+
+FILENAME = "prospectus.pdf"
+
+
+def _ingest(local_index, domain_id, document_id, count=3):
+    metadata = {"documentName": FILENAME, "domainId": domain_id, "documentId": document_id, "job_id": "job"}
+    local_index.upsert(vectors=[
+        {"id": vector_registry.vector_id(FILENAME, i, metadata), "values": np.ones(4).tolist(), "metadata": {**metadata, "text": "t"}}
+        for i in range(count)
+    ])
+    vector_registry.record("test-index", "", FILENAME, metadata, range(count), "")
+    namespace_layout.record("test-index", FILENAME, metadata, "shared", "")
+    chunks = mongodb.get_sync_collection(settings.CHUNK_STORE_COLLECTION)
+    for i in range(count):
+        chunks.insert_one({"documentId": document_id, "chunk_index": i, "documentName": FILENAME, "domainId": domain_id, "text": "t"})
+    return metadata
+
+
+@pytest.fixture
+def two_tenants(fake_mongo, local_index, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_REGISTRY_ENABLED", True)
+    monkeypatch.setattr(settings, "CHUNK_STORE_ENABLED", True)
+    monkeypatch.setattr(vector_store_service, "get_index", lambda *args, **kwargs: local_index)
+    _ingest(local_index, "dm-a", "doc-a")
+    _ingest(local_index, "dm-b", "doc-b")
+
+
+def _domains(local_index):
+    ids = [vector_id for page in local_index.list() for vector_id in page]
+    return sorted({vector.metadata["domainId"] for vector in local_index.fetch(ids=ids).vectors.values()})
+
+
+def test_chunk_text_delete_by_name_alone_is_refused(two_tenants, fake_mongo):
+    with pytest.raises(ValueError):
+        chunk_store.delete_document(document_name=FILENAME)
+
+    assert {chunk["domainId"] for chunk in fake_mongo[settings.CHUNK_STORE_COLLECTION].docs} == {"dm-a", "dm-b"}
+
+
+def test_deprecated_delete_by_name_removes_each_registered_copy(two_tenants, local_index, fake_mongo):
+    response = vector_store_service.delete_vectors("test-index", FILENAME)
+
+    assert response == {"deleted_count": 6}
+    assert _domains(local_index) == []
+    assert fake_mongo[settings.CHUNK_STORE_COLLECTION].docs == []
+    assert namespace_layout.records("test-index", FILENAME) == []
+
+
+@pytest.mark.parametrize("target", [{"document_id": "doc-a"}, {"domain_id": "dm-a"}])
+def test_delete_removes_only_one_tenants_copy(two_tenants, local_index, fake_mongo, target):
+    vector_store_service.delete_vectors("test-index", FILENAME, **target)
+
+    assert _domains(local_index) == ["dm-b"]
+    remaining = fake_mongo[settings.CHUNK_STORE_COLLECTION].docs
+    assert {chunk["domainId"] for chunk in remaining} == {"dm-b"}
+    assert [record["domainId"] for record in namespace_layout.records("test-index", FILENAME)] == ["dm-b"]
+
+
+def test_unregistered_delete_filters_by_tenant(two_tenants, local_index, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_REGISTRY_ENABLED", False)
+
+    vector_store_service.delete_vectors("test-index", FILENAME, document_id="doc-a", domain_id="dm-a")
+
+    assert _domains(local_index) == ["dm-b"]
+
+
+def test_legacy_scan_runs_once_per_document(two_tenants, local_index, monkeypatch):
+    scans = []
+    monkeypatch.setattr(vector_store_service, "_legacy_ids", lambda index, namespace, document_id: scans.append(document_id) or [])
+    metadata = {"documentName": FILENAME, "domainId": "dm-a", "documentId": "doc-a", "job_id": "job"}
+
+    vector_store_service.remove_orphans("test-index", FILENAME, metadata)
+    vector_store_service.remove_orphans("test-index", FILENAME, metadata)
+    vector_store_service.remove_orphans("test-index", FILENAME, {**metadata, "domainId": "dm-b", "documentId": "doc-b"})
+
+    assert scans == ["doc-a", "doc-b"]
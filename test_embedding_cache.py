@@ -0,0 +1,42 @@
+"""
+Embedding cache: the running byte total tracks the stored rows through
+inserts, replacements and evictions, and forked processes reconnect.
+"""
+import numpy as np
+from app.services.embedding_cache import EmbeddingCache
+
+
+def _totals(cache):
+    conn = cache._connect()
+    running = conn.execute("SELECT value FROM cache_meta WHERE key = 'total_bytes'").fetchone()[0]
+    return running, conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+
+
+def test_running_total_tracks_rows(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=10_000)
+    cache.put_many(["a", "b"], [np.ones(8), np.ones(8)], "model", 8)
+    cache.put_many(["a"], [np.ones(16)], "model", 8)
+    assert _totals(cache) == (64 + 32, 64 + 32)
+
+    cache.put_many([f"t{i}" for i in range(100)], [np.ones(64)] * 100, "model", 64)
+    running, stored = _totals(cache)
+    assert running == stored <= 10_000
+
+
+def test_existing_rows_seed_the_total(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path).put_many(["a"], [np.ones(8)], "model", 8)
+    conn = EmbeddingCache(path)._connect()
+    conn.execute("DROP TABLE cache_meta")
+    conn.commit()
+
+    assert _totals(EmbeddingCache(path)) == (32, 32)
+
+
+def test_forked_process_reopens_the_connection(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    parent = cache._connect()
+    cache._conn_pid = -1
+
+    assert cache._connect() is not parent
+    assert cache.get_many(["a"], "model", 8) == [None]
@@ -0,0 +1,79 @@
+"""
+Direct ingestion bookkeeping: re-ingesting through IngestionPipeline.process
+drops the document's stale precomputed rankings, records its chunk count
+and ranks the summary queries again before reporting the document ready.
+"""
+import asyncio
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.db.mongo import mongodb
+from app.services.ingestion_pipeline import IngestionPipeline
+from app.services.namespace_layout import namespace_layout
+from app.services.precomputed_retrieval import precomputed_retrieval
+from app.services.vector_store import vector_store_service
+
+FILENAME = "prospectus.pdf"
+INDEX = vector_store_service._extract_index_name(settings.PINECONE_DRHP_INDEX)
+
+
+def _ranking(domain_id, query, job_id="old-job"):
+    return {
+        "_id": f"{domain_id}-{query}", "index": INDEX, "documentName": FILENAME, "domainId": domain_id,
+        "documentId": f"doc-{domain_id}", "query": query, "top_k": 15, "job_id": job_id, "matches": [{"id": "stale"}],
+    }
+
+
+@pytest.fixture
+def pipeline(fake_mongo, local_index, tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store_service, "get_index", lambda *args, **kwargs: local_index)
+    monkeypatch.setattr(settings, "VECTOR_REGISTRY_ENABLED", True)
+    monkeypatch.setattr(settings, "DOCUMENT_LOCAL_ROOTS", str(tmp_path))
+    events = []
+    monkeypatch.setattr(
+        "app.services.ingestion_pipeline.backend_notifier.notify_status",
+        lambda job_id, status, namespace, **kwargs: events.append(("notify", status))
+    )
+    pipeline = IngestionPipeline()
+    monkeypatch.setattr(pipeline.extraction, "extract_text", lambda file, file_type: {"text": "Risk factors. " * 600})
+
+    async def embed_batch(batch, dimensions):
+        batch.embeddings = np.ones((len(batch), dimensions), dtype=np.float32)
+
+    monkeypatch.setattr(pipeline.embedding, "embed_batch", embed_batch)
+    document = tmp_path / FILENAME
+    document.write_bytes(b"%PDF")
+    return pipeline, str(document), events
+
+
+def _ingest(pipeline, path, job_id):
+    metadata = {"filename": FILENAME, "documentId": "doc-dm-a", "domainId": "dm-a"}
+    return asyncio.run(pipeline.process(path, "pdf", job_id, metadata))
+
+
+def test_reingest_drops_stale_rankings(pipeline):
+    pipeline, path, _ = pipeline
+    rankings = mongodb.get_sync_collection(settings.RETRIEVAL_PRECOMPUTE_COLLECTION)
+    rankings.insert_many([_ranking("dm-a", "q1"), _ranking("dm-a", "q2"), _ranking("dm-b", "q1")])
+
+    result = _ingest(pipeline, path, "new-job")
+
+    assert result["success"]
+    assert [(record["domainId"], record["query"]) for record in rankings.docs] == [("dm-b", "q1")]
+    metadata = {"documentId": "doc-dm-a", "domainId": "dm-a"}
+    assert namespace_layout.record_for(INDEX, FILENAME, metadata)["chunk_count"] == result["chunk_count"]
+
+
+def test_rankings_are_recomputed_before_the_document_is_ready(pipeline, monkeypatch):
+    pipeline, path, events = pipeline
+    monkeypatch.setattr(settings, "RETRIEVAL_PRECOMPUTE", True)
+
+    async def compute(index_name, host, document, subqueries):
+        events.append(("precompute", document["job_id"]))
+        return len(subqueries)
+
+    monkeypatch.setattr(precomputed_retrieval, "compute", compute)
+
+    _ingest(pipeline, path, "new-job")
+
+    assert events == [("precompute", "new-job"), ("notify", "completed")]
@@ -0,0 +1,128 @@
+"""
+Local vector backend: deletes are manifest tombstones that hide rows from
+every read (and from other processes sharing the directory), a re-upsert
+outlives its tombstone, and compaction keeps exactly the live rows.
+"""
+import os
+import numpy as np
+from app.core.config import settings
+from app.services.vector_backends.local_backend import LocalVectorBackend
+
+DIMENSION = 8
+
+
+def _vector(vector_id, seed, **metadata):
+    values = np.random.default_rng(seed).normal(size=DIMENSION).tolist()
+    return {"id": vector_id, "values": values, "metadata": {"text": vector_id, **metadata}}
+
+
+def _ids(index):
+    return [vector_id for page in index.list() for vector_id in page]
+
+
+def _segment_files(index):
+    directory = index._namespace_dir("")
+    return sorted(name for name in os.listdir(directory) if name.startswith("seg-"))
+
+
+def test_deleted_vectors_are_hidden_from_every_read(tmp_path):
+    backend = LocalVectorBackend(str(tmp_path))
+    index = backend.get_index("drhp")
+    index.upsert(vectors=[_vector(f"a_{i}", i, documentId="doc-a") for i in range(3)])
+    index.upsert(vectors=[_vector(f"b_{i}", 10 + i, documentId="doc-b") for i in range(3)])
+    files = _segment_files(index)
+
+    index.delete(ids=["a_0"])
+    index.delete(filter={"documentId": {"$eq": "doc-b"}})
+
+    # Tombstones only: no segment is rewritten
+    assert _segment_files(index) == files
+    # A second reader of the same directory, as another worker process would be
+    other = LocalVectorBackend(str(tmp_path)).get_index("drhp")
+    for reader in (index, other):
+        assert _ids(reader) == ["a_1", "a_2"]
+        assert list(reader.fetch(ids=["a_0", "a_1", "b_0"]).vectors) == ["a_1"]
+        assert reader.describe_index_stats()["total_vector_count"] == 2
+        matches = reader.query(vector=_vector("a_0", 0)["values"], top_k=10)["matches"]
+        assert sorted(match["id"] for match in matches) == ["a_1", "a_2"]
+
+
+def test_reupserted_vector_outlives_its_tombstone(tmp_path):
+    index = LocalVectorBackend(str(tmp_path)).get_index("drhp")
+    index.upsert(vectors=[_vector("a_0", 0, version=1)])
+    index.delete(ids=["a_0"])
+
+    index.upsert(vectors=[_vector("a_0", 1, version=2)])
+
+    assert index.fetch(ids=["a_0"]).vectors["a_0"].metadata["version"] == 2
+
+
+def test_compaction_keeps_only_live_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_LOCAL_MAX_SEGMENTS", 4)
+    index = LocalVectorBackend(str(tmp_path)).get_index("drhp")
+    for batch in range(3):
+        index.upsert(vectors=[_vector(f"v{batch}_{i}", batch * 10 + i) for i in range(2)])
+    index.delete(ids=["v0_0", "v2_1"])
+    # The fourth segment: an overwrite leaves the older row shadowed in its segment
+    index.upsert(vectors=[_vector("v1_0", 99, overwritten=True)])
+    query = _vector("q", 123)["values"]
+    before = index.query(vector=query, top_k=10, include_metadata=True)["matches"]
+
+    # The fifth segment triggers the merge
+    index.upsert(vectors=[_vector("v4_0", 40)])
+
+    manifest = index._read_manifest(index._namespace_dir(""))
+    assert len(manifest["segments"]) == 1 and manifest["deleted"] == {}
+    assert _segment_files(index) == [f"seg-{manifest['generation']:08d}.json", f"seg-{manifest['generation']:08d}.npy"]
+    assert _ids(index) == sorted(["v0_1", "v1_0", "v1_1", "v2_0", "v4_0"])
+    assert index.fetch(ids=["v1_0"]).vectors["v1_0"].metadata["overwritten"] is True
+    after = index.query(vector=query, top_k=10, include_metadata=True)["matches"]
+    assert [match["id"] for match in after if match["id"] != "v4_0"] == [match["id"] for match in before]
+    assert np.allclose(
+        [match["score"] for match in after if match["id"] != "v4_0"], [match["score"] for match in before], atol=1e-6
+    )
+
+
+def test_writes_lock_without_fcntl(tmp_path, monkeypatch):
+    from app.services.vector_backends import local_backend
+
+    calls = []
+
+    class FakeMsvcrt:
+        LK_LOCK, LK_UNLCK = 1, 0
+
+        @staticmethod
+        def locking(fd, mode, nbytes):
+            calls.append(mode)
+
+    monkeypatch.setattr(local_backend, "fcntl", None)
+    monkeypatch.setattr(local_backend, "msvcrt", FakeMsvcrt, raising=False)
+    index = LocalVectorBackend(str(tmp_path)).get_index("drhp")
+
+    index.upsert(vectors=[_vector("a_0", 0)])
+    index.delete(ids=["a_0"])
+
+    assert calls == [FakeMsvcrt.LK_LOCK, FakeMsvcrt.LK_UNLCK] * 2
+    assert _ids(index) == []
+
+
+def test_compaction_removes_segments_left_in_use(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_LOCAL_MAX_SEGMENTS", 1)
+    index = LocalVectorBackend(str(tmp_path)).get_index("drhp")
+    index.upsert(vectors=[_vector("v0", 0)])
+    remove = os.remove
+
+    def mapped(path):
+        raise PermissionError(path)
+
+    # As on Windows, while a reader still maps the old segments
+    monkeypatch.setattr(os, "remove", mapped)
+    index.upsert(vectors=[_vector("v1", 1)])
+    monkeypatch.setattr(os, "remove", remove)
+    assert len(_segment_files(index)) == 6
+
+    index.upsert(vectors=[_vector("v2", 2)])
+
+    manifest = index._read_manifest(index._namespace_dir(""))
+    assert _segment_files(index) == [f"seg-{manifest['generation']:08d}.json", f"seg-{manifest['generation']:08d}.npy"]
+    assert _ids(index) == ["v0", "v1", "v2"]
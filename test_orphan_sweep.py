@@ -0,0 +1,83 @@
+"""
+Orphan sweep: only an ingestion whose processing record completed decides
+which vectors are orphans; a re-ingest that failed partway must not get
+the vectors it did not rewrite deleted.
+"""
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.db.mongo import mongodb
+from app.services.vector_registry import vector_registry
+from app.services.vector_store import vector_store_service
+from app.workers.document_pipeline import sweep_vector_orphans
+
+FILENAME = "prospectus.pdf"
+
+
+def _grouped(collection):
+    """The stale_documents aggregation over the fake registry collection."""
+    def aggregate(pipeline, allowDiskUse=False):
+        jobs = {}
+        for record in collection.docs:
+            key = (record["index"], record["domainId"], record["documentId"])
+            latest = jobs.setdefault(key, {}).get(record["job_id"], 0)
+            jobs[key][record["job_id"]] = max(latest, record["updated_at"])
+        for (index, domain_id, document_id), by_job in jobs.items():
+            ordered = sorted(by_job.items(), key=lambda item: -item[1])
+            if len(ordered) > 1:
+                yield {
+                    "_id": {"index": index, "domainId": domain_id, "documentId": document_id},
+                    "jobs": [{"job_id": job_id, "updated_at": updated_at} for job_id, updated_at in ordered],
+                    "host": "",
+                }
+    return aggregate
+
+
+def _ingest(local_index, job_id, chunks, written_at, status, monkeypatch):
+    metadata = {"documentName": FILENAME, "domainId": "dm-a", "documentId": "doc-a", "job_id": job_id}
+    monkeypatch.setattr("app.services.vector_registry.time.time", lambda: written_at)
+    vector_registry.record("test-index", "", FILENAME, metadata, range(chunks))
+    local_index.upsert(vectors=[
+        {"id": vector_registry.vector_id(FILENAME, i, metadata), "values": np.ones(4).tolist(), "metadata": {**metadata, "chunk_index": i}}
+        for i in range(chunks)
+    ])
+    if status:
+        mongodb.get_sync_collection("document_processing").insert_one({"job_id": job_id, "status": status})
+
+
+@pytest.fixture
+def reingested(fake_mongo, local_index, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_REGISTRY_ENABLED", True)
+    monkeypatch.setattr(settings, "CHUNK_STORE_ENABLED", False)
+    monkeypatch.setattr(settings, "VECTOR_ORPHAN_SWEEP_GRACE", 0)
+    monkeypatch.setattr(vector_store_service, "get_index", lambda *args, **kwargs: local_index)
+    collection = vector_registry._collection()
+    collection.aggregate = _grouped(collection)
+    return lambda job_id, chunks, written_at, status: _ingest(local_index, job_id, chunks, written_at, status, monkeypatch)
+
+
+def _chunks(local_index):
+    ids = [vector_id for page in local_index.list() for vector_id in page]
+    return sorted(vector.metadata["chunk_index"] for vector in local_index.fetch(ids=ids).vectors.values())
+
+
+def test_failed_reingest_does_not_orphan_valid_vectors(reingested, local_index):
+    reingested("job-1", 5, 100.0, "completed")
+    reingested("job-2", 3, 200.0, "completed")
+    # Died after rewriting two chunks; its record was never completed
+    reingested("job-3", 2, 300.0, None)
+
+    (document,) = vector_registry.stale_documents(grace_seconds=0)
+    sweep_vector_orphans()
+
+    assert (document["job_id"], document["stale_jobs"]) == ("job-2", ["job-1"])
+    assert _chunks(local_index) == [0, 1, 2]
+
+
+def test_document_without_a_completed_ingestion_is_skipped(reingested, local_index):
+    reingested("job-1", 5, 100.0, None)
+    reingested("job-2", 3, 200.0, "failed")
+
+    assert list(vector_registry.stale_documents(grace_seconds=0)) == []
+    assert sweep_vector_orphans() == {"documents": 0, "deleted": 0}
+    assert _chunks(local_index) == [0, 1, 2, 3, 4]
@@ -0,0 +1,62 @@
+"""
+Query embedding registry: re-onboarding embeds only changed subqueries,
+and a worker start with everything stored embeds nothing.
+"""
+import numpy as np
+import pytest
+from app.services.query_embeddings import QueryEmbeddingRegistry
+
+DIMENSIONS = 8
+
+
+class CountingEmbedding:
+    model_name = "test-model"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_texts(self, texts, dimensions):
+        self.embedded.extend(texts)
+        return [np.full(dimensions, len(text), dtype=np.float32) for text in texts]
+
+
+@pytest.fixture
+def registry(fake_mongo, monkeypatch):
+    monkeypatch.setattr(QueryEmbeddingRegistry, "dimensions", staticmethod(lambda: [DIMENSIONS]))
+    monkeypatch.setattr(QueryEmbeddingRegistry, "static_queries", staticmethod(lambda: ["static a", "static b"]))
+    return QueryEmbeddingRegistry("query_embeddings", embedding=CountingEmbedding())
+
+
+def test_refresh_domain_embeds_only_new_subqueries(registry, fake_mongo):
+    registry.refresh_domain("dm-a", ["kept", "dropped"])
+
+    # Re-onboarding usually runs in another process, with nothing in memory
+    other_process = QueryEmbeddingRegistry("query_embeddings", embedding=CountingEmbedding())
+    other_process.refresh_domain("dm-a", ["kept", "added"])
+
+    assert other_process.embedding.embedded == ["added"]
+    texts = {record["text"]: record["scopes"] for record in fake_mongo["query_embeddings"].docs}
+    assert texts == {"kept": ["dm-a"], "added": ["dm-a"]}
+
+
+def test_refresh_domain_keeps_texts_other_scopes_use(registry, fake_mongo):
+    registry.refresh_domain("dm-a", ["shared"])
+    registry.refresh_domain("dm-b", ["shared"])
+
+    registry.refresh_domain("dm-a", [])
+
+    assert [record["scopes"] for record in fake_mongo["query_embeddings"].docs] == [["dm-b"]]
+
+
+def test_warm_start_loads_without_embedding_or_writing(registry, fake_mongo, monkeypatch):
+    registry.warm()
+    assert sorted(registry.embedding.embedded) == ["static a", "static b"]
+
+    restarted = QueryEmbeddingRegistry("query_embeddings", embedding=CountingEmbedding())
+    collection = fake_mongo["query_embeddings"]
+    for write in ("update_one", "update_many", "bulk_write", "delete_many"):
+        monkeypatch.setattr(collection, write, lambda *args, **kwargs: pytest.fail("warm start wrote to the registry"))
+    restarted.warm()
+
+    assert restarted.embedding.embedded == []
+    assert all(vector is not None for vector in restarted.lookup(["static a", "static b"], DIMENSIONS))
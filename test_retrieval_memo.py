@@ -0,0 +1,92 @@
+"""
+RetrievalMemo: a request is answered from a memoized ranking retrieved
+with at least its top_k and the same precomputed/live source, and only
+retrieves what the memo cannot answer.
+"""
+import asyncio
+from app.services.retrieval import RetrievalMemo, RetrievalResult, RetrievedChunk
+
+
+class CountingEngine:
+    """Returns top_k ranked chunks per query and records what it was asked."""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.sources = []
+        self.error = error
+
+    async def retrieve(self, queries, namespace, index_name, host, top_k, metadata_filter, sections, **kwargs):
+        self.calls.append((list(queries), top_k))
+        self.sources.append(kwargs.get("precomputed", False))
+        await asyncio.sleep(0)
+        chunks = [
+            [RetrievedChunk(f"{query}-{rank}", f"{query} {rank}", 1.0 - rank / 100, {}, rank) for rank in range(top_k)]
+            for query in queries
+        ]
+        return RetrievalResult(queries, chunks, {}, "index", self.error)
+
+
+def _retrieve(memo, engine, queries, top_k, filter=None, precomputed=False):
+    return asyncio.run(memo.retrieve(engine, queries, "ns", "idx", "host", top_k, filter, None, None, False, precomputed))
+
+
+def test_smaller_top_k_is_served_from_a_larger_ranking():
+    memo, engine = RetrievalMemo(), CountingEngine()
+    _retrieve(memo, engine, ["risk", "capital"], 10)
+
+    result = _retrieve(memo, engine, ["risk", "capital"], 4)
+
+    assert engine.calls == [(["risk", "capital"], 10)]
+    assert [[chunk.id for chunk in group] for group in result.chunks] == [
+        [f"risk-{rank}" for rank in range(4)], [f"capital-{rank}" for rank in range(4)]
+    ]
+    assert memo.stats()["vector_queries_saved"] == 2
+
+
+def test_larger_top_k_and_other_filters_are_retrieved():
+    memo, engine = RetrievalMemo(), CountingEngine()
+    _retrieve(memo, engine, ["risk", "capital"], 4)
+
+    _retrieve(memo, engine, ["risk", "objects"], 8)
+    _retrieve(memo, engine, ["risk"], 8, {"documentId": "doc-b"})
+    result = _retrieve(memo, engine, ["risk", "objects"], 6)
+
+    assert engine.calls == [(["risk", "capital"], 4), (["risk", "objects"], 8), (["risk"], 8)]
+    assert [len(group) for group in result.chunks] == [6, 6]
+
+
+def test_concurrent_identical_requests_share_one_retrieval():
+    memo, engine = RetrievalMemo(), CountingEngine()
+
+    async def both():
+        return await asyncio.gather(*(
+            memo.retrieve(engine, ["risk"], "ns", "idx", "host", 5, None, None, None, False) for _ in range(2)
+        ))
+
+    first, second = asyncio.run(both())
+
+    assert engine.calls == [(["risk"], 5)]
+    assert [chunk.id for chunk in first.chunks[0]] == [chunk.id for chunk in second.chunks[0]]
+    assert memo.stats()["shared"] == 1
+
+
+def test_failed_retrievals_are_not_memoized():
+    memo = RetrievalMemo()
+    _retrieve(memo, CountingEngine(error="timeout"), ["risk"], 5)
+    engine = CountingEngine()
+
+    _retrieve(memo, engine, ["risk"], 5)
+
+    assert engine.calls == [(["risk"], 5)]
+
+
+def test_precomputed_and_live_rankings_are_memoized_apart():
+    memo, engine = RetrievalMemo(), CountingEngine()
+    _retrieve(memo, engine, ["risk"], 10, precomputed=True)
+
+    _retrieve(memo, engine, ["risk"], 5)
+    _retrieve(memo, engine, ["risk"], 5, precomputed=True)
+    _retrieve(memo, engine, ["risk"], 5)
+
+    assert engine.calls == [(["risk"], 10), (["risk"], 5)]
+    assert engine.sources == [True, False]
@@ -0,0 +1,51 @@
+"""
+Section detection: only heading lines open a section; body text and
+tables of contents that mention chapter titles do not.
+"""
+from app.services.extraction import ExtractionService
+from app.services.sections import FRONT_MATTER, SectionDetector
+
+TOC = "\n".join([
+    "TABLE OF CONTENTS",
+    "RISK FACTORS",
+    "THE OFFER",
+    "GENERAL INFORMATION",
+    "CAPITAL STRUCTURE",
+    "DECLARATION",
+])
+
+
+def _labels(pages):
+    return [label for label, _ in SectionDetector(window=200, toc_threshold=4).label_pages(pages)]
+
+
+def test_heading_lines_open_sections():
+    pages = [
+        "Cover page",
+        "SECTION II\nRISK FACTORS\nAn investment in equity shares involves risk.",
+        "More risks.",
+        "CAPITAL STRUCTURE:\nThe share capital of our Company is set forth below.",
+    ]
+
+    assert _labels(pages) == [FRONT_MATTER, "risk_factors", "risk_factors", "capital_structure"]
+
+
+def test_headings_in_body_text_are_ignored():
+    pages = [
+        "CAPITAL STRUCTURE\nThe share capital of our Company is set forth below.",
+        "Promoters confirm the DECLARATION in THE OFFER document.\nSee “RISK FACTORS” on page 30.",
+        "Build up of the share capital.",
+    ]
+
+    assert _labels(pages) == ["capital_structure"] * 3
+
+
+def test_table_of_contents_is_ignored():
+    assert _labels([TOC, "Body text."]) == [FRONT_MATTER, FRONT_MATTER]
+
+
+def test_headings_are_detected_before_cleaning():
+    pages = ["Cover\n", "CAPITAL STRUCTURE\nShare   capital\nPage 75"]
+    labelled = list(SectionDetector(window=200, toc_threshold=4).label_pages(pages, clean=ExtractionService.clean_text))
+
+    assert labelled == [(FRONT_MATTER, "Cover"), ("capital_structure", "CAPITAL STRUCTURE Share capital")]
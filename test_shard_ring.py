@@ -0,0 +1,77 @@
+"""
+Shard ring and rebalance: domains keep their shard while the ring is
+unchanged, adding a shard only moves domains onto it, and a rebalance
+waits out cached placements once for all the domains it moves.
+"""
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.shard_rebalance import ShardRebalance
+from app.services.shard_router import ConsistentHashRing, ShardRouter
+from app.services.vector_backends.local_backend import LocalVectorBackend
+from app.services.vector_registry import vector_registry
+from app.services.vector_store import vector_store_service
+
+SHARDS = [("drhp-0", "https://drhp-0"), ("drhp-1", "https://drhp-1"), ("drhp-2", "https://drhp-2")]
+DOMAINS = [f"domain-{i}" for i in range(2000)]
+
+
+def test_ring_is_stable():
+    first, second = ConsistentHashRing(SHARDS), ConsistentHashRing(list(reversed(SHARDS)))
+
+    assert [first.get(domain) for domain in DOMAINS] == [second.get(domain) for domain in DOMAINS]
+    assert {first.get(domain) for domain in DOMAINS} == set(SHARDS)
+
+
+def test_adding_a_shard_only_moves_domains_onto_it():
+    before = ConsistentHashRing(SHARDS)
+    new_shard = ("drhp-3", "https://drhp-3")
+    after = ConsistentHashRing(SHARDS + [new_shard])
+
+    moved = [domain for domain in DOMAINS if before.get(domain) != after.get(domain)]
+
+    assert all(after.get(domain) == new_shard for domain in moved)
+    assert 0.15 < len(moved) / len(DOMAINS) < 0.35
+
+
+def test_shards_sharing_an_index_name_are_told_apart_by_host():
+    ring = ConsistentHashRing([("drhp", "https://project-a"), ("drhp", "https://project-b")])
+
+    assert {ring.get(domain)[1] for domain in DOMAINS} == {"https://project-a", "https://project-b"}
+
+
+@pytest.fixture
+def sharded(fake_mongo, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PINECONE_SHARDS", ",".join(f"{name}={host}" for name, host in SHARDS[:2]))
+    monkeypatch.setattr(settings, "VECTOR_REGISTRY_ENABLED", True)
+    backend = LocalVectorBackend(str(tmp_path / "vectors"))
+    monkeypatch.setattr(vector_store_service, "get_index", lambda name, host="", domain_id=None: backend.get_index(name))
+    router = ShardRouter()
+    monkeypatch.setattr("app.services.shard_rebalance.shard_router", router)
+    return backend, router
+
+
+def test_rebalance_waits_once_for_every_moved_domain(sharded, monkeypatch):
+    backend, router = sharded
+    index_name = settings.PINECONE_DRHP_INDEX
+    domains = [domain for domain in DOMAINS[:50] if router.ring.get(domain) != SHARDS[0]][:3]
+    for domain in domains:
+        # Placed on the first shard, but the ring puts them on the second
+        router.place(index_name, domain, SHARDS[0])
+        metadata = {"domainId": domain, "documentId": f"doc-{domain}"}
+        backend.get_index(SHARDS[0][0]).upsert(vectors=[
+            {"id": vector_registry.vector_id("a.pdf", i, metadata), "values": np.ones(4).tolist(), "metadata": metadata}
+            for i in range(2)
+        ])
+        vector_registry.record(index_name, "", "a.pdf", metadata, range(2))
+    monkeypatch.setattr(settings, "SHARD_REBALANCE_RATE", 0)
+    sleeps = []
+    monkeypatch.setattr("app.services.shard_rebalance.time.sleep", sleeps.append)
+
+    results = ShardRebalance(index_name).run()
+
+    assert [result["status"] for result in results] == ["placed"] * len(domains)
+    assert len(sleeps) == 1 and sleeps[0] <= settings.SHARD_PLACEMENT_CACHE_TTL
+    assert router.misplaced(index_name) == []
+    assert backend.get_index(SHARDS[0][0]).describe_index_stats()["total_vector_count"] == 0
+    assert backend.get_index(SHARDS[1][0]).describe_index_stats()["total_vector_count"] == 2 * len(domains)
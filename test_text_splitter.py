@@ -0,0 +1,34 @@
+"""
+SpanTextSplitter must produce exactly LangChain's chunks: vector ids are
+namespace + chunk index, so any drift re-addresses stored vectors.
+"""
+import random
+import pytest
+from app.services.text_splitter import SpanTextSplitter
+
+text_splitters = pytest.importorskip("langchain_text_splitters")
+
+WORDS = ["Company", "equity", "shares", "₹10", "Promoter", "SEBI", "1,23,45,678", "12.34%", "a", "Offer"]
+
+
+def _text(seed: int, size: int) -> str:
+    rng = random.Random(seed)
+    parts = []
+    while sum(map(len, parts)) < size:
+        parts.append(rng.choice(WORDS))
+        parts.append(rng.choice([" ", " ", " ", "  ", "\n", "\n\n", " \n "]))
+    # An unbroken run forces the character-level split
+    parts.insert(len(parts) // 2, "x" * 300)
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(4000, 800), (500, 100), (120, 0), (64, 64)])
+@pytest.mark.parametrize("seed", range(3))
+def test_chunks_match_langchain(chunk_size, chunk_overlap, seed):
+    text = _text(seed, 20_000)
+    expected = text_splitters.RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len
+    ).split_text(text)
+
+    assert SpanTextSplitter(chunk_size, chunk_overlap).split_text(text) == expected
+
@@ -0,0 +1,22 @@
+"""
+Upsert request packing: every request stays under the byte limit, however
+differently sized the vectors' serialized values are.
+"""
+import json
+import numpy as np
+from app.core.config import settings
+from app.services.vector_store import VectorStoreService
+
+
+def test_requests_stay_under_the_byte_limit(monkeypatch):
+    monkeypatch.setattr(settings, "PINECONE_UPSERT_MAX_BYTES", 20_000)
+    monkeypatch.setattr(settings, "PINECONE_UPSERT_MAX_VECTORS", 1000)
+    rng = np.random.default_rng(0)
+    # A short first vector (zeros) must not set the estimate for the long ones after it
+    values = [np.zeros(64)] + [rng.standard_normal(64) * 1e-7 for _ in range(40)]
+    vectors = [{"id": f"doc_{i}", "values": v.tolist(), "metadata": {"text": "t"}} for i, v in enumerate(values)]
+
+    requests = list(VectorStoreService._pack_by_size(vectors))
+
+    assert sum(len(request) for request in requests) == len(vectors)
+    assert all(len(json.dumps({"vectors": request})) <= settings.PINECONE_UPSERT_MAX_BYTES for request in requests)
@@ -0,0 +1,78 @@
+"""
+Vector id listing: Pinecone SDK pages of ListItem objects and the local
+backend's pages of strings must read the same.
+"""
+import numpy as np
+from pinecone import ListResponse
+from pinecone.models.vectors.responses import ListItem
+from app.core.config import settings
+from app.services.vector_backends import list_ids
+from app.services.vector_registry import vector_registry
+from app.services.namespace_migration import NamespaceMigration
+from app.services.vector_store import VectorStoreService, vector_store_service
+
+
+class PineconeShapedIndex:
+    """A local index whose list() pages look like the Pinecone SDK's."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def list(self, prefix: str = "", namespace: str = "", limit: int = 100):
+        for page in self.index.list(prefix=prefix, namespace=namespace, limit=limit):
+            yield ListResponse(vectors=[ListItem(id=vector_id) for vector_id in page], namespace=namespace)
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+
+def _upsert_legacy(local_index, name, document_id, count):
+    local_index.upsert(vectors=[
+        {"id": f"{name}_{i}", "values": np.ones(4).tolist(), "metadata": {"documentId": document_id, "text": "t"}}
+        for i in range(count)
+    ])
+
+
+def test_list_ids_reads_listitem_and_string_pages(local_index):
+    _upsert_legacy(local_index, "a.pdf", "doc-a", 3)
+
+    assert list(list_ids(local_index, prefix="a.pdf_")) == [["a.pdf_0", "a.pdf_1", "a.pdf_2"]]
+    assert list(list_ids(PineconeShapedIndex(local_index), prefix="a.pdf_")) == [["a.pdf_0", "a.pdf_1", "a.pdf_2"]]
+
+
+def test_legacy_ids_found_through_listitem_pages(local_index):
+    _upsert_legacy(local_index, "a.pdf", "doc-a", 3)
+    _upsert_legacy(local_index, "a.pdf_v2", "doc-a", 2)
+    _upsert_legacy(local_index, "b.pdf", "doc-b", 2)
+
+    legacy = VectorStoreService._legacy_ids(PineconeShapedIndex(local_index), "a.pdf", "doc-a")
+
+    assert sorted(legacy) == ["a.pdf_0", "a.pdf_1", "a.pdf_2"]
+
+
+def test_unregistered_document_ids_listed_through_listitem_pages(local_index, fake_mongo, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_REGISTRY_ENABLED", True)
+    _upsert_legacy(local_index, "a.pdf", "doc-a", 2)
+
+    ids = vector_registry.document_ids(PineconeShapedIndex(local_index), "test-index", "a.pdf")
+
+    assert ids == ["a.pdf_0", "a.pdf_1"]
+
+
+
+def test_migration_pages_listitem_ids_and_resumes(local_index, fake_mongo, monkeypatch):
+    monkeypatch.setattr(vector_store_service, "get_index", lambda *args, **kwargs: local_index)
+    local_index.upsert(vectors=[
+        {"id": f"a.pdf_{i}", "values": np.ones(4).tolist(), "metadata": {"documentName": "a.pdf", "domainId": "dm", "documentId": "doc-a", "chunk_index": i, "text": "t"}}
+        for i in range(5)
+    ], namespace="a.pdf")
+    migration = NamespaceMigration("test-index", "", "document", rate=0, batch_size=2)
+    migration.index = PineconeShapedIndex(local_index)
+
+    dry = migration.copy_namespace("a.pdf", dry_run=True)
+    assert dry["status"] == "dry_run"
+    assert (dry["copied"], dry["would_copy"]) == (0, 5)
+
+    fake_mongo["namespace_migrations"].docs.append({"_id": migration._checkpoint_id("a.pdf"), "last_id": "a.pdf_1", "status": "running"})
+    result = migration.copy_namespace("a.pdf")
+    assert (result["status"], result["copied"]) == ("copied", 3)
@@ -0,0 +1,125 @@
+"""
+Working set isolation: tenants that upload the same filename must never
+be scored against each other's chunks.
+"""
+import asyncio
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.db.mongo import mongodb
+from app.services.namespace_layout import namespace_layout
+from app.services.retrieval import RetrievalEngine
+from app.services.vector_registry import vector_registry
+from app.services.vector_store import vector_store_service
+from app.services.working_set import WorkingSetCache
+
+FILENAME = "prospectus.pdf"
+TENANTS = {"dm-a": "doc-a", "dm-b": "doc-b"}
+DIMENSION = 8
+
+
+def _ingest(local_index, fake_mongo, domain_id, document_id, vectors):
+    metadata = {"documentName": FILENAME, "domainId": domain_id, "documentId": document_id, "job_id": "job"}
+    layout, vector_namespace = namespace_layout.namespace_for(metadata)
+    local_index.upsert(vectors=[
+        {
+            "id": vector_registry.vector_id(FILENAME, i, metadata),
+            "values": vector.tolist(),
+            "metadata": {**metadata, "chunk_index": i, "text": f"{domain_id} chunk {i}"},
+        }
+        for i, vector in enumerate(vectors)
+    ], namespace=vector_namespace)
+    vector_registry.record("test-index", "", FILENAME, metadata, range(len(vectors)), vector_namespace)
+    namespace_layout.record("test-index", FILENAME, metadata, layout, vector_namespace)
+    mongodb.get_sync_collection("document_processing").insert_one({
+        "filename": FILENAME, "documentId": document_id, "domainId": domain_id,
+        "status": "completed", "created_at": 1.0,
+    })
+    return vector_namespace
+
+
+@pytest.fixture
+def two_tenants(fake_mongo, local_index, monkeypatch):
+    monkeypatch.setattr(settings, "NAMESPACE_STRATEGY", "document")
+    monkeypatch.setattr(settings, "VECTOR_REGISTRY_ENABLED", True)
+    rng = np.random.default_rng(0)
+    vectors = {domain_id: rng.standard_normal((6, DIMENSION)).astype(np.float32) for domain_id in TENANTS}
+    namespaces = {
+        domain_id: _ingest(local_index, fake_mongo, domain_id, document_id, vectors[domain_id])
+        for domain_id, document_id in TENANTS.items()
+    }
+    return vectors, namespaces
+
+
+def test_cache_keeps_tenants_with_the_same_filename_apart(two_tenants, local_index):
+    vectors, namespaces = two_tenants
+    cache = WorkingSetCache(snapshot_dir="")
+
+    first = cache.get(local_index, "test-index", FILENAME, namespaces["dm-a"], "dm-a", "doc-a")
+    second = cache.get(local_index, "test-index", FILENAME, namespaces["dm-b"], "dm-b", "doc-b")
+
+    assert first is not second
+    assert {metadata["domainId"] for metadata in first.metadata} == {"dm-a"}
+    assert {metadata["domainId"] for metadata in second.metadata} == {"dm-b"}
+    assert cache.get(local_index, "test-index", FILENAME, namespaces["dm-a"], "dm-a", "doc-a") is first
+
+
+def test_retrieval_scores_each_tenant_against_its_own_chunks(two_tenants, local_index, monkeypatch):
+    vectors, _ = two_tenants
+    monkeypatch.setattr(settings, "RETRIEVAL_WORKING_SET", True)
+    monkeypatch.setattr(settings, "RETRIEVAL_PRECOMPUTE", False)
+    monkeypatch.setattr(vector_store_service, "get_index", lambda *args, **kwargs: local_index)
+    monkeypatch.setattr("app.services.retrieval.working_set_cache", WorkingSetCache(snapshot_dir=""))
+    engine = RetrievalEngine(embedding=object())
+
+    async def embed(queries, dimensions):
+        # Every query is tenant A's first chunk, the best match wherever it is visible
+        return np.stack([vectors["dm-a"][0] for _ in queries])
+
+    monkeypatch.setattr(engine, "_embed", embed)
+
+    async def retrieve(domain_id):
+        return await engine.retrieve(
+            ["q"], FILENAME, "test-index", top_k=3,
+            metadata_filter={"domainId": domain_id, "documentId": TENANTS[domain_id]}
+        )
+
+    tenant_a = asyncio.run(retrieve("dm-a"))
+    tenant_b = asyncio.run(retrieve("dm-b"))
+
+    assert tenant_a.source == tenant_b.source == "working_set"
+    assert tenant_a.chunks[0][0].text == "dm-a chunk 0"
+    assert tenant_b.chunks[0]
+    assert all(chunk.metadata["domainId"] == "dm-b" for chunk in tenant_b.chunks[0])
+
+
+def test_invalidation_is_scoped_to_one_tenant(two_tenants, local_index):
+    _, namespaces = two_tenants
+    cache = WorkingSetCache(snapshot_dir="")
+    first = cache.get(local_index, "test-index", FILENAME, namespaces["dm-a"], "dm-a", "doc-a")
+    second = cache.get(local_index, "test-index", FILENAME, namespaces["dm-b"], "dm-b", "doc-b")
+
+    cache.invalidate(FILENAME, "dm-a", "doc-a")
+
+    assert cache.get(local_index, "test-index", FILENAME, namespaces["dm-b"], "dm-b", "doc-b") is second
+    assert cache.get(local_index, "test-index", FILENAME, namespaces["dm-a"], "dm-a", "doc-a") is not first
+    assert cache.loads == 3
+
+
+def test_version_lookups_are_cached(two_tenants, local_index, fake_mongo, monkeypatch):
+    _, namespaces = two_tenants
+    cache = WorkingSetCache(snapshot_dir="")
+    processing = fake_mongo["document_processing"]
+    lookups = []
+    find_one = processing.find_one
+    monkeypatch.setattr(processing, "find_one", lambda *args, **kwargs: lookups.append(args) or find_one(*args, **kwargs))
+
+    for _ in range(3):
+        cache.get(local_index, "test-index", FILENAME, namespaces["dm-a"], "dm-a", "doc-a")
+    assert len(lookups) == 1
+
+    # A re-ingest in this process invalidates the copy, and its new version is looked up
+    processing.insert_one({"filename": FILENAME, "documentId": "doc-a", "domainId": "dm-a", "status": "completed", "created_at": 2.0})
+    cache.invalidate(FILENAME, "dm-a", "doc-a")
+    reloaded = cache.get(local_index, "test-index", FILENAME, namespaces["dm-a"], "dm-a", "doc-a")
+    assert len(lookups) == 2 and reloaded.version == 2.0